@@ -11,6 +11,7 @@ from django.db.models.fields.reverse_related import ManyToOneRel
 
 from biochem import models as biochem_models
 from . import models as bio_models
+from .taxon_index import invalidate_taxon_index
 
 import logging
 
@@ -141,6 +142,10 @@ def sync_table(bio_table_model, biochem_model, field_map, database='default'):
     except django.db.utils.OperationalError as ex:
         logger.exception(f"Could not delete keys from table {bio_table_model.__name__.lower()} : {ex}")
 
+    # bulk creates and updates don't send signals, drop the taxon index so it's rebuilt from the synced table
+    if bio_table_model is bio_models.BCNatnlTaxonCode:
+        invalidate_taxon_index()
+
     return updated
 
 
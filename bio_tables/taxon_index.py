@@ -0,0 +1,161 @@
+import threading
+
+from django.db import connections, router
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import models as bio_models
+
+# The national taxon code table is large and taxa are looked up for every row of a plankton file. Rather than
+# querying the table for each row the taxa are loaded once per process into a TaxonIndex. The index is loaded from
+# the database the router reads taxa from, the connected mission database if there is one, and is rebuilt when a
+# different database is connected. It's also dropped when the table is updated by sync_tables, or a taxon code is
+# saved or deleted, and rebuilt the next time it's needed.
+_taxon_index = None
+_taxon_index_database = None
+_taxon_index_lock = threading.Lock()
+
+# names further than this many edits from a taxonomic name aren't considered a match by find_similar()
+MAX_EDIT_DISTANCE = 2
+
+
+def normalize_name(name) -> str | None:
+    # taxonomic names are matched ignoring case and extra whitespace
+    if not isinstance(name, str):
+        return None
+
+    return ' '.join(name.split()).casefold()
+
+
+def get_edit_distance(a: str, b: str, max_distance: int) -> int:
+    """ returns the Levenshtein distance between two strings or max_distance + 1 if the distance is greater than
+        max_distance """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, a_char in enumerate(a, start=1):
+        current = [i]
+        for j, b_char in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a_char != b_char)))
+
+        # every path through the rest of the table costs at least the smallest value in this row
+        if min(current) > max_distance:
+            return max_distance + 1
+
+        previous = current
+
+    return previous[-1]
+
+
+class TaxonIndex:
+    """ In memory index of the BCNatnlTaxonCode table by national taxonomic seq, taxonomic serial number (TSN),
+        aphia id and normalized taxonomic name """
+
+    def __init__(self, taxa):
+        self.by_seq: dict[int, bio_models.BCNatnlTaxonCode] = {}
+        self.by_tsn: dict[int, list[bio_models.BCNatnlTaxonCode]] = {}
+        self.by_aphiaid: dict[int, list[bio_models.BCNatnlTaxonCode]] = {}
+        self.by_name: dict[str, list[bio_models.BCNatnlTaxonCode]] = {}
+
+        # names grouped by length, similar names are only searched for among names of a similar length
+        self.names_by_length: dict[int, list[str]] = {}
+        self.similar_names: dict[tuple[str, int], list[str]] = {}
+
+        for taxon in taxa:
+            self.by_seq[taxon.pk] = taxon
+            self.by_tsn.setdefault(taxon.tsn, []).append(taxon)
+            if taxon.aphiaid is not None:
+                self.by_aphiaid.setdefault(taxon.aphiaid, []).append(taxon)
+
+            name = normalize_name(taxon.taxonomic_name)
+            if name not in self.by_name:
+                self.names_by_length.setdefault(len(name), []).append(name)
+            self.by_name.setdefault(name, []).append(taxon)
+
+    @classmethod
+    def load(cls) -> 'TaxonIndex':
+        return cls(bio_models.BCNatnlTaxonCode.objects.order_by('pk'))
+
+    def get(self, national_taxonomic_seq) -> bio_models.BCNatnlTaxonCode | None:
+        return self.by_seq.get(national_taxonomic_seq, None)
+
+    def get_by_tsn(self, tsn) -> list[bio_models.BCNatnlTaxonCode]:
+        return self.by_tsn.get(tsn, [])
+
+    def get_by_aphiaid(self, aphiaid, name: str = None) -> list[bio_models.BCNatnlTaxonCode]:
+        # taxa with the aphia id, if a name is provided only taxa with a matching name are returned
+        taxa = self.by_aphiaid.get(aphiaid, [])
+        if name is not None:
+            name = normalize_name(name)
+            taxa = [taxon for taxon in taxa if normalize_name(taxon.taxonomic_name) == name]
+
+        return taxa
+
+    def get_by_name(self, name: str) -> list[bio_models.BCNatnlTaxonCode]:
+        return self.by_name.get(normalize_name(name), [])
+
+    def find_similar(self, name: str, max_distance: int = MAX_EDIT_DISTANCE) -> list[str]:
+        """ returns the normalized taxonomic names closest to a name that are within max_distance edits of it,
+            for names that may have been misspelt """
+        name = normalize_name(name)
+        if not name:
+            return []
+
+        key = (name, max_distance)
+        if key not in self.similar_names:
+            matches = {}
+            for length in range(len(name) - max_distance, len(name) + max_distance + 1):
+                for candidate in self.names_by_length.get(length, []):
+                    if (distance := get_edit_distance(name, candidate, max_distance)) <= max_distance:
+                        matches[candidate] = distance
+
+            closest = min(matches.values(), default=None)
+            self.similar_names[key] = sorted(candidate for candidate, distance in matches.items()
+                                             if distance == closest)
+
+        return self.similar_names[key]
+
+    def resolve(self, national_taxonomic_seq=None, name: str = None,
+                fuzzy: bool = False) -> bio_models.BCNatnlTaxonCode | None:
+        """ Resolves a taxon by its national taxonomic seq or, if there isn't one, by a name matching exactly one
+            taxon. If fuzzy is True and the name doesn't match a taxon, a single taxon with the closest
+            similar name is used. """
+        if (taxon := self.get(national_taxonomic_seq)) is not None:
+            return taxon
+
+        if len(taxa := self.get_by_name(name)) == 1:
+            return taxa[0]
+
+        if fuzzy and not taxa:
+            similar = self.find_similar(name)
+            if len(similar) == 1 and len(taxa := self.by_name[similar[0]]) == 1:
+                return taxa[0]
+
+        return None
+
+
+def get_taxon_database() -> tuple[str, str]:
+    # the alias and file the router reads taxa from, every mission database uses the 'mission_db' alias
+    database = router.db_for_read(bio_models.BCNatnlTaxonCode)
+    return database, connections[database].settings_dict['NAME']
+
+
+def get_taxon_index() -> TaxonIndex:
+    global _taxon_index, _taxon_index_database
+
+    database = get_taxon_database()
+    with _taxon_index_lock:
+        if _taxon_index is None or _taxon_index_database != database:
+            _taxon_index = TaxonIndex.load()
+            _taxon_index_database = database
+
+        return _taxon_index
+
+
+@receiver([post_save, post_delete], sender=bio_models.BCNatnlTaxonCode)
+def invalidate_taxon_index(**kwargs) -> None:
+    global _taxon_index
+
+    with _taxon_index_lock:
+        _taxon_index = None
@@ -110,6 +110,15 @@ def upload_db_rows(model, rows_to_create: list):
 
 
 # returns the rows to create, rows to update and fields to update
+def get_event_summaries(events: set[int], database: str = None) -> dict[int, core_models.Event]:
+    # events with their action summaries keyed by pk, so an event's start/end location, dates, comments and
+    # sounding aren't queried from its actions again for every bottle or sample of the event
+    events = core_models.Event.objects.using(database).with_summary().filter(pk__in=events)
+    events = events.select_related('mission__data_center', 'station', 'instrument')
+
+    return {event.pk: event for event in events}
+
+
 def get_bcs_d_rows(uploader: str, bottles: QuerySet[core_models.Bottle], batch: models.Bcbatches = None) -> list[models.BcsD]:
     user_logger.info("Creating/updating BCS table")
     bcs_objects_to_create = []
@@ -123,12 +132,13 @@ def get_bcs_d_rows(uploader: str, bottles: QuerySet[core_models.Bottle], batch:
 
     total_bottles = len(bottles)
     date_now_string = datetime.now().strftime("%Y-%m-%d")
+    events = get_event_summaries({bottle.event_id for bottle in bottles}, bottles.db)
 
     for count, bottle in enumerate(bottles):
         if count % 10 == 9:
             user_logger.info(_("Compiling Bottle") + " : %d/%d", (count + 1), total_bottles)
 
-        event = bottle.event
+        event = events[bottle.event_id]
         mission = event.mission
         primary_data_center = mission.data_center
 
@@ -248,16 +258,18 @@ def get_bcs_p_rows(uploader: str, bottles: QuerySet[core_models.Bottle], batch:
 
     total_bottles = len(bottles)
     date_now_string = datetime.now().strftime("%Y-%m-%d")
+    events = get_event_summaries({bottle.event_id for bottle in bottles}, bottles.db)
+    bottle_volumes = core_models.get_computed_volumes(bottles)
 
     for count, bottle in enumerate(bottles):
         if count % 10 == 9:
             user_logger.info(_("Compiling BCS") + " : %d/%d", (count + 1), total_bottles)
         # plankton samples may share bottle_ids, a BCS entry is per bottle, per gear type
-        event = bottle.event
+        event = events[bottle.event_id]
         mission = event.mission
         institute: bio_tables.models.BCDataCenter = mission.data_center
 
-        if event.actions.filter(type=core_models.ActionType.aborted).exists():
+        if any(action.type == core_models.ActionType.aborted for action in event.actions.all()):
             # we don't load aborted events
             continue
 
@@ -266,7 +278,7 @@ def get_bcs_p_rows(uploader: str, bottles: QuerySet[core_models.Bottle], batch:
         m_start_date = mission.start_date
         m_end_date = mission.end_date
 
-        bottle_volume = bottle.computed_volume
+        bottle_volume = bottle_volumes[bottle.pk]
 
         header_slat = bottle.latitude if bottle.latitude else event.start_location[0]
         header_slon = bottle.longitude if bottle.longitude else event.start_location[0]
@@ -405,13 +417,14 @@ def get_bcd_d_rows(uploader: str, samples: QuerySet[core_models.DiscreteSampleVa
 
     total_samples = len(samples)
     date_now_string = datetime.now().strftime("%Y-%m-%d")
+    events = get_event_summaries({ds_sample.sample.bottle.event_id for ds_sample in samples}, samples.db)
     for count, ds_sample in enumerate(samples):
         # dis_data_num = count + dis_data_num
         if count % 10 == 9:
             user_logger.info(_("Compiling updates for BCD Discrete samples") + " : " + "%d/%d", (count + 1), total_samples)
         sample = ds_sample.sample
         bottle = sample.bottle
-        event = bottle.event
+        event = events[bottle.event_id]
         mission = event.mission
 
         # Use the row level datatype if provided otherwise use the mission level datatype
@@ -347,6 +347,34 @@ FIXTURE_DIRS = [
 
 SESSION_COOKIE_AGE = 360
 
+# pandas engine used to read excel sample and plankton files. A faster engine, like 'calamine', can be used if
+# it's installed, otherwise pandas picks the engine for the file type
+EXCEL_ENGINE = env('EXCEL_ENGINE', default=None)
+
+# elog variables that aren't mapped to a required field are kept as core.models.VariableField objects.
+# 'none' doesn't keep them, 'load' keeps them as part of loading the elog and 'defer' keeps them in a background
+# thread after the events and actions are loaded so the mission can be used right away.
+ELOG_VARIABLES = env('ELOG_VARIABLES', default='none')
+
+# SQLite pragmas applied to a mission database each time a connection to it is opened, see
+# settingsdb.utils.apply_connection_profile. Set MISSION_DATABASE_TUNED=True to use them, by default mission databases
+# are opened with the SQLite defaults. Benchmarks loading a BTL directory while reading the sample table showed a small
+# gain, about 10% on the load and no change to typical read times, so the profile isn't on by default.
+#
+# WAL is kept in the mission .sqlite3 file and, while a mission is open, recent changes are kept in -wal and -shm
+# files beside it. settingsdb.utils.close_connection checkpoints the changes back into the .sqlite3 file and returns it
+# to the default journal so the file can be copied on its own. WAL doesn't work on network drives, don't turn the
+# profile on if mission databases are kept on a shared drive.
+MISSION_DATABASE_PROFILE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # negative values are in KiB, about 64MB
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 30000,  # milliseconds
+}
+MISSION_DATABASE_TUNED = env.bool('MISSION_DATABASE_TUNED', default=False)
+
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
@@ -1,5 +1,23 @@
+import os
+import unittest
+
 from django.test import TestCase
 
+from bio_tables.taxon_index import invalidate_taxon_index
+from core.parsers import parser_utils
+
+# benchmarks time large loads and make the test suite much slower, they're only run if the DART_BENCHMARKS environment
+# variable is set, e.g. DART_BENCHMARKS=1 python manage.py test --tag parsers_sample_benchmark
+benchmark = unittest.skipUnless(os.environ.get('DART_BENCHMARKS'), "set DART_BENCHMARKS to run benchmarks")
+
 
 class DartTestCase(TestCase):
     fixtures = ['default_biochem_fixtures']
+
+    def run(self, result=None):
+        # file configurations created by a previous test were rolled back without a post_delete signal, so
+        # they can't be left in the parsers' configuration snapshot
+        parser_utils.invalidate_file_config()
+        # the same goes for taxonomic codes a test added to the taxon index
+        invalidate_taxon_index()
+        return super().run(result)
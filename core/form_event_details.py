@@ -29,7 +29,7 @@ from core.parsers.sensor.btl_ros import logger_notifications as fixed_station_lo
 
 from config.utils import load_svg
 from core.parsers.sensor.qat import QATParser
-from core.parsers.sensor import btl_ros
+from core.parsers.sensor import btl_ros, btl_reader
 
 from settingsdb import models as settings_models
 
@@ -844,7 +844,7 @@ def add_event(request, mission_id, **kwargs):
 
 
 def edit_event(request, event_id):
-    event = models.Event.objects.get(pk=event_id)
+    event = models.Event.objects.with_summary().get(pk=event_id)
 
     # we don't need the edit and delete buttons on the EventDetail card if we're editing
     class NoDeleteEditEventDetails(EventDetails):
@@ -914,7 +914,7 @@ def get_selected_event(request):
         soup.append(card)
         return HttpResponse(soup)
 
-    event = models.Event.objects.get(pk=event_id)
+    event = models.Event.objects.with_summary().get(pk=event_id)
     details_html = render_to_string("core/partials/event_details.html", context={"event": event})
     details_soup = BeautifulSoup(details_html, 'html.parser')
 
@@ -987,7 +987,7 @@ def delete_details(request, event_id):
 
 
 def list_action(request, event_id, editable=False):
-    event = models.Event.objects.get(pk=event_id)
+    event = models.Event.objects.with_summary().get(pk=event_id)
     context = {'event': event, 'editable': editable}
     response = HttpResponse(render_to_string('core/partials/table_action.html', context=context))
     return response
@@ -1014,8 +1014,10 @@ def add_action(request, event_id):
 
         if action_form.is_valid():
             action = action_form.save()
+            # reload the event so the table includes the new action
+            table_event = models.Event.objects.with_summary().get(pk=event.pk)
             table_html = render_to_string('core/partials/table_action.html',
-                                          context={'event': event, "editable": "true"})
+                                          context={'event': table_event, "editable": "true"})
             table_soup = BeautifulSoup(table_html, 'html.parser')
             table_soup.find(id="action_table_id").attrs['hx-swap-oob'] = 'true'
             soup.append(table_soup)
@@ -1225,14 +1227,19 @@ def parse_btl(event, btl_file):
     if not os.path.exists(ros_file):
         raise FileNotFoundError(f"No matching .ros file found for: {btl_file}")
 
-    with open(btl_file, 'r', encoding='cp1252') as btl:
-        btl_input = io.StringIO(btl.read())
+    # the file is only parsed if it hasn't been parsed before or has changed since
+    btl_data = btl_reader.get_btl_file(btl_file)
+    if btl_data['error']:
+        raise btl_data['error']
 
-    with open(ros_file, 'r', encoding='cp1252') as ros:
-        ros_input = io.StringIO(ros.read())
+    ros_input = None
+    if btl_data['ros_config'] is None:
+        with open(ros_file, 'r', encoding='cp1252') as ros:
+            ros_input = io.StringIO(ros.read())
 
-    parser = FixStationParser(event=event, btl_filename=os.path.basename(btl_file),
-                              btl_stream=btl_input, ros_stream=ros_input)
+    parser = FixStationParser(event=event, btl_filename=os.path.basename(btl_file), btl_stream=None,
+                              ros_stream=ros_input, data=btl_reader.get_btl_dataframe(btl_data),
+                              ros_config=btl_data['ros_config'])
     parser.parse()
 
 
@@ -1337,6 +1344,11 @@ def import_btl_events(request, mission_id, **kwargs):
     settings.dir = os.path.dirname(selected_files[0])
     logger.info(f"Selected file directory: {settings.dir}")
 
+    # remember where the files came from so the directory can be synchronized later
+    if mission.bottle_directory != settings.dir:
+        mission.bottle_directory = settings.dir
+        mission.save()
+
     try:
         parser = btl_ros.FixStationBulkParser(mission, selected_files)
         parser.parse()
@@ -1378,6 +1390,67 @@ def import_btl_events(request, mission_id, **kwargs):
     return response
 
 
+def sync_btl_events(request, mission_id, **kwargs):
+    # reload the missions bottle directory, only files that are new or have changed since they were last loaded
+    # are parsed
+    mission = models.Mission.objects.get(pk=mission_id)
+    soup = BeautifulSoup('', 'html.parser')
+
+    if request.method == 'GET':
+        attrs = {
+            'alert_area_id': "div_id_bottle_event_message",
+            'message': _("Loading"),
+            'logger': btl_ros.logger_notifications.name,
+            'hx-post': request.path,
+            'hx-trigger': 'load',
+            'hx-target': "#div_id_bottle_event_message"
+        }
+        return HttpResponse(core_forms.websocket_post_request_alert(**attrs))
+
+    soup.append(msg_area := soup.new_tag("div", id="div_id_bottle_event_message"))
+
+    if not mission.bottle_directory:
+        attrs = {
+            'component_id': "div_id_bottle_event_message",
+            'message': _("No bottle directory, use the BTL import to select files first"),
+            'alert_type': 'warning'
+        }
+        msg_area.append(core_forms.blank_alert(**attrs))
+        return HttpResponse(soup)
+
+    try:
+        counts = btl_ros.sync_bottle_directory(mission)
+        message = (_("New") + f" : {counts['new']}, " + _("Changed") + f" : {counts['changed']}, " +
+                   _("Unchanged") + f" : {counts['unchanged']}, " + _("Removed") + f" : {counts['removed']}")
+
+        alert_type = 'success'
+        if models.FileError.objects.filter(mission=mission, code__gte=100, code__lte=299).exists():
+            message = _("Issues detected, see file errors") + f" - {message}"
+            alert_type = 'warning'
+
+        attrs = {
+            'component_id': "div_id_bottle_event_message",
+            'message': message,
+            'alert_type': alert_type
+        }
+        msg_area.append(core_forms.blank_alert(**attrs))
+    except Exception as ex:
+        logger.exception(ex)
+        message = _("There was an issue reading one or more of the files") + f" : '{mission.bottle_directory}' - {str(ex)}"
+        attrs = {
+            'component_id': "div_id_bottle_event_message",
+            'message': message,
+            'alert_type': 'danger'
+        }
+        msg_area.append(core_forms.blank_alert(**attrs))
+        err = models.MissionError(mission=mission, message=message, type=models.ErrorType.validation)
+        err.save()
+
+    response = HttpResponse(soup)
+    response['Hx-Trigger'] = "event_updated"
+    return response
+
+
 def list_events(request, mission_id, **kwargs):
     mission = models.Mission.objects.get(pk=mission_id)
 
@@ -1451,6 +1524,7 @@ event_detail_urls = [
 
     path(f'event/event/import/<int:mission_id>/', import_elog_events, name="form_event_import_events_elog"),
     path(f'event/btl/import/<int:mission_id>/', import_btl_events, name="form_event_import_events_btl"),
+    path(f'event/btl/sync/<int:mission_id>/', sync_btl_events, name="form_event_sync_events_btl"),
     path(f'event/event/list/<int:mission_id>/', list_events, name="form_event_get_events"),
     path(f'event/new/<int:mission_id>/', add_event, name="form_event_add_event"),
     path(f'event/new/<int:mission_id>/<int:event>/', add_event, name="form_event_add_event"),
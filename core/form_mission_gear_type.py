@@ -2,7 +2,6 @@ import io
 import os
 import threading
 import time
-import math
 
 import numpy as np
 
@@ -247,18 +246,18 @@ def process_samples_func(queryset, **kwargs) -> BeautifulSoup:
     value_headers = [h[0] for h in headers]
     table_headers = [h[1] for h in headers]
 
-    bottle_list = queryset.values(*value_headers)
+    bottle_list = queryset.values('id', *value_headers)
 
     df = read_frame(bottle_list)
 
     if instrument_type == core_models.InstrumentType.net:
-        bottle_dict = {b.bottle_id: b for b in queryset}
-        for i, row in df.iterrows():
-            if row['volume'] is None or (row['volume'] is not None and math.isnan(row['volume'])):
-                volume = bottle_dict[row['bottle_id']].computed_volume[1]
-
-                df.at[i, 'volume'] = volume if volume else "-----"
+        # bottles without a provided volume show the volume computed for them
+        bottle_volumes = core_models.get_computed_volumes(queryset)
+        missing = df['volume'].isna()
+        df['volume'] = df['volume'].astype(object)
+        df.loc[missing, 'volume'] = [bottle_volumes[pk][1] or "-----" for pk in df.loc[missing, 'id']]
 
+    df = df[value_headers]
     df.columns = table_headers
 
     html = df.to_html(index=False)
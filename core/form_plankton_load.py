@@ -22,7 +22,7 @@ from core import models as core_models
 from core import forms as core_forms
 from core.parsers import PlanktonParser
 from core.parsers.PlanktonParser import parse_zooplankton, parse_phytoplankton, parse_zooplankton_bioness
-from core.parsers.SampleParser import get_excel_dataframe
+from core.parsers.SampleParser import get_excel_dataframe, get_sheet_names
 from core.parsers.BionessParser import parse_bioness
 
 from config.utils import load_svg
@@ -47,10 +47,7 @@ class PlanktonForm(forms.Form):
 
         if 'file_data' in kwargs:
             self.file_data = kwargs.pop('file_data')
-            if isinstance(self.file_data, BufferedReader):
-                tabs = pd.ExcelFile(self.file_data).sheet_names
-            else:
-                tabs = pd.ExcelFile(BytesIO(self.file_data)).sheet_names
+            tabs = get_sheet_names(self.file_data)
 
         super().__init__(*args, **kwargs)
 
@@ -162,7 +159,8 @@ def load_plankton(request, mission_id):
         dict_vals['header'] = header
 
         try:
-            dataframe = get_excel_dataframe(stream=data, sheet_number=tab, header_row=(header-1))
+            # only the rows shown in the preview are needed
+            dataframe = get_excel_dataframe(stream=data, sheet_number=tab, header_row=(header-1), nrows=10)
             start = dataframe.index.start if hasattr(dataframe.index, 'start') else 0
             dict_vals['header'] = max(start + 1, header)
 
@@ -123,10 +123,7 @@ class SampleTypeConfigForm(forms.ModelForm):
         if 'file_data' in kwargs:
             self.file_data = kwargs.pop('file_data')
             if file_type and file_type.startswith('xls'):
-                if isinstance(self.file_data, BufferedReader):
-                    tabs = pd.ExcelFile(self.file_data).sheet_names
-                else:
-                    tabs = pd.ExcelFile(BytesIO(self.file_data)).sheet_names
+                tabs = SampleParser.get_sheet_names(self.file_data)
 
 
         super().__init__(*args, **kwargs)
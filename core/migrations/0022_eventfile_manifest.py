@@ -0,0 +1,28 @@
+# Generated by Django 6.1.2 on 2026-10-17 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_mission_biochem_discreate_mission_seq_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventfile',
+            name='file_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 hash of the file contents when it was loaded', max_length=64, null=True, verbose_name='File Hash'),
+        ),
+        migrations.AddField(
+            model_name='eventfile',
+            name='file_modified',
+            field=models.FloatField(blank=True, help_text='Modified time of the file, in seconds, when it was loaded', null=True, verbose_name='File Modified'),
+        ),
+        migrations.AddField(
+            model_name='eventfile',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, help_text='Size of the file, in bytes, when it was loaded', null=True, verbose_name='File Size'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-17 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_eventfile_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='mid_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='$@MID@$ Hash'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.1.2 on 2026-10-17 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_action_mid_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='action',
+            index=models.Index(fields=['event', 'date_time'], name='core_action_event_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bottle',
+            index=models.Index(fields=['bottle_id', 'event'], name='core_bottle_bottle_event_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discretesamplevalue',
+            index=models.Index(fields=['sample', 'replicate'], name='core_discrete_sample_rep_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['mission', 'event_id'], name='core_event_mission_event_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileerror',
+            index=models.Index(fields=['file_name', 'mission', 'code'], name='core_fileerror_file_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sample',
+            index=models.Index(fields=['bottle', 'type'], name='core_sample_bottle_type_idx'),
+        ),
+    ]
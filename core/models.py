@@ -3,7 +3,7 @@ import numpy as np
 
 from core.utils import distance
 
-from django.db.models.functions import Lower
+from django.db.models.functions import Lag, Lower
 from django.utils import timezone
 
 from django.db import models
@@ -171,7 +171,27 @@ class Station(models.Model):
         ordering = ('name',)
 
 
+class EventQuerySet(models.QuerySet):
+
+    def with_summary(self):
+        """ Annotates each event with its first and last action and prefetches its actions so an event's summary
+            properties (start/end location and date, drift, comments and sounding action) don't query the
+            actions table """
+        actions = Action.objects.filter(event=models.OuterRef('pk'))
+        summary_actions = {'start': actions.order_by('date_time', 'pk'), 'end': actions.order_by('-date_time', '-pk')}
+
+        annotations = {}
+        for position, ordered_actions in summary_actions.items():
+            for field in ('pk', 'date_time', 'latitude', 'longitude'):
+                annotations[f'summary_{position}_{field}'] = models.Subquery(ordered_actions.values(field)[:1])
+
+        actions = models.Prefetch('actions', queryset=Action.objects.with_drift())
+        return self.annotate(**annotations).prefetch_related(actions)
+
+
 class Event(models.Model):
+    objects = EventQuerySet.as_manager()
+
     mission = models.ForeignKey(Mission, on_delete=models.CASCADE, related_name='events', verbose_name=_("Mission"))
 
     event_id = models.IntegerField(verbose_name=_("Event ID"))
@@ -219,39 +239,51 @@ class Event(models.Model):
 
         return (self.end_sample_id - self.sample_id) + 1
 
+    def _get_summary_action(self, position: str):
+        # the first ('start') or last ('end') action of the event, from the Event.objects.with_summary() annotations
+        # if the event was loaded with them
+        if hasattr(self, f'summary_{position}_pk'):
+            if (pk := getattr(self, f'summary_{position}_pk')) is None:
+                return None
+
+            return Action(pk=pk, event_id=self.pk, date_time=getattr(self, f'summary_{position}_date_time'),
+                          latitude=getattr(self, f'summary_{position}_latitude'),
+                          longitude=getattr(self, f'summary_{position}_longitude'))
+
+        actions = self.actions.order_by("date_time")
+        return actions.first() if position == 'start' else actions.last()
+
     @property
     def start_location(self):
-        action = self.actions.order_by("date_time").first()
+        action = self._get_summary_action('start')
         if action:
             return [action.latitude, action.longitude]
 
     @property
     def end_location(self):
-        action = self.actions.order_by("date_time").last()
+        action = self._get_summary_action('end')
         if action:
             return [action.latitude, action.longitude]
 
     @property
     def start_date(self) -> datetime.datetime:
-        action = self.actions.order_by("date_time").first()
+        action = self._get_summary_action('start')
         if action:
             return action.date_time
 
     @property
     def end_date(self) -> datetime.datetime:
-        action = self.actions.order_by("date_time").last()
+        action = self._get_summary_action('end')
         if action:
             return action.date_time
 
     @property
     def drift_distance(self):
-        actions = self.actions.all()
-        if not actions.exists():
+        a1 = self._get_summary_action('start')
+        if not a1:
             return ""
 
-        a1 = actions.first()
-        a2 = actions.last()
-
+        a2 = self._get_summary_action('end')
         if a1 == a2:
             return ""
 
@@ -261,12 +293,11 @@ class Event(models.Model):
 
     @property
     def drift_time(self):
-        actions = self.actions.order_by("date_time")
-        if not actions.exists():
+        a1 = self._get_summary_action('start')
+        if not a1:
             return ""
 
-        a1 = actions.first()
-        a2 = actions.last()
+        a2 = self._get_summary_action('end')
 
         return a2.date_time - a1.date_time
 
@@ -282,26 +313,40 @@ class Event(models.Model):
 
     @property
     def sounding_action(self):
+        if 'actions' in getattr(self, '_prefetched_objects_cache', {}):
+            # the actions were prefetched by Event.objects.with_summary()
+            actions = self.actions.all()
+
+            def get_first_action(action_type):
+                return next((action for action in actions if action.type == action_type), None)
+        else:
+            def get_first_action(action_type):
+                return self.actions.filter(type=action_type).first()
+
         # use the bottom action if it exists
-        sounding_action = self.actions.filter(type=ActionType.bottom)
-        if sounding_action.exists() and sounding_action.first().sounding:
-            return sounding_action.first()
+        sounding_action = get_first_action(ActionType.bottom)
+        if sounding_action and sounding_action.sounding:
+            return sounding_action
 
         logger.error("No Bottom Action for depth sounding using Recovered Action")
-        sounding_action = self.actions.filter(type=ActionType.recovered)
-        if sounding_action.exists() and sounding_action.first().sounding:
-            return sounding_action.first()
+        sounding_action = get_first_action(ActionType.recovered)
+        if sounding_action and sounding_action.sounding:
+            return sounding_action
 
         logger.error("No Recovered Action for depth sounding using Deployed Action")
-        sounding_action = self.actions.filter(type=ActionType.deployed)
-        if sounding_action.exists() and sounding_action.first().sounding:
-            return sounding_action.first()
+        sounding_action = get_first_action(ActionType.deployed)
+        if sounding_action and sounding_action.sounding:
+            return sounding_action
 
         raise ValueError("No action with valid sounding")
 
     class Meta:
         unique_together = ("event_id", "instrument")
         ordering = ("event_id",)
+        indexes = [
+            # parsers look events up by their event_id within a mission
+            models.Index(fields=['mission', 'event_id'], name='core_event_mission_event_idx'),
+        ]
 
     def __str__(self):
         return f"{self.event_id} - {self.station.name} - {self.instrument.name}"
@@ -336,10 +381,30 @@ class ActionType(models.IntegerChoices):
         return cls.__members__.__contains__(value.lower().replace(' ', '_'))
 
 
+class ActionQuerySet(models.QuerySet):
+
+    def with_drift(self):
+        """ Annotates each action with the time and position of the action before it in its event so the drift
+            properties of an action don't query the event's actions. The previous action is found among the actions
+            in this queryset, so filter it by event, not by anything that would leave out actions of an event. """
+        window = {
+            'partition_by': [models.F('event')],
+            'order_by': [models.F('date_time').asc(), models.F('pk').asc()],
+        }
+
+        return self.annotate(
+            previous_date_time=models.Window(Lag('date_time'), **window),
+            previous_latitude=models.Window(Lag('latitude'), **window),
+            previous_longitude=models.Window(Lag('longitude'), **window),
+        )
+
+
 # Elog events are typically made up of multiple actions. A CTD is 'deployed', it's noted when it reaches 'bottom'
 # and then a final action once it's 'recovered'. The action model allows us to track when and where those actions
 # are noted so we can track information about them.
 class Action(models.Model):
+    objects = ActionQuerySet.as_manager()
+
     event = models.ForeignKey(Event, verbose_name=_("Event"), related_name="actions", on_delete=models.CASCADE)
 
     date_time = models.DateTimeField(verbose_name=_("Date/Time"))
@@ -354,6 +419,10 @@ class Action(models.Model):
     # mid helps us track issues, but in the event that this was a manually entered action this will be null
     mid = models.IntegerField(verbose_name="$@MID@$", null=True, blank=True)
 
+    # hash of the elog message object this action was loaded from so unchanged messages can be skipped when the
+    # elog is reloaded
+    mid_hash = models.CharField(verbose_name=_("$@MID@$ Hash"), max_length=64, null=True, blank=True)
+
     type = models.IntegerField(verbose_name=_("Action Type"), choices=ActionType.choices)
     # if the action is an unknown type then leave a comment here identifying what the 'other' type is
     action_type_other = models.CharField(verbose_name=_("Action Other"), max_length=50, blank=True, null=True,
@@ -366,9 +435,24 @@ class Action(models.Model):
 
     comment = models.CharField(verbose_name=_("Comment"), max_length=255, blank=True, null=True)
 
+    def _get_previous_action(self):
+        # the action before this one in its event, from the Action.objects.with_drift() annotations if the action was
+        # loaded with them
+        if hasattr(self, 'previous_date_time'):
+            if self.previous_date_time is None:
+                return None
+
+            return Action(event_id=self.event_id, date_time=self.previous_date_time,
+                          latitude=self.previous_latitude, longitude=self.previous_longitude)
+
+        # the same order as with_drift(), an action at the same time as another follows the one added first
+        return self.event.actions.filter(
+            models.Q(date_time__lt=self.date_time) | models.Q(date_time=self.date_time, pk__lt=self.pk)
+        ).order_by('date_time', 'pk').last()
+
     @property
     def drift_distance(self):
-        previous_action = self.event.actions.filter(date_time__lt=self.date_time).last()
+        previous_action = self._get_previous_action()
 
         if not previous_action:
             return ""
@@ -382,7 +466,7 @@ class Action(models.Model):
 
     @property
     def drift_time(self):
-        previous_action = self.event.actions.filter(date_time__lt=self.date_time).last()
+        previous_action = self._get_previous_action()
         if not previous_action:
             return 0
 
@@ -393,6 +477,10 @@ class Action(models.Model):
 
     class Meta:
         ordering = ('date_time',)
+        indexes = [
+            # the first, last and previous actions of an event are found by date within the event
+            models.Index(fields=['event', 'date_time'], name='core_action_event_date_idx'),
+        ]
 
 
 # In reality a sensor is physically attached to an instrument, but depending on a station's depth a sensor might be
@@ -418,9 +506,8 @@ class VariableName(models.Model):
 
 
 # Variable fields are used to keep elog variables that we don't immediately use so that we can optionally query
-# them later. I feel like we should have a flag that can turn the processing of these on and off because
-# processing variables for an elog takes about 75% of the time required to process an elog. It would really speed
-# up the process to remove them if they aren't needed.
+# them later. Processing variables for an elog used to take about 75% of the time required to process an elog so
+# settings.ELOG_VARIABLES turns them off, loads them in bulk with the elog or defers them to a background thread.
 class VariableField(models.Model):
     action = models.ForeignKey(Action, verbose_name=_("Action"), related_name="variables", on_delete=models.CASCADE)
     name = models.ForeignKey(VariableName, verbose_name=_("Field Name"), related_name="variables",
@@ -474,41 +561,11 @@ class Bottle(models.Model):
     # returnes the volume method sequence number and the computed or provided volume -> (volume_method_seq, volume)
     @property
     def computed_volume(self):
-        # if the volume was set by loading a volume file for nets like BIONESS then we just want
-        # to use the volume as it was provided
-        if self.volume:
-            # 90000001 - electronic readout of volume of water filtered
-            return [90000001, self.volume]
-
-        # if no volume has been provided then we have to compute the volume.
-        if self.gear_type.pk == 90000102 or self.gear_type.pk == 90000105:
-            diameter = None
-            if self.gear_type.pk == 90000102: # this is a 3/4 meter diameter ringnet
-                diameter = 0.75
-            elif self.gear_type.pk == 90000105: # this is a 1/2 meter diameter ringnet
-                diameter = 0.5
-
-            area = np.pi * np.power(float(diameter / 2), 2)
-            if self.event.flow_start and self.event.flow_end:
-                # if there is a flow meter use (flow_end-flow_start)*0.3 has the height of the cylinder
-                # else use the wire out.
-                # multiply by 0.3 to compensate for the flow meters prop rotation
-
-                # account for the case that the flow_start was close to 100,000 and the flowmeter counter rolled
-                # over back to zero in which case a number like 417 was suppose to be 100,417
-                adjusted_flow_end = self.event.flow_end
-                if self.event.flow_start > 97000 and self.event.flow_end < 3000:
-                    adjusted_flow_end = adjusted_flow_end + 100000
-
-                height = (adjusted_flow_end - self.event.flow_start) * 0.3
-                # 90000002 - volume calculated from recorded revolutions and flow meter calibrations
-                return [90000002, np.round(height * area, 1)]
-            elif self.event.wire_out:
-                # 90000004 - estimate of volume calculated using depth and gear mouth opening (wire angle ignored)
-                return [90000004, np.round(self.event.wire_out * area, 1)]
-
-        # 90000010 - not applicable; perhaps net lost; perhaps data from a bottle
-        return [90000010, None]
+        event = self.event
+        methods, volumes = compute_volumes([self.gear_type_id], [self.volume], [event.flow_start], [event.flow_end],
+                                           [event.wire_out])
+
+        return [int(methods[0]), None if np.isnan(volumes[0]) else volumes[0]]
 
     def __str__(self):
         return f"{int(self.bottle_id)}:{self.pressure}:[{self.latitude}, {self.longitude}]"
@@ -516,6 +573,82 @@ class Bottle(models.Model):
     class Meta:
         unique_together = ['event', 'bottle_number']
         ordering = ['bottle_id']
+        indexes = [
+            # samples are matched to bottles by bottle_id, across events and within the events of a mission
+            models.Index(fields=['bottle_id', 'event'], name='core_bottle_bottle_event_idx'),
+        ]
+
+
+# diameters, in meters, of the ringnets volumes can be computed for by gear type
+RING_NET_DIAMETERS = {
+    90000102: 0.75,  # 3/4 meter diameter ringnet
+    90000105: 0.5,  # 1/2 meter diameter ringnet
+}
+
+# the flowmeter counter rolls over back to zero after 99,999
+FLOWMETER_ROLLOVER = 100000
+
+
+def compute_volumes(gear_types, volumes, flow_starts, flow_ends, wire_outs) -> tuple[np.ndarray, np.ndarray]:
+    """ Computes the volume method sequence number and volume for a set of net bottles from equal length sequences of
+        their gear type, provided volume and their event's flow meter start/end and wire out. Missing values can be
+        None. Returns (volume_method_seqs, volumes), volumes are NaN where a volume couldn't be determined. """
+    gear_types = np.asarray(gear_types, dtype=float)
+    volumes = np.asarray(volumes, dtype=float)
+    flow_starts = np.asarray(flow_starts, dtype=float)
+    flow_ends = np.asarray(flow_ends, dtype=float)
+    wire_outs = np.asarray(wire_outs, dtype=float)
+
+    diameters = np.select([gear_types == gear for gear in RING_NET_DIAMETERS], list(RING_NET_DIAMETERS.values()),
+                          np.nan)
+    areas = np.pi * np.power(diameters / 2, 2)
+
+    # account for the case that the flow_start was close to 100,000 and the flowmeter counter rolled
+    # over back to zero in which case a number like 417 was suppose to be 100,417
+    rolled_over = (flow_starts > 97000) & (flow_ends < 3000)
+    adjusted_flow_ends = np.where(rolled_over, flow_ends + FLOWMETER_ROLLOVER, flow_ends)
+
+    # if there is a flow meter use (flow_end-flow_start)*0.3 has the height of the cylinder else use the wire out.
+    # multiply by 0.3 to compensate for the flow meters prop rotation
+    flow_volumes = np.round((adjusted_flow_ends - flow_starts) * 0.3 * areas, 1)
+    wire_volumes = np.round(wire_outs * areas, 1)
+
+    # missing and zero values are both treated as not provided
+    provided = np.nan_to_num(volumes) != 0
+    ring_net = ~np.isnan(diameters)
+    has_flow = (np.nan_to_num(flow_starts) != 0) & (np.nan_to_num(flow_ends) != 0)
+    has_wire_out = np.nan_to_num(wire_outs) != 0
+
+    conditions = [
+        # if the volume was set by loading a volume file for nets like BIONESS then we just want
+        # to use the volume as it was provided
+        provided,
+        ring_net & has_flow,
+        ring_net & has_wire_out,
+    ]
+    methods = np.select(conditions, [
+        90000001,  # electronic readout of volume of water filtered
+        90000002,  # volume calculated from recorded revolutions and flow meter calibrations
+        90000004,  # estimate of volume calculated using depth and gear mouth opening (wire angle ignored)
+    ], 90000010)  # not applicable; perhaps net lost; perhaps data from a bottle
+    computed = np.select(conditions, [volumes, flow_volumes, wire_volumes], np.nan)
+
+    return methods, computed
+
+
+def get_computed_volumes(bottles: models.QuerySet) -> dict[int, list]:
+    """ Bottle.computed_volume for every bottle in a queryset, like all the net bottles of a mission, in one query.
+        Returns {bottle.pk: [volume_method_seq, volume]} """
+    rows = list(bottles.values_list('pk', 'gear_type_id', 'volume', 'event__flow_start', 'event__flow_end',
+                                    'event__wire_out'))
+    if not rows:
+        return {}
+
+    pks, gear_types, volumes, flow_starts, flow_ends, wire_outs = zip(*rows)
+    methods, volumes = compute_volumes(gear_types, volumes, flow_starts, flow_ends, wire_outs)
+
+    return {pk: [method, None if np.isnan(volume) else volume]
+            for pk, method, volume in zip(pks, methods.tolist(), volumes.tolist())}
 
 
 # if a biochem datatype is different from the default sample type for a specific mission use the mission sample type
@@ -580,6 +713,11 @@ class Sample(models.Model):
     def __str__(self):
         return f'{self.type}: {self.bottle.bottle_id}'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['bottle', 'type'], name='core_sample_bottle_type_idx'),
+        ]
+
 
 # Most samples loaded are 'Discrete' chemical or mineral measurements. The DiscreteSampleValue table tracks those
 # values, but can also be used to keep track of replicates (when a sample has more than one value), data quality flags
@@ -620,6 +758,11 @@ class DiscreteSampleValue(models.Model):
     def __str__(self):
         return f'{self.sample}: {self.value}'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['sample', 'replicate'], name='core_discrete_sample_rep_idx'),
+        ]
+
 
 class PlanktonSample(models.Model):
     file = models.FileField(verbose_name=_("File"))
@@ -708,6 +851,15 @@ class EventFile(models.Model):
     file_name = models.CharField(max_length=100, verbose_name=_("File Name"),
                                  help_text=_("Just the name of the file, does not include the file path."))
 
+    # manifest of the file as it was when it was loaded, used to skip files that haven't changed when a directory
+    # of files is synced
+    file_hash = models.CharField(max_length=64, verbose_name=_("File Hash"), null=True, blank=True,
+                                 help_text=_("SHA-256 hash of the file contents when it was loaded"))
+    file_modified = models.FloatField(verbose_name=_("File Modified"), null=True, blank=True,
+                                      help_text=_("Modified time of the file, in seconds, when it was loaded"))
+    file_size = models.BigIntegerField(verbose_name=_("File Size"), null=True, blank=True,
+                                       help_text=_("Size of the file, in bytes, when it was loaded"))
+
 
 # These are some of the common errors that occur when processing data and allow us to sort various errors depending
 # on what problems we're using the errors to solve.
@@ -775,4 +927,10 @@ class FileError(AbstractError):
     def __str__(self):
         return f"{self.file_name}: {self.mission} - {self.get_type_display()} : {self.message}"
 
+    class Meta:
+        indexes = [
+            # errors are cleared by file name, sometimes without the mission, and by a parser's range of codes
+            models.Index(fields=['file_name', 'mission', 'code'], name='core_fileerror_file_code_idx'),
+        ]
+
 
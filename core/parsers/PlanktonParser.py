@@ -1,6 +1,8 @@
 import logging
 import re
 
+from typing import Mapping
+
 import numpy as np
 from django.template.backends.django import reraise
 
@@ -8,12 +10,13 @@ from pandas import DataFrame
 
 from django.db import IntegrityError
 from django.utils.translation import gettext as _
-from django.db.models import QuerySet
+from django.db.models import QuerySet, Max
 
 from core import models as core_models
 from core.parsers import parser_utils
 
 from bio_tables import models as bio_models
+from bio_tables.taxon_index import TaxonIndex, get_taxon_index
 from config.utils import updated_value
 
 from settingsdb.models import FileConfiguration
@@ -94,7 +97,9 @@ def get_or_create_bioness_file_config() -> QuerySet[FileConfiguration]:
 def parse_phytoplankton(mission: core_models.Mission, filename: str, dataframe: DataFrame):
     database = mission._state.db
 
-    config = get_or_create_phyto_file_config()
+    # mapped fields are looked up for every row, so they come from the in-process configuration snapshot
+    get_or_create_phyto_file_config()
+    config = parser_utils.get_file_config('phytoplankton')
 
     total_rows = dataframe.shape[0]
 
@@ -104,7 +109,7 @@ def parse_phytoplankton(mission: core_models.Mission, filename: str, dataframe:
     # test to make sure the column names we're looking for are in the file, report the errors if they aren't
     core_models.FileError.objects.filter(file_name=filename,
                                                          type=core_models.ErrorType.plankton).delete()
-    for key in [f.mapped_field for f in config.all()]:
+    for key in config.values():
         if key.upper() not in dataframe.columns:
             msg = _("Missing or misspelled column name : ") + key
             core_models.FileError.objects.create(mission=mission, file_name=filename, message=msg,
@@ -116,7 +121,16 @@ def parse_phytoplankton(mission: core_models.Mission, filename: str, dataframe:
     # for phytoplankton bottles are associated with a CTD bottle
     events = mission.events.filter(instrument__type=core_models.InstrumentType.ctd)
     events = events.exclude(actions__type=core_models.ActionType.aborted)
-    bottles = core_models.Bottle.objects.filter(event__in=events)
+
+    # load the bottles, taxonomic codes and existing plankton samples the file refers to once rather than for each row
+    bottle_ids = dataframe[config['id']].dropna().unique().tolist()
+    bottles = get_bottle_lookup(core_models.Bottle.objects.filter(event__in=events, bottle_id__in=bottle_ids))
+
+    taxa_index = get_taxon_index()
+
+    existing_plankton = {}
+    for plankton in core_models.PlanktonSample.objects.filter(bottle__in=bottles.values()).order_by('pk'):
+        existing_plankton.setdefault((plankton.bottle_id, plankton.taxa_id), plankton)
 
     mission.file_errors.filter(file_name=filename).delete()
 
@@ -128,11 +142,11 @@ def parse_phytoplankton(mission: core_models.Mission, filename: str, dataframe:
         line_number = line + dataframe.index.start + 1
         user_logger.info(_("Creating plankton sample") + ": %d/%d", line_number, total_rows)
 
-        bottle_id = row[config.get(required_field='id').mapped_field]
+        bottle_id = row[config['id']]
 
         logger.debug(bottle_id)
 
-        if not bottles.filter(bottle_id=bottle_id).exists():
+        if (bottle := bottles.get(bottle_id, None)) is None:
             err = core_models.FileError(mission=mission, file_name=filename, line=line_number,
                                         type=core_models.ErrorType.plankton,
                                         message=_("Bottle does not exist for sample") + f" : {bottle_id}")
@@ -140,26 +154,23 @@ def parse_phytoplankton(mission: core_models.Mission, filename: str, dataframe:
             logger.error(err.message)
             continue
 
-        bottle = bottles.get(bottle_id=bottle_id)
-
-        aphiaid = row[config.get(required_field='aphia_id').mapped_field]
-        name = row[config.get(required_field='taxonomic_name').mapped_field]
-        count = row[config.get(required_field='count').mapped_field]
-        certainty = row[config.get(required_field='certainty').mapped_field]
-        modifier = row[config.get(required_field='modifier').mapped_field]
-        comment = row[config.get(required_field='comments').mapped_field]
+        aphiaid = row[config['aphia_id']]
+        name = row[config['taxonomic_name']]
+        count = row[config['count']]
+        certainty = row[config['certainty']]
+        modifier = row[config['modifier']]
+        comment = row[config['comments']]
         comment = comment if str(comment) != 'nan' else ""
 
         base_history = 90000000
-        life_history = row[config.get(required_field='life_history_seq').mapped_field]
+        life_history = row[config['life_history_seq']]
         if life_history < base_history:
             life_history = life_history + base_history
 
         stage = life_history if not np.isnan(life_history) else None
 
-        if (taxa := bio_models.BCNatnlTaxonCode.objects.filter(aphiaid=aphiaid,
-                                                                               taxonomic_name__iexact=name)).exists():
-            taxa = taxa[0].national_taxonomic_seq
+        if taxa_codes := taxa_index.get_by_aphiaid(aphiaid, str(name)):
+            taxa = taxa_codes[0].national_taxonomic_seq
             logger.debug(taxa)
         else:
             err = core_models.FileError(mission=mission, file_name=filename, line=line_number,
@@ -170,7 +181,7 @@ def parse_phytoplankton(mission: core_models.Mission, filename: str, dataframe:
             logger.error(err.message)
             continue
 
-        if not bottle.plankton_data.filter(taxa__national_taxonomic_seq=taxa).exists():
+        if (plankton := existing_plankton.get((bottle.pk, taxa), None)) is None:
             plankton = core_models.PlanktonSample(file=filename, bottle=bottle)
 
             plankton.count = count
@@ -185,7 +196,6 @@ def parse_phytoplankton(mission: core_models.Mission, filename: str, dataframe:
         else:
             updated_fields = set('')
 
-            plankton = bottle.plankton_data.get(taxa=taxa)
             updated_fields.add(updated_value(plankton, 'count', count))
             updated_fields.add(updated_value(plankton, 'taxa_id', taxa))
             updated_fields.add(updated_value(plankton, 'modifier', modifier))
@@ -196,7 +206,8 @@ def parse_phytoplankton(mission: core_models.Mission, filename: str, dataframe:
 
             updated_fields.remove('')
             if len(updated_fields) > 0:
-                update_plankton['objects'].append(plankton)
+                if plankton not in update_plankton['objects']:
+                    update_plankton['objects'].append(plankton)
                 update_plankton['fields'].update(updated_fields)
 
     core_models.FileError.objects.bulk_create(errors)
@@ -212,13 +223,18 @@ def parse_phytoplankton(mission: core_models.Mission, filename: str, dataframe:
 
 
 # values taken from AZMP template
-def get_gear_type(mesh_size: int):
+def get_gear_type(mesh_size: int, gear_types: dict[int, bio_models.BCGear] = None):
     if mesh_size == 202:
-        return bio_models.BCGear.objects.get(pk=90000102)
+        gear_seq = 90000102
     elif mesh_size == 76 or mesh_size == 70:
-        return bio_models.BCGear.objects.get(pk=90000105)
+        gear_seq = 90000105
+    else:
+        return None
 
-    return None
+    if gear_types is not None:
+        return gear_types.get(gear_seq, None)
+
+    return bio_models.BCGear.objects.get(pk=gear_seq)
 
 
 # values taken from AZMP template
@@ -257,16 +273,50 @@ def get_split_fraction(proc_code: int, split: float):
 
 # Gets the BioChem taxanomic code based on the taxa_id or the taxa_name if a matching ID can't be found
 # a Value Error is raised.
-def get_taxonomic_code(taxa_id: int, taxa_name: str) -> bio_models.BCNatnlTaxonCode:
-    if taxa := bio_models.BCNatnlTaxonCode.objects.filter(pk=taxa_id):
-        taxa = taxa.first()
-    elif ((taxa := bio_models.BCNatnlTaxonCode.objects.filter(taxonomic_name__iexact=taxa_name))
-          and taxa.count() == 1):
-        taxa = taxa.first()
-    else:
-        raise ValueError(_("Could not find matching taxonomic entry in National Taxon Code Lookup"))
+def get_taxonomic_code(taxa_id: int, taxa_name: str, taxa_index: TaxonIndex = None) -> bio_models.BCNatnlTaxonCode:
+    if taxa_index is None:
+        taxa_index = get_taxon_index()
+
+    if taxa := taxa_index.resolve(taxa_id, taxa_name):
+        return taxa
+
+    message = _("Could not find matching taxonomic entry in National Taxon Code Lookup")
+    if not taxa_index.get_by_name(taxa_name) and (similar := taxa_index.find_similar(taxa_name)):
+        # the name may have been misspelt, suggest the closest names rather than guessing which was meant
+        message += " (" + _("did you mean") + f" {', '.join(similar)})"
+
+    raise ValueError(message)
+
+
+def get_bottle_lookup(bottles: QuerySet) -> dict[int, core_models.Bottle]:
+    # bottles keyed by bottle_id, if there's more than one bottle with an id the first is used
+    bottle_lookup = {}
+    for bottle in bottles.select_related('event'):
+        bottle_lookup.setdefault(bottle.bottle_id, bottle)
+
+    return bottle_lookup
 
-    return taxa
+
+def get_plankton_lookup(bottles) -> dict[tuple, core_models.PlanktonSample]:
+    # existing zooplankton samples keyed by the (bottle, taxa, stage, sex, proc_code) that identifies them
+    plankton_lookup = {}
+    for plankton in core_models.PlanktonSample.objects.filter(bottle__in=bottles).order_by('pk'):
+        key = (plankton.bottle_id, plankton.taxa_id, plankton.stage_id, plankton.sex_id, plankton.proc_code)
+        plankton_lookup.setdefault(key, plankton)
+
+    return plankton_lookup
+
+
+def get_net_event_lookup() -> dict[int, list[core_models.Event]]:
+    # net events keyed by event_id, with the date of their last action, to create ringnet bottles for
+    events = core_models.Event.objects.filter(instrument__type=core_models.InstrumentType.net)
+    events = events.select_related('instrument').annotate(last_action_date=Max('actions__date_time'))
+
+    net_events = {}
+    for event in events.order_by('pk'):
+        net_events.setdefault(event.event_id, []).append(event)
+
+    return net_events
 
 def set_data_column(plankton: core_models.PlanktonSample, what_was_it, value, updated_fields):
     match what_was_it:
@@ -321,19 +371,20 @@ def validate_bottle_event(event: core_models.Event, bottle_id: int):
         raise ValueError(_("Bottle ID doesn't match expected IDs for the event"))
 
 
-def get_or_create_bottle(bottle_id: int, event_id: int, create_bottles: dict, existing_bottles: QuerySet,
-                         gear_type: int, mesh_size: int, start_pressure: float = None, end_pressure: float = 0):
+def get_or_create_bottle(bottle_id: int, event_id: int, create_bottles: dict, existing_bottles: dict,
+                         net_events: dict, update_bottles: dict, gear_type: int, mesh_size: int,
+                         start_pressure: float = None, end_pressure: float = 0):
+    # new bottles are added to create_bottles and changed bottles to update_bottles to be written by write_bottles()
 
     if bottle_id in create_bottles.keys():
         # use a recently created bottle if it exists, but isn't in the database
          bottle = create_bottles[bottle_id]
-    elif (bottle := existing_bottles.filter(bottle_id=bottle_id)).exists():
+    elif (bottle := existing_bottles.get(bottle_id, None)) is not None:
         # use an existing bottle if one hasn't been recently created
-        bottle = bottle.first()
-
         try:
             validate_bottle_event(bottle.event, bottle.bottle_id)
         except ValueError as ex:
+            existing_bottles.pop(bottle_id)
             bottle.delete()
             raise ex
 
@@ -348,7 +399,9 @@ def get_or_create_bottle(bottle_id: int, event_id: int, create_bottles: dict, ex
             updates.remove("")
 
         if updates:
-            bottle.save()
+            if bottle not in update_bottles['objects']:
+                update_bottles['objects'].append(bottle)
+            update_bottles['fields'].update(updates)
     else:
         # create a new bottle if it doesn't exist and hasn't been recently created bottles, then add the new
         # bottle to the recently created bottles array
@@ -362,16 +415,16 @@ def get_or_create_bottle(bottle_id: int, event_id: int, create_bottles: dict, ex
 
         # if the ringnet bottle doesn't exist in the database or in the created bottles dictionary,
         # it needs to be created and added to the created bottles dictionary
-        try:
-            event = core_models.Event.objects.get(event_id=event_id, instrument__type=core_models.InstrumentType.net)
-        except core_models.Event.DoesNotExist as e:
+        events = net_events.get(event_id, [])
+        if len(events) > 1:
+            events = [event for event in events if str(mesh_size).lower() in event.instrument.name.lower()]
+
+        if not events:
             message = _("Net event matching ID doesn't exist.")
             raise ValueError(message)
-        except core_models.Event.MultipleObjectsReturned as e:
-            event = core_models.Event.objects.get(event_id=event_id, instrument__type=core_models.InstrumentType.net,
-                                                  instrument__name__icontains=mesh_size)
 
-        if not event.end_date:
+        event = events[0]
+        if not event.last_action_date:
             raise ValueError(_("Event is missing required actions"))
 
         try:
@@ -380,12 +433,38 @@ def get_or_create_bottle(bottle_id: int, event_id: int, create_bottles: dict, ex
             raise ex
 
         bottle = core_models.Bottle(bottle_id=bottle_id, event=event, gear_type_id=gear_type, mesh_size=mesh_size,
-                                    pressure=start_pressure, end_pressure=end_pressure, closed=event.end_date)
-        bottle.save()
+                                    pressure=start_pressure, end_pressure=end_pressure, closed=event.last_action_date)
         create_bottles[bottle_id] = bottle
 
     return bottle
 
+
+def get_zooplankton_lookups(dataframe: DataFrame, config: Mapping[str, str], ringnet_bottles: QuerySet) -> dict:
+    # The reference tables, bottles and existing plankton samples a zooplankton file needs, loaded once per file
+    bottle_ids = dataframe[config['id']].dropna().unique().tolist()
+
+    bottles = get_bottle_lookup(ringnet_bottles.filter(bottle_id__in=bottle_ids))
+    return {
+        'taxa': get_taxon_index(),
+        'sex_codes': set(bio_models.BCSex.objects.values_list('pk', flat=True)),
+        'life_history_codes': set(bio_models.BCLifeHistory.objects.values_list('pk', flat=True)),
+        'gear_types': {gear.pk: gear for gear in bio_models.BCGear.objects.all()},
+        'bottles': bottles,
+        'plankton': get_plankton_lookup(bottles.values()),
+        'net_events': get_net_event_lookup(),
+    }
+
+
+def write_bottles(create_bottles: dict, update_bottles: dict):
+    if len(create_bottles) > 0:
+        logger.info(_("Creating Bottles"))
+        core_models.Bottle.objects.bulk_create(create_bottles.values())
+
+    if len(update_bottles['objects']) > 0:
+        logger.info(_("Updating Bottles"))
+        core_models.Bottle.objects.bulk_update(update_bottles['objects'], list(update_bottles['fields']))
+
+
 def write_plankton_data(filename, errors, create_plankton, update_plankton):
     if len(create_plankton) > 0:
         logger.info(_("Creating Zooplankton Samples"))
@@ -435,7 +514,9 @@ def write_plankton_data(filename, errors, create_plankton, update_plankton):
 
 
 def parse_zooplankton(mission: core_models.Mission, filename: str, dataframe: DataFrame, row_mapping=None):
-    config = get_or_create_zoo_file_config()
+    # mapped fields are looked up for every row, so they come from the in-process configuration snapshot
+    get_or_create_zoo_file_config()
+    config = parser_utils.get_file_config('zooplankton')
 
     total_rows = dataframe.shape[0]
 
@@ -448,13 +529,17 @@ def parse_zooplankton(mission: core_models.Mission, filename: str, dataframe: Da
     # don't care about aborted events
     # events = events.exclude(actions__type=core_models.ActionType.aborted)
     # ringnet_bottles: QuerySet = core_models.Bottle.objects.filter(event__in=events)
-    events = {e.event_id: e.instrument for e in mission.events.filter(instrument__type=core_models.InstrumentType.net).exclude(actions__type=core_models.ActionType.aborted)}
+    events = {e.event_id: e.instrument for e in mission.events.filter(instrument__type=core_models.InstrumentType.net).exclude(actions__type=core_models.ActionType.aborted).select_related('instrument')}
     ringnet_bottles: QuerySet = core_models.Bottle.objects.filter(event__instrument__type=core_models.InstrumentType.net)
 
+    # load the reference tables and the bottles and plankton samples the file refers to once rather than for each row
+    lookups = get_zooplankton_lookups(dataframe, config, ringnet_bottles)
+
     mission.file_errors.filter(file_name=filename).delete()
 
     create_plankton = {}
     create_bottles = {}
+    update_bottles = {'objects': [], 'fields': set()}
     update_plankton = {'objects': [], 'fields': set()}
     errors = []
     for line, row in dataframe.iterrows():
@@ -468,28 +553,28 @@ def parse_zooplankton(mission: core_models.Mission, filename: str, dataframe: Da
 
         bottle = None
 
-        bottle_id = row[config.get(required_field='id').mapped_field]
-        event_id = row[config.get(required_field='event').mapped_field]
+        bottle_id = row[config['id']]
+        event_id = row[config['event']]
 
-        taxa_name = row[config.get(required_field='taxa').mapped_field]
-        ncode = row[config.get(required_field='ncode').mapped_field]
+        taxa_name = row[config['taxa']]
+        ncode = row[config['ncode']]
         taxa_id = 90000000000000 + int(ncode)
 
         # 90000000 means unassigned
-        stage_id = row[config.get(required_field='stage').mapped_field]
+        stage_id = row[config['stage']]
         stage = 90000000 + stage_id if not np.isnan(stage_id) else 90000000
 
         # 90000000 means unassigned
-        sex_id = row[config.get(required_field='sex').mapped_field]
+        sex_id = row[config['sex']]
         sex = 90000000 + sex_id if not np.isnan(sex_id) else 90000000
 
-        mesh_size = row[config.get(required_field='gear').mapped_field]
-        proc_code = row[config.get(required_field='procedure_code').mapped_field]
-        split = row[config.get(required_field='split_fraction').mapped_field]
-        value = row[config.get(required_field='data_value').mapped_field]
-        what_was_it = row[config.get(required_field='what_was_it').mapped_field]
+        mesh_size = row[config['gear']]
+        proc_code = row[config['procedure_code']]
+        split = row[config['split_fraction']]
+        value = row[config['data_value']]
+        what_was_it = row[config['what_was_it']]
 
-        depth_value = row[config.get(required_field='depth').mapped_field]
+        depth_value = row[config['depth']]
 
         if isinstance(depth_value, str) and re.match(r'^\d+-\d+$', depth_value):
             pressure, end_pressure = map(float, depth_value.split('-'))
@@ -509,9 +594,9 @@ def parse_zooplankton(mission: core_models.Mission, filename: str, dataframe: Da
                 NET_REGISTER = core_models.NET_TYPES[net_type_name]
 
             gear_type_code = NET_REGISTER.get('GEAR_TYPE', None)
-            gear_type = bio_models.BCGear.objects.get(pk=gear_type_code)
+            gear_type = lookups['gear_types'].get(gear_type_code, None)
         else:
-            gear_type = get_gear_type(mesh_size)
+            gear_type = get_gear_type(mesh_size, lookups['gear_types'])
 
         if gear_type is None:
             error_message = _("Could not identify gear type for mesh size ") + str(mesh_size)
@@ -529,7 +614,7 @@ def parse_zooplankton(mission: core_models.Mission, filename: str, dataframe: Da
         split_fraction = get_split_fraction(proc_code=proc_code, split=split)
 
         try:
-            taxa = get_taxonomic_code(taxa_id, taxa_name)
+            taxa = get_taxonomic_code(taxa_id, taxa_name, lookups['taxa'])
         except ValueError as e:
             message = (_("Line ") + str(line) + " " + str(e) + f" '{taxa_id}' - '{taxa_name}'")
             error = core_models.FileError(mission=mission, file_name=filename, message=message, line=line_number,
@@ -537,7 +622,7 @@ def parse_zooplankton(mission: core_models.Mission, filename: str, dataframe: Da
             error.save()
             has_errors = True
 
-        if not bio_models.BCSex.objects.filter(pk=sex).exists():
+        if sex not in lookups['sex_codes']:
             error_message = _("Could not identify Biochem Sex code ") + str(sex)
             message = (_("Line ") + str(line) + " " + error_message)
             error = core_models.FileError(mission=mission, file_name=filename, message=message, line=line_number,
@@ -548,7 +633,7 @@ def parse_zooplankton(mission: core_models.Mission, filename: str, dataframe: Da
             logger.error(message)
             has_errors = True
 
-        if not bio_models.BCLifeHistory.objects.filter(pk=stage).exists():
+        if stage not in lookups['life_history_codes']:
             error_message = _("Could not identify Biochem Life History code ") + str(stage)
             message = (_("Line ") + str(line) + " " + error_message)
             error = core_models.FileError(mission=mission, file_name=filename, message=message, line=line_number,
@@ -561,13 +646,14 @@ def parse_zooplankton(mission: core_models.Mission, filename: str, dataframe: Da
         try:
             # Do not create bottles if there are issues with the data.
             if not has_errors:
-                bottle = get_or_create_bottle(bottle_id, event_id, create_bottles, ringnet_bottles,
+                bottle = get_or_create_bottle(bottle_id, event_id, create_bottles, lookups['bottles'],
+                                              lookups['net_events'], update_bottles,
                                               gear_type=gear_type.pk, mesh_size=mesh_size,
                                               start_pressure=pressure, end_pressure=end_pressure)
         except ValueError as e:
             message = str(e)
             message += " " + _("Bottle ID") + f" : {bottle_id}"
-            message += " " + _("Event") + f" : {row[config.get(required_field='event').mapped_field]}"
+            message += " " + _("Event") + f" : {row[config['event']]}"
             message += " " + _("Line") + f" : {line_number}"
 
             err = core_models.FileError(mission=mission, file_name=filename, line=line_number, message=message,
@@ -585,11 +671,9 @@ def parse_zooplankton(mission: core_models.Mission, filename: str, dataframe: Da
 
         plankton_key = f'{bottle_id}_{ncode}_{stage_id}_{sex_id}_{proc_code}'
 
-        plankton = core_models.PlanktonSample.objects.filter(
-            bottle=bottle, taxa=taxa, stage_id=stage, sex_id=sex, proc_code=proc_code)
-        if plankton.exists():
+        existing_key = (bottle.pk, taxa.pk, stage, sex, proc_code)
+        if (plankton := lookups['plankton'].get(existing_key, None)) is not None:
             # taxa, bottle, stage and sex are all part of a primary key and therefore cannot be updated
-            plankton = plankton.first()
 
             # Gear_type, min_sieve, max_sieve, split_fraction and values based on 'what_was_it' can be updated
             updated_fields.add(updated_value(plankton, 'min_sieve', min_sieve))
@@ -617,6 +701,8 @@ def parse_zooplankton(mission: core_models.Mission, filename: str, dataframe: Da
             plankton = create_plankton[plankton_key]
             set_plankton_values(plankton, what_was_it, value)
 
+    write_bottles(create_bottles, update_bottles)
+
     if len(errors) > 0:
         core_models.FileError.objects.bulk_create(errors)
     else:
@@ -624,7 +710,9 @@ def parse_zooplankton(mission: core_models.Mission, filename: str, dataframe: Da
 
 
 def parse_zooplankton_bioness(mission: core_models.Mission, filename: str, dataframe: DataFrame, row_mapping=None):
-    config = get_or_create_bioness_file_config()
+    # mapped fields are looked up for every row, so they come from the in-process configuration snapshot
+    get_or_create_bioness_file_config()
+    config = parser_utils.get_file_config('bioness')
 
     total_rows = dataframe.shape[0]
 
@@ -633,16 +721,20 @@ def parse_zooplankton_bioness(mission: core_models.Mission, filename: str, dataf
 
     # for zooplankton bottles are associated with a RingNet bottles, which won't exist and will have to be created
     events = mission.events.filter(instrument__type=core_models.InstrumentType.net).exclude(actions__type=core_models.ActionType.aborted)
-    existing_events = {e.event_id: e for e in events}
+    existing_events = {e.event_id: e for e in events.select_related('instrument')}
 
     # don't care about aborted events
     # events = events.exclude(actions__type=core_models.ActionType.aborted)
     ringnet_bottles = core_models.Bottle.objects.filter(event__in=events)
 
+    # load the reference tables and the bottles and plankton samples the file refers to once rather than for each row
+    lookups = get_zooplankton_lookups(dataframe, config, ringnet_bottles)
+
     mission.file_errors.filter(file_name=filename).delete()
 
     create_plankton = {}
     create_bottles = {}
+    update_bottles = {'objects': [], 'fields': set()}
     update_plankton = {'objects': [], 'fields': set()}
     errors = []
     GEAR_TYPE_REGISTER = core_models.NET_TYPES['BIONESS']
@@ -654,31 +746,31 @@ def parse_zooplankton_bioness(mission: core_models.Mission, filename: str, dataf
 
         user_logger.info(_("Creating plankton sample") + ": %d/%d", line_number, total_rows)
 
-        bottle_id = row[config.get(required_field='id').mapped_field]
-        event_id = row[config.get(required_field='event').mapped_field]
+        bottle_id = row[config['id']]
+        event_id = row[config['event']]
         if event_id in existing_events:
             instrument = existing_events[event_id].instrument
 
-        taxa_name = row[config.get(required_field='taxa').mapped_field]
-        ncode = row[config.get(required_field='ncode').mapped_field]
+        taxa_name = row[config['taxa']]
+        ncode = row[config['ncode']]
         taxa_id = 90000000000000 + int(ncode)
 
         # 90000000 means unassigned
-        stage_id = row[config.get(required_field='stage').mapped_field]
+        stage_id = row[config['stage']]
         stage = 90000000 + stage_id if not np.isnan(stage_id) else 90000000
 
         # 90000000 means unassigned
-        sex_id = row[config.get(required_field='sex').mapped_field]
+        sex_id = row[config['sex']]
         sex = 90000000 + sex_id if not np.isnan(sex_id) else 90000000
 
-        mesh_size = row[config.get(required_field='gear').mapped_field]
-        proc_code = row[config.get(required_field='procedure_code').mapped_field]
-        split = row[config.get(required_field='split_fraction').mapped_field]
-        value = row[config.get(required_field='data_value').mapped_field]
-        what_was_it = row[config.get(required_field='what_was_it').mapped_field]
-        pressure = row[config.get(required_field='start_depth').mapped_field]
-        end_pressure = row[config.get(required_field='end_depth').mapped_field]
-        qc_flag = row[config.get(required_field='data_qc_code').mapped_field]
+        mesh_size = row[config['gear']]
+        proc_code = row[config['procedure_code']]
+        split = row[config['split_fraction']]
+        value = row[config['data_value']]
+        what_was_it = row[config['what_was_it']]
+        pressure = row[config['start_depth']]
+        end_pressure = row[config['end_depth']]
+        qc_flag = row[config['data_qc_code']]
 
         gear_type = GEAR_TYPE_REGISTER['GEAR_TYPE']
         min_sieve = get_min_sieve(proc_code=proc_code, mesh_size=mesh_size)
@@ -686,7 +778,7 @@ def parse_zooplankton_bioness(mission: core_models.Mission, filename: str, dataf
         split_fraction = get_split_fraction(proc_code=proc_code, split=split)
 
         try:
-            taxa = get_taxonomic_code(taxa_id, taxa_name)
+            taxa = get_taxonomic_code(taxa_id, taxa_name, lookups['taxa'])
         except ValueError as e:
             message = (_("Line ") + str(line) + " " + str(e) + f" '{taxa_id}' - '{taxa_name}'")
             error = core_models.FileError(mission=mission, file_name=filename, message=message, line=line_number,
@@ -695,13 +787,14 @@ def parse_zooplankton_bioness(mission: core_models.Mission, filename: str, dataf
             continue
 
         try:
-            bottle = get_or_create_bottle(bottle_id, event_id, create_bottles, ringnet_bottles,
+            bottle = get_or_create_bottle(bottle_id, event_id, create_bottles, lookups['bottles'],
+                                          lookups['net_events'], update_bottles,
                                           gear_type=gear_type, mesh_size=mesh_size,
                                           start_pressure=pressure, end_pressure=end_pressure)
         except ValueError as e:
             message = str(e)
             message += " " + _("Bottle ID") + f" : {bottle_id}"
-            message += " " + _("Event") + f" : {row[config.get(required_field='event').mapped_field]}"
+            message += " " + _("Event") + f" : {row[config['event']]}"
             message += " " + _("Line") + f" : {line_number}"
 
             err = core_models.FileError(mission=mission, file_name=filename, line=line_number, message=message,
@@ -714,11 +807,9 @@ def parse_zooplankton_bioness(mission: core_models.Mission, filename: str, dataf
 
         plankton_key = f'{bottle_id}_{ncode}_{stage_id}_{sex_id}_{proc_code}'
 
-        plankton = core_models.PlanktonSample.objects.filter(bottle=bottle, taxa=taxa, stage_id=stage,
-                                                             sex_id=sex, proc_code=proc_code)
-        if plankton.exists():
+        existing_key = (bottle.pk, taxa.pk, stage, sex, proc_code)
+        if (plankton := lookups['plankton'].get(existing_key, None)) is not None:
             # taxa, bottle, stage and sex are all part of a primary key and therefore cannot be updated
-            plankton = plankton.first()
 
             # Gear_type, min_sieve, max_sieve, split_fraction and values based on 'what_was_it' can be updated
             updated_fields.add(updated_value(plankton, 'min_sieve', min_sieve))
@@ -749,4 +840,5 @@ def parse_zooplankton_bioness(mission: core_models.Mission, filename: str, dataf
             plankton = create_plankton[plankton_key]
             set_plankton_values(plankton, what_was_it, value)
 
-    write_plankton_data(filename, errors, create_plankton, update_plankton)
\ No newline at end of file
+    write_bottles(create_bottles, update_bottles)
+    write_plankton_data(filename, errors, create_plankton, update_plankton)
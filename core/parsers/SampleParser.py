@@ -1,15 +1,25 @@
 import csv
+import hashlib
+import importlib.util
+import threading
 import pandas as pd
 import numpy as np
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 from io import BufferedReader, BytesIO, StringIO
+from typing import Iterable
 
 from datetime import datetime
 
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Q, QuerySet
 from django.db.models.functions import Lower
 
+from django.utils import translation
 from django.utils.translation import gettext as _
 
 import core.models
@@ -25,6 +35,25 @@ logger_notifications = logging.getLogger('dart.user.sampleparser')
 # popular excel extensions
 excel_extensions = ['xls', 'xlsx', 'xlsm']
 
+# packages that have to be installed to use an excel engine, when the package name isn't the engine name
+excel_engine_packages = {'calamine': 'python_calamine'}
+
+# number of rows, after the first row, searched for a header when an excel header row isn't provided
+HEADER_SNIFF_ROWS = 25
+
+# number of rows read at a time when streaming a csv/dat sample file
+CSV_CHUNK_SIZE = 10000
+
+# number of threads used to prepare sample configs that share a file. Only the calling thread writes to the database
+SAMPLE_LOAD_WORKERS = 4
+
+# parsed excel sheets, keyed by (file content hash, tab, header row, columns), so a workbook loaded for several sample configs
+# or reloaded without changes isn't parsed again
+SHEET_CACHE_SIZE = 8
+_sheet_cache = OrderedDict()
+_sheet_names_cache = OrderedDict()
+_sheet_cache_lock = threading.Lock()
+
 
 def get_file_configs(data, file_type):
     sample_configs = settings_models.SampleTypeConfig.objects.filter(file_type=file_type).order_by('tab')
@@ -38,7 +67,10 @@ def get_file_configs(data, file_type):
         data = BytesIO(data)
 
     # Pre-load Excel file object if needed
-    xls_file = pd.ExcelFile(data) if file_type in excel_extensions else None
+    xls_file = pd.ExcelFile(data, engine=get_excel_engine()) if file_type in excel_extensions else None
+
+    # Decode csv files once rather than for every tab/skip combination
+    csv_lines = data.decode('utf-8').split("\r\n") if file_type == 'csv' or file_type == 'dat' else None
 
     for sample_type in sample_configs:
         # Use tab and skip as cache key
@@ -47,8 +79,8 @@ def get_file_configs(data, file_type):
         if cache_key not in tab_headers_cache:
             # Only read headers once for each tab/skip combination
             if file_type == 'csv' or file_type == 'dat':
-                _, _, field_choices = get_headers(data, file_type, sample_type.tab, sample_type.skip)
-                lowercase_fields = {field[0] for field in field_choices}  # Use set for O(1) lookups
+                _, csv_header = get_csv_header(csv_lines, sample_type.skip)
+                lowercase_fields = {str(field).lower() for field in csv_header}  # Use set for O(1) lookups
 
             elif file_type in excel_extensions:
                 # Check if tab exists
@@ -103,7 +135,8 @@ def get_headers(data, file_type: str, tab: int = 0, skip: int = -1) -> [int, int
     elif file_type in excel_extensions:
         # users won't understand indexing starts at 0 so whatever we're showing them
         # make sure to subtract one
-        df = get_excel_dataframe(data, tab, skip)
+        # only the header is needed
+        df = get_excel_dataframe(data, tab, skip, nrows=1)
         skip = df.index.start if skip == -1 else skip
         field_choices = [(str(column).lower(), column) for column in df.columns]
 
@@ -131,82 +164,140 @@ def get_csv_header(file_string: str, header_row: int = -1) -> [int, list]:
     return skip, header_fields
 
 
-def get_excel_dataframe(stream, sheet_number=-1, header_row=-1):
-    """ given a file stream this function will iterate over the rows
+def get_excel_engine() -> str | None:
+    """ The pandas engine used to read excel files. A faster engine, like 'calamine', can be selected with the
+        EXCEL_ENGINE setting and is used if it's installed, otherwise pandas picks the engine for the file type """
+    engine = getattr(settings, 'EXCEL_ENGINE', None)
+    if engine and importlib.util.find_spec(excel_engine_packages.get(engine, engine)) is not None:
+        return engine
+
+    return None
+
+
+def get_sheet_names(data) -> list[str]:
+    """ Returns the tab names of an excel file. Sheet names are cached by the file's content hash, forms ask for the
+        tabs of the same file every time they're redrawn """
+    if isinstance(data, BufferedReader):
+        stream = data
+        stream.seek(0)
+        data = stream.read()
+        stream.seek(0)
+
+    content_hash = hashlib.sha256(data).hexdigest()
+    with _sheet_cache_lock:
+        if content_hash in _sheet_names_cache:
+            _sheet_names_cache.move_to_end(content_hash)
+            return _sheet_names_cache[content_hash]
+
+    with pd.ExcelFile(BytesIO(data), engine=get_excel_engine()) as xls:
+        sheet_names = list(xls.sheet_names)
+
+    with _sheet_cache_lock:
+        _sheet_names_cache[content_hash] = sheet_names
+        while len(_sheet_names_cache) > SHEET_CACHE_SIZE:
+            _sheet_names_cache.popitem(last=False)
+
+    return sheet_names
+
+
+def get_excel_dataframe(stream, sheet_number=-1, header_row=-1, columns: Iterable[str] = None, nrows: int = None):
+    """ given a file stream this function will sniff the first few rows
         to find the most likely row to use as a column header row then
-        will return the dataframe """
-    # iterate over the dataframe until the header column has been found.
-    if isinstance(stream, (bytes, BytesIO)):
+        will return the dataframe.
+
+        If columns are provided only those columns (case-insensitive) are loaded, if nrows is provided only that
+        many rows after the header are loaded """
+    if isinstance(stream, bytes):
         stream = BytesIO(stream)
 
-    if header_row < 0:
-        df = pd.read_excel(io=stream, sheet_name=sheet_number)
-        df = find_header(df, header_row)
-    else:
-        df = pd.read_excel(io=stream, sheet_name=sheet_number, header=header_row)
+    usecols = None
+    if columns is not None:
+        columns = {str(column).lower() for column in columns}
+        usecols = lambda column: str(column).lower() in columns
+
+    with pd.ExcelFile(stream, engine=get_excel_engine()) as xls:
+        if header_row >= 0:
+            return xls.parse(sheet_name=sheet_number, header=header_row, usecols=usecols, nrows=nrows)
+
+        # only the rows that could be a header are read to find the header, instead of the whole sheet
+        header_rows = xls.parse(sheet_name=sheet_number, header=None, nrows=HEADER_SNIFF_ROWS + 1)
+        header_row = find_header(header_rows)
+        df = xls.parse(sheet_name=sheet_number, header=header_row, usecols=usecols, nrows=nrows)
+
+    if header_row > 0:
+        # keep the header as it appears in the file, rather than the names pandas gives blank or repeated columns,
+        # and index the rows from the header line
+        header = header_rows.iloc[header_row].tolist()
+        if usecols is None:
+            df.columns = [header[i] if i < len(header) else np.nan for i in range(df.shape[1])]
+        df.index = pd.RangeIndex(header_row, header_row + df.shape[0])
 
     return df
 
 
-def find_header(df, header_row):
-    if header_row < 0:
-        for i in range(25):
-            temp_df = find_header(df, i)
-            columns = [c for c in temp_df.columns if not pd.isna(c)]
-            if len(columns) <= 1:
-                # if only one column was returned, this is not the data we're looking for
-                continue
+def find_header(df: pd.DataFrame) -> int:
+    """ given the first rows of a sheet, read without a header, returns the most likely row to be the header.
+        Row 0 is used if no better row is found. """
+    for header_row in range(1, min(HEADER_SNIFF_ROWS + 1, df.shape[0])):
+        columns = [c for c in df.iloc[header_row] if not pd.isna(c)]
+        if len(columns) <= 1:
+            # if only one column was returned, this is not the data we're looking for
+            continue
 
-            if False in [isinstance(c, str) for c in columns]:
-                # if the columns are not all strings, this is not the data we're looking for
-                continue
+        if False in [isinstance(c, str) for c in columns]:
+            # if the columns are not all strings, this is not the data we're looking for
+            continue
 
-            test_col = [c.split(":")[0].lower() for c in columns]
-            if test_col.count('unnamed') / len(columns) > 0.75:
-                # if more than 3/4 of the columns are 'unnamed', this is not the data we're looking for
-                continue
+        test_col = [c.split(":")[0].lower() for c in columns]
+        if test_col.count('unnamed') / len(columns) > 0.75:
+            # if more than 3/4 of the columns are 'unnamed', this is not the data we're looking for
+            continue
 
-            if temp_df.shape[1] / df.shape[1] < 0.75:
-                # if more than 3/4 of the columns were removed, this is not the data we're looking for
-                continue
+        return header_row
 
-            return temp_df
+    return 0
 
-    elif 0 <= header_row < df.shape[0]:
-        header = df.iloc[header_row]
-        df = df[header_row + 1:]
-        df.columns = header
 
-        # if the user says this is the header line then it's the header line
-        # reshap the data to remove columns that do not have column names
-        # columns = [c for c in df.columns if not pd.isna(c)]
-        # df = df.loc[:, columns]
+class SplitState:
+    """ Carries the last sample id and the highest replicate given to each sample id from one call of
+        split_sample to the next so a file read in chunks is split the same way as a file read in one piece. """
 
-    return df
+    def __init__(self):
+        # the last sample id, and if it was marked for removal, used to fill blank ids at the start of a chunk
+        self.sample_id = np.nan
+        self.removed = np.nan
 
+        # sample id -> highest replicate already given to that id
+        self.replicates = pd.Series(dtype=int)
 
-def _split_function(x):
-    if isinstance(x, str):
-        # if the value of x is a string, try to split it
-        try:
-            s_id, r_id = str(x).split("_") if '_' in str(x) else [x, np.nan]
-        except ValueError as ex:
-            raise ValueError(_("Badly formatted sample id") + f": {x}")
-    else:
-        # if the value of x is a number keep it and create a nan replica to go with it
-        s_id, r_id = [x, np.nan] if not pd.isna(x) else [np.nan, np.nan]
 
-    # if the s_id cannot be cast to an int mark it for removal in the next step
-    if not pd.isna(s_id):
-        try:
-            int(s_id)
-        except ValueError:
-            s_id = 'N/A'
+def get_replicates(sample_ids: pd.Series, replicates: pd.Series, highest: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """ An explicit replicate (495600_2) is kept, a blank replicate is one more than the highest replicate given to
+        the sample id so far. Each replicate only depends on the rows before it, so the replicates are the same
+        however the file is split into chunks.
 
-    return s_id, r_id
+        highest is the highest replicate given to each sample id by previous chunks, returns the replicates and the
+        updated highest replicates """
+    blank = replicates.isna()
+    if blank.all():
+        replicates = (sample_ids.groupby(sample_ids).cumcount() + 1 + sample_ids.map(highest).fillna(0)).astype(int)
+    elif blank.any():
+        # explicit and blank replicates are mixed, each row depends on the rows before it
+        highest_so_far = highest.to_dict()
+        values = []
+        for sample_id, replicate in zip(sample_ids.tolist(), replicates.tolist()):
+            if pd.isna(replicate):
+                replicate = highest_so_far.get(sample_id, 0) + 1
+            highest_so_far[sample_id] = max(highest_so_far.get(sample_id, 0), replicate)
+            values.append(replicate)
+        replicates = pd.Series(values, index=sample_ids.index).astype(int)
 
+    highest = pd.concat([highest, replicates.groupby(sample_ids).max()]).groupby(level=0).max()
+    return replicates, highest
 
-def split_sample(dataframe: pd.DataFrame, file_settings: settings_models.SampleTypeConfig) -> pd.DataFrame:
+
+def split_sample(dataframe: pd.DataFrame, file_settings: settings_models.SampleTypeConfig,
+                 state: SplitState = None) -> pd.DataFrame:
     """ if the sample column of the dataframe is of a string type and contains an underscore
         it should be split into s_id and r_id columns """
 
@@ -215,216 +306,580 @@ def split_sample(dataframe: pd.DataFrame, file_settings: settings_models.SampleT
     if not file_settings.allow_blank:
         dataframe = dataframe[dataframe[file_settings.sample_field].notna()]
 
-    # if samples have underscores in their column split, them up and create the initial 's_id', 'r_id' columns
-    dataframe[[sid, rid]] = dataframe[file_settings.sample_field].apply(
-        lambda x: pd.Series(_split_function(x))
-    )
+    samples = dataframe[file_settings.sample_field]
+    is_text = samples.map(lambda x: isinstance(x, str))
+    text = samples[is_text].astype(str)
 
-    # copy s_ids to nan rows
-    if dataframe[sid].isnull().values.any():
-        dataframe[sid] = dataframe[sid].ffill()
+    # a sample id can have at most one underscore separating the sample id from the replicate id
+    if not (badly_formatted := text[text.str.count('_') > 1]).empty:
+        raise ValueError(_("Badly formatted sample id") + f": {badly_formatted.iloc[0]}")
+
+    # if samples have underscores in their column split, them up and create the initial 's_id', 'r_id' columns
+    # if the value is a number keep it and create a nan replica to go with it
+    s_ids = samples.astype(object)
+    r_ids = pd.Series(np.nan, index=samples.index, dtype=object)
+
+    # if the s_id cannot be read as an integer mark it for removal in the next step
+    valid = pd.Series(True, index=samples.index)
+    if is_text.any():
+        parts = text.str.partition('_')
+        s_ids[is_text] = parts[0]
+        r_ids[is_text] = parts[2].where(parts[1] == '_', np.nan)
+        valid[is_text] = parts[0].str.fullmatch(r'\s*[+-]?\d+\s*')
+
+    present = s_ids.notna()
+    dataframe = dataframe.assign(**{sid: pd.to_numeric(s_ids.where(valid & present)), rid: r_ids})
+
+    # copy s_ids to nan rows, a blank following an id that was marked for removal is also removed
+    removed = (~valid).astype(float).where(present).ffill()
+    dataframe[sid] = dataframe[sid].ffill()
+    if state is not None:
+        removed = removed.fillna(state.removed)
+        dataframe[sid] = dataframe[sid].fillna(state.sample_id)
+        if not dataframe.empty:
+            state.sample_id = dataframe[sid].iloc[-1]
+            state.removed = removed.iloc[-1]
 
     # drop and 's_id' row that is not numeric, keeping any nan rows
-    dataframe = dataframe[dataframe["sid"] != "N/A"]
+    dataframe = dataframe[removed.ne(1)]
 
     # Drop rows that that have no data in the value columns
     dataframe = dataframe.dropna(subset=[file_settings.value_field])
 
-    # set the replicate ids
-    if dataframe[rid].isnull().values.any():
-        tmp = dataframe[[sid, rid]].groupby(sid, group_keys=True).apply(
-            lambda x: pd.Series((np.arange(len(x)) + 1), x.index)
-        )
-        # sort the temp array holding all the rids by their row number so they line up
-        # with the dataframe and then assign them to the rid column
-        dataframe[rid] = tmp.sort_index(level=1).values
+    # set the replicate ids, continuing from the replicates of a previous chunk if there was one
+    highest = state.replicates if state is not None else pd.Series(dtype=int)
+    replicates = pd.to_numeric(dataframe[rid].replace('', np.nan))
+    dataframe[rid], highest = get_replicates(dataframe[sid], replicates, highest)
+
+    if state is not None:
+        state.replicates = highest
 
-    dataframe[[sid, rid]] = dataframe[[sid, rid]].apply(pd.to_numeric)
     return dataframe
 
 
-# once all the options are figured out (e.g what tab, what's the sample row, what's the value column)
-# this function will convert the dataframe into a sample
-def parse_data_frame(mission: core_models.Mission, sample_config: settings_models.SampleTypeConfig,
-                     file_name: str, dataframe: pd.DataFrame):
-    database = mission._state.db
+def get_config_columns(sample_config: settings_models.SampleTypeConfig) -> list[str]:
+    fields = [sample_config.sample_field, sample_config.value_field, sample_config.limit_field,
+              sample_config.flag_field, sample_config.comment_field]
+    return [field.lower() for field in fields if field]
+
+
+def read_csv_chunks(stream, *sample_configs: settings_models.SampleTypeConfig, chunk_size: int = None):
+    """ Reads a csv/dat file stream in chunks of chunk_size rows, CSV_CHUNK_SIZE by default, only parsing the columns
+        the sample configs use, so the memory required to load a file doesn't depend on the size of the file. All
+        the sample configs have to share the same header row. """
+    chunk_size = chunk_size if chunk_size else CSV_CHUNK_SIZE
+    columns = {column for sample_config in sample_configs for column in get_config_columns(sample_config)}
+    reader = pd.read_csv(filepath_or_buffer=stream, header=sample_configs[0].skip, chunksize=chunk_size,
+                         usecols=lambda column: str(column).lower() in columns)
+    with reader:
+        for dataframe in reader:
+            # Remove any row that is *all* nan values
+            yield dataframe.dropna(axis=0, how='all')
+
+
+def get_excel_sheet(data: bytes, tab: int, header_row: int, content_hash: str = None,
+                    columns: Iterable[str] = None) -> pd.DataFrame:
+    """ get_excel_dataframe() with empty rows removed, where a sheet is only parsed once for a given file content,
+        tab, header row and set of columns. The returned dataframe is shared so it must be copied before it's
+        modified """
+    content_hash = content_hash if content_hash else hashlib.sha256(data).hexdigest()
+    columns = frozenset(columns) if columns is not None else None
+    key = (content_hash, tab, header_row, columns)
+    with _sheet_cache_lock:
+        if key in _sheet_cache:
+            _sheet_cache.move_to_end(key)
+            return _sheet_cache[key]
+
+    dataframe = get_excel_dataframe(stream=data, sheet_number=tab, header_row=header_row, columns=columns)
+    # Remove any row that is *all* nan values
+    dataframe = dataframe.dropna(axis=0, how='all')
+
+    with _sheet_cache_lock:
+        _sheet_cache[key] = dataframe
+        while len(_sheet_cache) > SHEET_CACHE_SIZE:
+            _sheet_cache.popitem(last=False)
 
-    # clear errors for this file
-    mission.file_errors.filter(file_name=file_name).delete()
+    return dataframe
 
-    create_samples = {}
-    update_samples = {'fields': set(), 'models': []}
 
-    create_discrete_values = []
+def _get_missing_bottle_message(events: list[core_models.Event], sample_id: int, replicate) -> str:
+    message = _("Could not find bottle matching id") + f" {sample_id} " + _("replicate") + f" {replicate}\n"
+    event = next((e for e in events if e.sample_id is not None and e.end_sample_id is not None and
+                  e.sample_id <= sample_id <= e.end_sample_id), None)
+    if event:
+        message += _("Possible Matching Event") + f" #{event.event_id} " + _("Bottle IDs")
+        message += f" {event.sample_id} - {event.end_sample_id}\n"
+        message += _("Event Comments : ")
+        for action in event.actions.all():
+            if action.comment:
+                message += f"\n{action.get_type_display()} : {action.comment}"
 
-    errors = []
+    return message
 
-    try:
-        # convert column names to lower case because it's expected that the file_settings fields will be lowercase
-        dataframe.columns = dataframe.columns.str.lower()
-        # prep the dataframe by splitting the samples, adding replicates
 
-        dataframe = split_sample(dataframe, sample_config)
-        dataframe = dataframe.reset_index(drop=True)
-        sample_id_field, replicate_id_field = 'sid', 'rid'
+class SampleLoader:
+    """ Loads one sample type from a sample file into a mission, one dataframe (or chunk of a file) at a time.
+
+        The dataframe is processed as a set rather than row by row. Bottles and existing samples for the mission
+        sample type are loaded once and joined to each dataframe, rows are then classified (skipped, missing bottle,
+        replicate not allowed, duplicate replicate, accepted) using vectorized masks so the number of queries
+        made doesn't depend on the number of rows in the file.
+
+        By default the discrete values of every sample id in the file are deleted and recreated. In upsert mode
+        the file is compared to the stored values by (sample id, replicate) and only values that were added,
+        changed or removed are written. Changed values are flagged for re-upload by clearing their BioChem upload
+        date, unchanged values keep their link to BioChem. """
+
+    sample_id_field, replicate_id_field = 'sid', 'rid'
+
+    # fields compared to decide if a discrete value has changed when upserting
+    upsert_fields = ['value', 'flag', 'limit', 'comment']
+
+    def __init__(self, mission: core_models.Mission, sample_config: settings_models.SampleTypeConfig,
+                 file_name: str, upsert: bool = False):
+        self.mission = mission
+        self.sample_config = sample_config
+        self.file_name = file_name
+        self.upsert = upsert
+
+        self.mission_sample_type = sample_config.sample_type.get_mission_sample_type(mission)
+
+        bottles = core_models.Bottle.objects.filter(
+            event__mission=mission, event__instrument__type=core_models.InstrumentType.ctd
+        )
+        bottle_frame = pd.DataFrame(list(bottles.values_list('bottle_id', 'pk')),
+                                    columns=[self.sample_id_field, 'bottle'])
+        self.bottles = bottle_frame.drop_duplicates(subset=self.sample_id_field, keep='last')
+
+        existing_samples = self.mission_sample_type.samples.filter(
+            bottle__event__mission=mission, bottle__event__instrument__type=core_models.InstrumentType.ctd
+        ).order_by('-pk')
+        self.samples = {sample.bottle_id: sample for sample in existing_samples}
+
+        self.split_state = SplitState()
+        self.row_offset = 0
+        self.events = None
+
+        # sample ids that have had their discrete values cleared and (bottle, replicate) pairs already loaded
+        self.cleared_sample_ids = set()
+        self.loaded_replicates = set()
+        self.updated_samples = set()
+
+        # stored discrete values by (bottle, replicate) for the sample ids seen so far when upserting, values
+        # still here once the file has been read are no longer in the file
+        self.existing_values = {}
+        self.counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+
+        self.errors = []
+
+    def add_error(self, line: int, message: str):
+        error = core_models.FileError(mission=self.mission, file_name=self.file_name, line=line,
+                                      message=message, type=core_models.ErrorType.sample)
+        self.errors.append(error)
+        logger.warning(message)
+
+    def get_events(self) -> list[core_models.Event]:
+        # events are only needed to describe missing bottles, so they're only loaded if a bottle is missing
+        if self.events is None:
+            self.events = list(self.mission.events.prefetch_related('actions'))
+
+        return self.events
+
+    def parse(self, dataframe: pd.DataFrame):
+        self.write(self.prepare(dataframe))
+
+    def prepare(self, dataframe: pd.DataFrame) -> dict:
+        """ Works out what a dataframe will change without touching the database, so configs sharing a file can
+            be prepared in parallel. The returned batch is handed to write() on the thread that owns the database
+            connection. """
+        sample_id_field, replicate_id_field = self.sample_id_field, self.replicate_id_field
+        sample_config = self.sample_config
         value_field = sample_config.value_field
         limit_field = sample_config.limit_field
         flag_field = sample_config.flag_field
         comment_field = sample_config.comment_field
 
-        sample_type = sample_config.sample_type
-        mission_sample_type = sample_type.get_mission_sample_type(mission)
-        bottles = {bottle.bottle_id: bottle for bottle in
-                   core_models.Bottle.objects.filter(event__mission=mission, event__instrument__type=core_models.InstrumentType.ctd)}
-        bottle_keys = sorted(bottles.keys())
-
-        # for speed, we'll bulk delete Discrete values form all bottles with the requested sample type, then
-        # recreate them.
-        sample_ids = [sample_id for sample_id in dataframe[sample_id_field].unique()]
-
-        existing_samples = mission_sample_type.samples.filter(
-            bottle__event__mission=mission, bottle__event__instrument__type=core_models.InstrumentType.ctd
-        )
+        # row errors are collected with the row position they came from, so they can be reported in file order
+        row_errors = []
 
-        core_models.DiscreteSampleValue.objects.filter(sample__bottle__bottle_id__in=sample_ids,
-                                                                       sample__type=mission_sample_type).delete()
-        replicate_counter = {}
-        rows = dataframe.shape[0]
-        for index, row in dataframe.iterrows():
-            # use the file configurations 'skip' to find the header line.
-            # +1 for the header line
-            # +1 because index starts at zero
-            line = index + sample_config.skip + 2
-            logger_notifications.info(f"{file_name} : " + _("Processing row") + " %d/%d", index, rows)
-            sample_id = int(row[sample_id_field])
-            replicate = row[replicate_id_field]
-
-            value = row[value_field]
-
-            if str(value).upper() == 'NA' or str(value).strip() == '':
-                # if the value is 'na' or 'NA' then skip over this row. Otherwise we'll create an empty
-                # Sample and Biochem validation will fail later when a sample with a null value is created.
-
-                # Todo: If this values is blank and there's an existing sample, with no values,
-                #  it should probably be removed
-                if (existing_sample:=existing_samples.filter(bottle__bottle_id=sample_id)).exists():
-                       existing_sample = existing_sample.first()
-                       if not existing_sample.discrete_values:
-                            existing_sample.delete()
-                continue
+        # convert column names to lower case because it's expected that the file_settings fields will be lowercase
+        dataframe.columns = dataframe.columns.str.lower()
+        # prep the dataframe by splitting the samples, adding replicates
 
-            if sample_id not in bottle_keys:
-                # if this sample ID is in the excluded samples range then skip it.
-                if mission.start_underway_sample and mission.end_underway_sample:
-                    if sample_id >= mission.start_underway_sample or sample_id <= mission.end_underway_sample:
-                        continue
+        dataframe = split_sample(dataframe, sample_config, self.split_state)
+        dataframe.index = pd.RangeIndex(self.row_offset, self.row_offset + dataframe.shape[0])
+        self.row_offset += dataframe.shape[0]
 
-                message = _("Could not find bottle matching id") + f" {sample_id} " + _("replicate") + f" {replicate}\n"
-                event = mission.events.filter(sample_id__lte=sample_id, end_sample_id__gte=sample_id)
-                if event:
-                    event = event.first()
-                    message += _("Possible Matching Event") + f" #{event.event_id} " + _("Bottle IDs")
-                    message += f" {event.sample_id} - {event.end_sample_id}\n"
-                    message += _("Event Comments : ")
-                    for action in event.actions.all():
-                        if action.comment:
-                            message += f"\n{action.get_type_display()} : {action.comment}"
-
-                error = core_models.FileError(mission=mission, file_name=file_name, line=line,
-                                              message=message, type=core_models.ErrorType.sample)
-                errors.append(error)
-                logger.warning(message)
-                continue
+        # use the file configurations 'skip' to find the header line.
+        # +1 for the header line
+        # +1 because index starts at zero
+        dataframe['line'] = dataframe.index + sample_config.skip + 2
+        dataframe['position'] = dataframe.index
+        dataframe[sample_id_field] = dataframe[sample_id_field].astype(int)
 
-            bottle = bottles[sample_id]
+        # for speed, we'll bulk delete Discrete values form all bottles with the requested sample type, then
+        # recreate them. Values for sample ids seen in a previous chunk were already cleared.
+        sample_ids = set(int(sample_id) for sample_id in dataframe[sample_id_field].unique())
+        sample_ids -= self.cleared_sample_ids
+        self.cleared_sample_ids |= sample_ids
+
+        dataframe = dataframe.merge(self.bottles, on=sample_id_field, how='left')
+
+        # if the value is 'na' or 'NA' then skip over this row. Otherwise we'll create an empty
+        # Sample and Biochem validation will fail later when a sample with a null value is created.
+        value_strings = dataframe[value_field].astype(str)
+        skip_rows = value_strings.str.upper().eq('NA') | value_strings.str.strip().eq('')
+        dataframe = dataframe[~skip_rows]
+
+        mission = self.mission
+        missing_rows = dataframe['bottle'].isna()
+        if mission.start_underway_sample and mission.end_underway_sample:
+            # if this sample ID is in the excluded samples range then skip it.
+            underway = ((dataframe[sample_id_field] >= mission.start_underway_sample) |
+                        (dataframe[sample_id_field] <= mission.end_underway_sample))
+            dataframe = dataframe[~(missing_rows & underway)]
+            missing_rows = dataframe['bottle'].isna()
+
+        # messages for missing bottles describe the matching event, which requires the database, so they're
+        # built when the batch is written
+        missing_bottles = [(row.position, row.line, getattr(row, sample_id_field), getattr(row, replicate_id_field))
+                           for row in dataframe[missing_rows].itertuples()]
+
+        dataframe = dataframe[~missing_rows]
+        dataframe['bottle'] = dataframe['bottle'].astype(int)
+
+        # samples are created or updated for every row with a bottle, even if the value is later rejected
+        update_samples = {'fields': set(), 'models': []}
+        create_samples = {}
+        for bottle_id in dataframe['bottle'].unique():
+            bottle_id = int(bottle_id)
+            if bottle_id in self.samples:
+                if bottle_id in self.updated_samples:
+                    continue
 
-            if (existing_sample := existing_samples.filter(bottle=bottle, type=mission_sample_type)).exists():
-                # if the sample exists then we want to update it. Not create a new one
-                db_sample = existing_sample[0]
-                update_samples['fields'].add(updated_value(db_sample, 'file', file_name))
+                db_sample = self.samples[bottle_id]
+                self.updated_samples.add(bottle_id)
+                update_samples['fields'].add(updated_value(db_sample, 'file', self.file_name))
 
                 if '' in update_samples['fields']:
                     update_samples['fields'].remove('')
 
                 if len(update_samples['fields']) > 0:
                     update_samples['models'].append(db_sample)
-            elif bottle.bottle_id not in create_samples:
-                db_sample = core_models.Sample(bottle=bottle, type=mission_sample_type, file=file_name)
-                create_samples[bottle.bottle_id] = db_sample
             else:
-                db_sample = create_samples[bottle.bottle_id]
-
-            if db_sample.bottle_id not in replicate_counter:
-                replicate_counter[db_sample.bottle_id] = []
-
-            # if replicates aren't allowed on this datatype then there should be an error here if the
-            # replicate values is greater than 1
-            if not sample_config.allow_replicate and replicate > 1:
+                create_samples[bottle_id] = core_models.Sample(bottle_id=bottle_id, type=self.mission_sample_type,
+                                                               file=self.file_name)
+
+        # if replicates aren't allowed on this datatype then there should be an error here if the
+        # replicate values is greater than 1
+        if not sample_config.allow_replicate:
+            replicate_rows = dataframe[replicate_id_field] > 1
+            for row in dataframe[replicate_rows].itertuples():
                 message = _("File configuration doesn't allow for replicates. Replicates found for sample with ID")
-                message += " : " + str(sample_id)
-                error = core_models.FileError(mission=mission, file_name=file_name, line=line, message=message,
-                                              type=core_models.ErrorType.sample)
-                errors.append(error)
-                logger.warning(message)
+                message += " : " + str(getattr(row, sample_id_field))
+                row_errors.append((row.position, row.line, message))
+            dataframe = dataframe[~replicate_rows]
+
+        replicate_keys = pd.MultiIndex.from_arrays([dataframe['bottle'], dataframe[replicate_id_field]])
+        duplicate_rows = pd.Series(replicate_keys.duplicated(keep='first') | replicate_keys.isin(self.loaded_replicates),
+                                   index=dataframe.index)
+        for row in dataframe[duplicate_rows].itertuples():
+            message = _("Duplicate replicate id found for sample ") + str(getattr(row, sample_id_field))
+            row_errors.append((row.position, row.line, message))
+        dataframe = dataframe[~duplicate_rows]
+        self.loaded_replicates.update(replicate_keys[~duplicate_rows.values])
+
+        # optional columns are only used if the file actually has them, missing values become None
+        optional_columns = {}
+        for attribute, column in [('comment', comment_field), ('limit', limit_field), ('flag', flag_field)]:
+            if column and column in dataframe.columns:
+                optional_columns[attribute] = dataframe[column].astype(object).where(dataframe[column].notna(), None)
+
+        create_discrete_values = []
+        rows = dataframe.shape[0]
+        for index, (bottle_id, replicate, value) in enumerate(zip(dataframe['bottle'].tolist(),
+                                                                  dataframe[replicate_id_field].tolist(),
+                                                                  dataframe[value_field].tolist())):
+            logger_notifications.info(f"{self.file_name} : " + _("Processing row") + " %d/%d", index, rows)
+            db_sample = self.samples[bottle_id] if bottle_id in self.samples else create_samples[bottle_id]
+            discrete_sample = core_models.DiscreteSampleValue(sample=db_sample, value=value)
+            discrete_sample.replicate = replicate
+            for attribute, column in optional_columns.items():
+                setattr(discrete_sample, attribute, column.iat[index])
+            create_discrete_values.append(discrete_sample)
+
+        return {
+            'sample_ids': sample_ids,
+            'row_errors': row_errors,
+            'missing_bottles': missing_bottles,
+            'create_samples': create_samples,
+            'update_samples': update_samples,
+            'discrete_values': create_discrete_values,
+        }
+
+    def get_discrete_values(self, sample_ids) -> QuerySet[core_models.DiscreteSampleValue]:
+        return core_models.DiscreteSampleValue.objects.filter(sample__bottle__bottle_id__in=sample_ids,
+                                                              sample__type=self.mission_sample_type)
+
+    def is_changed(self, stored: core_models.DiscreteSampleValue, loaded: core_models.DiscreteSampleValue) -> bool:
+        for field_name in self.upsert_fields:
+            field = core_models.DiscreteSampleValue._meta.get_field(field_name)
+            stored_value, loaded_value = getattr(stored, field_name), getattr(loaded, field_name)
+            if stored_value is None or loaded_value is None or pd.isna(loaded_value):
+                if (stored_value is None) != (loaded_value is None or pd.isna(loaded_value)):
+                    return True
                 continue
 
-            comment = None
-            if comment_field and comment_field in row and not pd.isna(row[comment_field]):
-                comment = row[comment_field]
-
-            limit = None
-            if limit_field and limit_field in row and not pd.isna(row[limit_field]):
-                limit = row[limit_field]
-
-            flag = None
-            if flag_field and flag_field in row and not pd.isna(row[flag_field]):
-                flag = row[flag_field]
-
-            if replicate in replicate_counter[db_sample.bottle_id]:
-                message = _("Duplicate replicate id found for sample ") + str(db_sample.bottle.bottle_id)
-                error = core_models.FileError(mission=mission, file_name=file_name, line=line, message=message,
-                                              type=core_models.ErrorType.sample)
-                errors.append(error)
-                logger.warning(message)
+            try:
+                if field.to_python(stored_value) != field.to_python(loaded_value):
+                    return True
+            except ValidationError:
+                # let the database report values that can't be saved
+                return True
+
+        return False
+
+    def upsert_discrete_values(self, batch: dict) -> tuple[list, list]:
+        # returns the discrete values to create and the stored discrete values to update
+        if batch['sample_ids']:
+            for stored in self.get_discrete_values(batch['sample_ids']).select_related('sample').order_by('pk'):
+                key = (stored.sample.bottle_id, stored.replicate)
+                self.existing_values.setdefault(key, []).append(stored)
+
+        create_values = []
+        update_values = []
+        for loaded in batch['discrete_values']:
+            stored_values = self.existing_values.get((loaded.sample.bottle_id, loaded.replicate), None)
+            if not stored_values:
+                create_values.append(loaded)
                 continue
+
+            stored = stored_values.pop(0)
+            if self.is_changed(stored, loaded):
+                for field_name in self.upsert_fields:
+                    setattr(stored, field_name, getattr(loaded, field_name))
+                stored.bio_upload_date = None
+                update_values.append(stored)
             else:
-                discrete_sample = core_models.DiscreteSampleValue(sample=db_sample, value=value)
-                discrete_sample.replicate = replicate
-                discrete_sample.comment = comment
-                discrete_sample.limit = limit
-                discrete_sample.flag = flag
-                create_discrete_values.append(discrete_sample)
+                self.counts['unchanged'] += 1
 
-                replicate_counter[db_sample.bottle_id].append(replicate)
+        return create_values, update_values
 
+    def write(self, batch: dict):
+        update_values = []
+        if self.upsert:
+            create_values, update_values = self.upsert_discrete_values(batch)
+        else:
+            create_values = batch['discrete_values']
+            if batch['sample_ids']:
+                self.counts['deleted'] += self.get_discrete_values(batch['sample_ids']).delete()[1].get(
+                    core_models.DiscreteSampleValue._meta.label, 0)
+
+        row_errors = batch['row_errors']
+        for position, line, sample_id, replicate in batch['missing_bottles']:
+            message = _get_missing_bottle_message(self.get_events(), sample_id, replicate)
+            row_errors.append((position, line, message))
+
+        row_errors.sort(key=lambda row_error: row_error[0])
+        for position, line, message in row_errors:
+            self.add_error(line, message)
+
+        create_samples = batch['create_samples']
+        update_samples = batch['update_samples']
         with transaction.atomic():
             core_models.Sample.objects.bulk_create(create_samples.values())
             if len(update_samples['models']) > 0:
                 core_models.Sample.objects.bulk_update(update_samples['models'], update_samples['fields'])
 
-            core_models.DiscreteSampleValue.objects.bulk_create(create_discrete_values)
+            core_models.DiscreteSampleValue.objects.bulk_create(create_values)
+            if update_values:
+                core_models.DiscreteSampleValue.objects.bulk_update(update_values,
+                                                                    self.upsert_fields + ['bio_upload_date'])
+
+        self.counts['created'] += len(create_values)
+        self.counts['updated'] += len(update_values)
+
+        self.samples.update(create_samples)
+        self.updated_samples.update(create_samples.keys())
+
+    def finish(self):
+        if self.upsert:
+            # stored values for sample ids in the file that weren't in the file have been removed
+            removed = [stored.pk for stored_values in self.existing_values.values() for stored in stored_values]
+            if removed:
+                core_models.DiscreteSampleValue.objects.filter(pk__in=removed).delete()
+            self.counts['deleted'] += len(removed)
+
+        logger_notifications.info(f"{self.file_name} : {self.mission_sample_type.name} : " +
+                                  _("Created") + " %d, " + _("Updated") + " %d, " + _("Unchanged") + " %d, " +
+                                  _("Deleted") + " %d", self.counts['created'], self.counts['updated'],
+                                  self.counts['unchanged'], self.counts['deleted'])
+
+        if self.upsert and self.counts['created'] + self.counts['updated'] + self.counts['deleted'] == 0:
+            # nothing changed, so nothing needs to be uploaded again
+            return
 
         # if all goes well, mark the sample_type as requiring an upload if a BioChemUpload entry exists
-        if mission_sample_type.uploads.first():
-            bcu = mission_sample_type.uploads.first()
+        if self.mission_sample_type.uploads.first():
+            bcu = self.mission_sample_type.uploads.first()
             bcu.status = core.models.BioChemUploadStatus.upload
             bcu.modified_date = datetime.now()
             bcu.save()
 
-    except ValueError as ex:
+
+# once all the options are figured out (e.g what tab, what's the sample row, what's the value column)
+# this function will convert the dataframe into a sample. Returns the number of discrete values created, updated,
+# unchanged and deleted
+def parse_data_frame(mission: core_models.Mission, sample_config: settings_models.SampleTypeConfig,
+                     file_name: str, dataframe: pd.DataFrame, upsert: bool = False) -> dict:
+    return parse_data_frames(mission, sample_config, file_name, [dataframe], upsert=upsert)
+
+
+def _get_load_error(mission: core_models.Mission, sample_config: settings_models.SampleTypeConfig, file_name: str,
+                    ex: Exception) -> core_models.FileError:
+    if isinstance(ex, ValueError):
         message = _("Could not read column") + f" '{sample_config.sample_field}'"
         message += " - " + str(ex)
-        logger.error(message)
-        logger.exception(ex)
-        error = core_models.FileError(mission=mission, file_name=file_name, line=-1, message=message,
-                                      type=core_models.ErrorType.sample)
-        errors.append(error)
-    except Exception as ex:
+    else:
         message = f"Unknown issue {ex}: see error log"
-        logger.error(message)
-        logger.exception(ex)
-        error = core_models.FileError(mission=mission, file_name=file_name, line=-1, message=message,
-                                      type=core_models.ErrorType.sample)
-        errors.append(error)
+
+    logger.error(message)
+    logger.exception(ex)
+    return core_models.FileError(mission=mission, file_name=file_name, line=-1, message=message,
+                                 type=core_models.ErrorType.sample)
+
+
+# Same as parse_data_frame, but for a file that's been read in chunks, like the chunks from read_csv_chunks().
+# Replicate numbering and duplicate checks carry over from one chunk to the next.
+def parse_data_frames(mission: core_models.Mission, sample_config: settings_models.SampleTypeConfig,
+                      file_name: str, dataframes: Iterable[pd.DataFrame], upsert: bool = False) -> dict:
+
+    # clear errors for this file
+    mission.file_errors.filter(file_name=file_name).delete()
+
+    loader = None
+    errors = []
+    try:
+        loader = SampleLoader(mission, sample_config, file_name, upsert=upsert)
+        for dataframe in dataframes:
+            loader.parse(dataframe)
+
+        loader.finish()
+    except Exception as ex:
+        errors.append(_get_load_error(mission, sample_config, file_name, ex))
+
+    if loader:
+        errors = loader.errors + errors
 
     core_models.FileError.objects.bulk_create(errors)
+
+    return loader.counts if loader else None
+
+
+def _read_sample_file(file, file_type: str, sample_configs: list[settings_models.SampleTypeConfig]):
+    """ yields (sample configs, dataframes) for each group of sample configs that can share a read of the file.
+        csv/dat configs sharing a header row share one pass over the file, excel configs share a parsed sheet. """
+    if file_type == 'csv' or file_type == 'dat':
+        skips = {}
+        for sample_config in sample_configs:
+            skips.setdefault(sample_config.skip, []).append(sample_config)
+
+        for configs in skips.values():
+            file.seek(0)
+            yield configs, read_csv_chunks(file, *configs)
+    else:
+        file.seek(0)
+        data = file.read()
+        content_hash = hashlib.sha256(data).hexdigest()
+        sheets = {}
+        for sample_config in sample_configs:
+            sheets.setdefault((sample_config.tab, sample_config.skip), []).append(sample_config)
+
+        # sheets are read lazily so a sheet that can't be read is reported against the configs that use it
+        def read_sheet(tab, skip, columns):
+            yield get_excel_sheet(data, tab, skip, content_hash, columns)
+
+        for (tab, skip), configs in sheets.items():
+            columns = {column for config in configs for column in get_config_columns(config)}
+            yield configs, read_sheet(tab, skip, columns)
+
+
+def _get_config_dataframe(dataframe: pd.DataFrame, sample_config: settings_models.SampleTypeConfig) -> pd.DataFrame:
+    # each loader gets its own copy of just the columns it uses, loaders modify the dataframe they're given
+    columns = get_config_columns(sample_config)
+    return dataframe.loc[:, [str(column).lower() in columns for column in dataframe.columns]].copy()
+
+
+def parse_sample_file(mission: core_models.Mission, sample_configs: list[settings_models.SampleTypeConfig],
+                      file_name: str, file_type: str, file, max_workers: int = SAMPLE_LOAD_WORKERS,
+                      upsert: bool = False) -> dict:
+    """ Loads every selected sample config from an uploaded file, reading the file once per header row (csv/dat) or
+        per tab and header row (excel) rather than once per sample config.
+
+        Loaders prepare their part of each dataframe on a thread pool, the database is only written to from the
+        calling thread. A problem with one sample config is reported against that config and doesn't stop the
+        others from loading.
+
+        Returns the number of discrete values created, updated, unchanged and deleted by sample config. """
+
+    # clear errors for this file
+    mission.file_errors.filter(file_name=file_name).delete()
+
+    loaders = {}
+    errors = {sample_config.pk: [] for sample_config in sample_configs}
+    for sample_config in sample_configs:
+        try:
+            loaders[sample_config.pk] = SampleLoader(mission, sample_config, file_name, upsert=upsert)
+        except Exception as ex:
+            errors[sample_config.pk].append(_get_load_error(mission, sample_config, file_name, ex))
+
+    # loaders that have failed stop loading, but the row errors they've collected are still reported
+    failed = set()
+
+    def fail(failed_config, ex):
+        failed.add(failed_config.pk)
+        errors[failed_config.pk].append(_get_load_error(mission, failed_config, file_name, ex))
+
+    # worker threads don't inherit the active language, which is needed for translated error messages
+    language = translation.get_language()
+
+    def prepare(loader, dataframe):
+        with translation.override(language):
+            return loader.prepare(dataframe)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for configs, dataframes in _read_sample_file(file, file_type, sample_configs):
+            try:
+                for dataframe in dataframes:
+                    active = [config for config in configs if config.pk in loaders and config.pk not in failed]
+                    batches = [(config, executor.submit(prepare, loaders[config.pk],
+                                                        _get_config_dataframe(dataframe, config)))
+                               for config in active]
+
+                    for config, batch in batches:
+                        try:
+                            loaders[config.pk].write(batch.result())
+                        except Exception as ex:
+                            fail(config, ex)
+            except Exception as ex:
+                # the file couldn't be read for this group of configs
+                for config in configs:
+                    if config.pk in loaders and config.pk not in failed:
+                        fail(config, ex)
+
+    for pk, loader in loaders.items():
+        if pk not in failed:
+            try:
+                loader.finish()
+            except Exception as ex:
+                fail(loader.sample_config, ex)
+
+    file_errors = []
+    for sample_config in sample_configs:
+        if sample_config.pk in loaders:
+            file_errors += loaders[sample_config.pk].errors
+        file_errors += errors[sample_config.pk]
+
+    core_models.FileError.objects.bulk_create(file_errors)
+
+    return {pk: loader.counts for pk, loader in loaders.items()}
@@ -1,8 +1,8 @@
 import io
-import json
 import logging
 
 from datetime import datetime
+from typing import Mapping
 
 from django.db.models import QuerySet
 from django.utils.translation import gettext_lazy as _
@@ -11,6 +11,8 @@ import core.models
 from settingsdb.models import FileConfiguration
 
 from core import models as core_models
+from core.parsers import parser_utils
+from core.parsers.event import andes_reader
 
 logger = logging.getLogger(f"dart.{__name__}")
 logger_notifications = logging.getLogger('dart.user.andes')
@@ -46,285 +48,344 @@ def get_or_create_file_config() -> QuerySet[FileConfiguration]:
         ("action_sounding", "sounding", _("Label identifying the event sounding to apply to actions")),
     ]
 
-    existing_mappings = FileConfiguration.objects.filter(file_type=file_type)
-    create_mapping = []
-    for field in fields:
-        if not existing_mappings.filter(required_field=field[0]).exists():
-            mapping = FileConfiguration(file_type=file_type)
-            mapping.required_field = field[0]
-            mapping.mapped_field = field[1]
-            mapping.description = field[2]
-            create_mapping.append(mapping)
+    return parser_utils._get_or_create_file_config(file_type, fields)
 
-    if len(create_mapping) > 0:
-        FileConfiguration.objects.bulk_create(create_mapping)
 
-    return existing_mappings
+def get_mapped_fields() -> Mapping[str, str]:
+    # the required_field: mapped_field andes configuration from the in-process snapshot
+    get_or_create_file_config()
+    return parser_utils.get_file_config('andes_json')
 
 
-def parse_instruments(mission: core_models.Mission, file_name: str, instruments: list[dict]) -> (
-        list[core_models.FileError]):
-    """
-    Provided a list of instruments, CTD and Nets will be added to the mission's instrument table
-    """
-    logger_notifications.info("Processing Instruments")
-
-    config: QuerySet[FileConfiguration] = get_or_create_file_config()
-    database = mission._state.db
+def get_instrument_type(type_name: str) -> core_models.InstrumentType:
+    if type_name.lower() == 'plankton net':
+        type_name = 'net'
+
+    type = core_models.InstrumentType.other
+    if core_models.InstrumentType.has_value(type_name):
+        type = core_models.InstrumentType.get(type_name)
+
+    return type
+
+
+def get_length(length_string, unit: str) -> float | None:
+    # lengths like wire out and sounding are reported as '3312 m' or '45 degrees' or sometimes as plain numbers
+    if not length_string:
+        return None
+
+    if isinstance(length_string, str) and unit in length_string:
+        return float(length_string.split(' ')[0])
+
+    return float(length_string)
+
+
+def new_buffers(mission: core_models.Mission) -> dict:
+    """ Buffers used to accumulate what's read from an Andes report so it can be written to the database in bulk """
+    return {
+        # instrument name: instrument type
+        'instruments': {},
+        # lower case station name: station name
+        'stations': {},
+        # events that already exist for the mission, the last occurrence of an existing event in a report is used
+        # to update it, the first occurrence of a new event is used to create it
+        'existing_events': set(mission.events.values_list('event_id', flat=True)),
+        # event_id: dictionary of event fields
+        'events': {},
+        # event_id: attachment name
+        'attachments': {},
+        # event_id: list of dictionaries of action fields
+        'actions': {},
+        'errors': [],
+    }
+
+
+def read_instrument(config: Mapping[str, str], buffers: dict, instrument: dict):
+    name = instrument[config['instrument_name']]
+    type_name = instrument[config['instrument_type']]
+
+    buffers['instruments'].setdefault(name, get_instrument_type(type_name))
+
+
+def read_station(config: Mapping[str, str], buffers: dict, sample: dict):
+    name = sample[config['station_name']]
+    buffers['stations'].setdefault(name.lower(), name)
+
+
+def read_events(mission: core_models.Mission, file_name: str, config: Mapping[str, str], buffers: dict,
+                sample: dict):
+    station_name = sample[config['station_name']]
+
+    for event in sample['events']:
+        event_id = int(event[config['event_id']])
+        instrument_name = event[config['event_instrument_name']]
+        type = get_instrument_type(event[config['instrument_type']])
+
+        sample_id = None
+        end_sample_id = None
+        if type == core_models.InstrumentType.ctd:
+            bottles = event.get('bottles', None)
+            if bottles:
+                sample_id = bottles[0].get(config['bottle_id'], None)
+                end_sample_id = bottles[-1].get(config['bottle_id'], None)
+        elif type == core_models.InstrumentType.net:
+            bottles = event.get('plankton_samples', None)
+            if bottles:
+                sample_id = bottles[0].get(config['bottle_id'], None)
+                if len(bottles) > 1:  # > 1 bottle, this is a multinet
+                    end_sample_id = bottles[-1].get(config['bottle_id'], None)
+
+                if 'mesh_size_um' in bottles[0]:
+                    buffers['attachments'][event_id] = str(bottles[0].get(config['mesh_size'], None)) + "um"
+
+        if sample_id:
+            try:
+                int(sample_id)
+            except ValueError:
+                message = _("Bad Bottle ID for Event : ") + str(event_id) + " " + _("Bottle ID : ") + str(sample_id)
+                err = core_models.FileError(mission=mission, file_name=file_name,
+                                            message=message, type=core_models.ErrorType.event)
+                buffers['errors'].append(err)
+                logger.error(message)
+                sample_id = None
+
+        flow_meter_start = event.get(config['flow_start'], None)
+        flow_meter_end = event.get(config['flow_end'], None)
+
+        if event_id in buffers['events'] and event_id not in buffers['existing_events']:
+            continue
+
+        buffers['events'][event_id] = {
+            'instrument': (instrument_name, type),
+            'station': station_name,
+            'wire_out': get_length(event.get(config['wire_out'], None), 'm'),
+            'wire_angle': get_length(event.get(config['wire_angle'], None), 'degrees'),
+            'flow_start': int(flow_meter_start) if flow_meter_start else None,
+            'flow_end': int(flow_meter_end) if flow_meter_end else None,
+            'sample_id': sample_id,
+            'end_sample_id': end_sample_id,
+        }
+
+
+def read_actions(config: Mapping[str, str], buffers: dict, sample: dict):
+    action_operator = sample.get(config['action_operator'], None)
+    action_comment = sample.get(config['action_comment'], None)
+    action_sounding = get_length(sample.get(config['action_sounding'], None), 'm')
+
+    for event in sample['events']:
+        event_id = int(event.get(config['event_id'], None))
+        event_actions = buffers['actions'].setdefault(event_id, [])
+        for action in event['actions']:
+            action_type_string = action.get(config['action_type'], None)
+            action_time_string = action.get(config['action_created_time'], None)
+            action_lat_string = action.get(config['action_lat'], None)
+            action_lon_string = action.get(config['action_lon'], None)
+
+            try:
+                action_date = datetime.strptime(action_time_string, '%Y-%m-%d %H:%M:%S.%f%z')
+            except ValueError:
+                action_date = datetime.strptime(action_time_string, '%Y-%m-%d %H:%M:%S%z')
+
+            if action_type_string.lower() == 'recovery':
+                action_type_string = 'recovered'
+            elif action_type_string.lower() == 'deploy':
+                action_type_string = 'deployed'
+            elif action_type_string.lower() == 'abort':
+                action_type_string = 'aborted'
+
+            event_actions.append({
+                'date_time': action_date,
+                'type': core_models.ActionType.get(action_type_string),
+                'latitude': float(action_lat_string) if action_lat_string else None,
+                'longitude': float(action_lon_string) if action_lon_string else None,
+                'data_collector': action_operator,
+                'comment': action_comment,
+                'sounding': action_sounding,
+            })
+
+
+def save_instruments(buffers: dict):
+    instruments = buffers['instruments']
+    existing_instruments = set(core_models.Instrument.objects.filter(
+        name__in=instruments.keys()).values_list('name', flat=True))
+
+    create_instruments = [core_models.Instrument(name=name, type=type) for name, type in instruments.items()
+                          if name not in existing_instruments]
+    core_models.Instrument.objects.bulk_create(create_instruments)
+
+
+def save_stations(buffers: dict):
+    existing_stations = {name.lower() for name in core_models.Station.objects.values_list('name', flat=True)}
+
+    create_stations = [core_models.Station(name=name) for key, name in buffers['stations'].items()
+                       if key not in existing_stations]
+    core_models.Station.objects.bulk_create(create_stations)
+
+
+def save_events(mission: core_models.Mission, file_name: str, buffers: dict):
+    # stations are matched ignoring case, instruments by name, ignoring case, and type
+    stations = {}
+    for station in core_models.Station.objects.order_by('pk'):
+        stations.setdefault(station.name.lower(), station)
+
+    instruments = {}
+    for instrument in core_models.Instrument.objects.order_by('pk'):
+        instruments.setdefault((instrument.name.lower(), instrument.type), instrument)
 
-    errors = []
+    mission_events = {event.event_id: event for event in mission.events.all()}
 
-    for instrument in instruments:
-        name = instrument[config.get(required_field='instrument_name').mapped_field]
-        type_name = instrument[config.get(required_field='instrument_type').mapped_field]
+    create_events = []
+    update_events = []
+    update_fields = ['instrument', 'station', 'wire_out', 'wire_angle', 'flow_start', 'flow_end',
+                     'sample_id', 'end_sample_id']
 
-        if type_name.lower() == 'plankton net':
-            type_name = 'net'
+    event_count = len(buffers['events'])
+    for index, (event_id, fields) in enumerate(buffers['events'].items()):
+        logger_notifications.info("Processing events %d/%d", index+1, event_count)
+
+        instrument_name, type = fields['instrument']
+        instrument = instruments.get((instrument_name.lower(), type), None)
+        station = stations.get(fields['station'].lower(), None)
+        if instrument is None or station is None:
+            message = _("Missing station or instrument for Event : ") + str(event_id)
+            err = core_models.FileError(mission=mission, file_name=file_name, message=message,
+                                        type=core_models.ErrorType.event)
+            buffers['errors'].append(err)
+            logger.error(message)
+            continue
+
+        if (mission_event := mission_events.get(event_id, None)) is None:
+            mission_event = core_models.Event(mission=mission, event_id=event_id)
+            mission_events[event_id] = mission_event
+            create_events.append(mission_event)
+        else:
+            update_events.append(mission_event)
+
+        mission_event.instrument = instrument
+        mission_event.station = station
+        for field in update_fields[2:]:
+            setattr(mission_event, field, fields[field])
+
+    core_models.Attachment.objects.filter(event__in=update_events).delete()
+    core_models.Event.objects.bulk_create(create_events)
+    core_models.Event.objects.bulk_update(update_events, update_fields)
+
+    create_attachments = [core_models.Attachment(event=mission_events[event_id], name=name)
+                          for event_id, name in buffers['attachments'].items() if event_id in mission_events]
+    core_models.Attachment.objects.bulk_create(create_attachments)
 
-        if not core_models.Instrument.objects.filter(name=name).exists():
-            type = core_models.InstrumentType.other
-            if core_models.InstrumentType.has_value(type_name):
-                type = core_models.InstrumentType.get(type_name)
 
-            core_models.Instrument.objects.create(name=name, type=type)
+def save_actions(mission: core_models.Mission, file_name: str, buffers: dict):
+    mission_events = {event.event_id: event for event in mission.events.all()}
 
-    return errors
+    # events that couldn't be created have already been reported
+    events = [mission_events[event_id] for event_id in buffers['actions'].keys() if event_id in mission_events]
+    core_models.Action.objects.filter(event__in=events).delete()
 
+    create_actions = []
+    for event in events:
+        for action in buffers['actions'][event.event_id]:
+            create_actions.append(core_models.Action(event=event, file=file_name, **action))
 
-def parse_stations(mission: core_models.Mission, file_name: str, samples: list[dict]) -> list[core_models.FileError]:
+    core_models.Action.objects.bulk_create(create_actions)
 
-    config: QuerySet[FileConfiguration] = get_or_create_file_config()
-    database = mission._state.db
 
-    errors = []
+def parse_instruments(mission: core_models.Mission, file_name: str, instruments: list[dict]) -> (
+        list[core_models.FileError]):
+    """
+    Provided a list of instruments, CTD and Nets will be added to the mission's instrument table
+    """
+    logger_notifications.info("Processing Instruments")
 
-    existing_stations = [stn.name.lower() for stn in core_models.Station.objects.all()]
-    create_stations = {}
-    station_count = len(samples)
-    for index, station in enumerate(samples):
-        logger_notifications.info("Processing stations %d/%d", index+1, station_count)
-        name = station[config.get(required_field='station_name').mapped_field]
+    config = get_mapped_fields()
+    buffers = new_buffers(mission)
+    for instrument in instruments:
+        read_instrument(config, buffers, instrument)
 
-        if name.lower() not in existing_stations and name.lower() not in create_stations.keys():
-            create_stations[name.lower()] = core_models.Station(name=name)
+    save_instruments(buffers)
 
-    core_models.Station.objects.bulk_create(create_stations.values())
+    return buffers['errors']
 
-    return errors
 
+def parse_stations(mission: core_models.Mission, file_name: str, samples: list[dict]) -> list[core_models.FileError]:
 
-def parse_events(mission: core_models.Mission, file_name: str, samples: list[dict]) -> list[core_models.FileError]:
-    # we're actually going to get the same list that stations gets because there are values in the 'samples'
-    # list that we'll need for creating actions later.
+    config = get_mapped_fields()
+    buffers = new_buffers(mission)
+    for sample in samples:
+        read_station(config, buffers, sample)
 
-    config: QuerySet[FileConfiguration] = get_or_create_file_config()
-    database = mission._state.db
+    save_stations(buffers)
 
-    stations = core_models.Station.objects.all()
-    instruments = core_models.Instrument.objects.all()
-    mission_events = core_models.Event.objects.all()
+    return buffers['errors']
 
-    errors = []
-    create_events = {}
-    update_events = {}
-    update_fields = ['instrument', 'station', 'wire_out', 'wire_angle', 'flow_start', 'flow_end',
-                     'sample_id', 'end_sample_id']
 
-    add_attachments = {}
-
-    station_count = len(samples)
-    for index, sample in enumerate(samples):
-        logger_notifications.info("Processing events %d/%d", index+1, station_count)
-
-        station_name = sample[config.get(required_field='station_name').mapped_field]
-        station = stations.get(name__iexact=station_name)
-
-        events = sample['events']
-        for event in events:
-            event_id = event[config.get(required_field='event_id').mapped_field]
-            instrument_name = event[config.get(required_field='event_instrument_name').mapped_field]
-            type_name = event[config.get(required_field='instrument_type').mapped_field]
-
-            if type_name.lower() == 'plankton net':
-                type_name = 'net'
-
-            type = core_models.InstrumentType.other
-            if core_models.InstrumentType.has_value(type_name):
-                type = core_models.InstrumentType.get(type_name)
-
-            instrument = instruments.get(name__iexact=instrument_name, type=type)
-
-            sample_id = None
-            end_sample_id = None
-            if instrument.type == core_models.InstrumentType.ctd:
-                bottles = event.get('bottles', None)
-                if bottles:
-                    sample_id = bottles[0].get(config.get(required_field='bottle_id').mapped_field, None)
-                    end_sample_id = bottles[-1].get(config.get(required_field='bottle_id').mapped_field, None)
-            elif instrument.type == core_models.InstrumentType.net:
-                bottles = event.get('plankton_samples', None)
-                if bottles:
-                    sample_id = bottles[0].get(config.get(required_field='bottle_id').mapped_field, None)
-                    if len(bottles) > 1:  # > 1 bottle, this is a multinet
-                        end_sample_id = bottles[-1].get(config.get(required_field='bottle_id').mapped_field, None)
-
-                    if 'mesh_size_um' in bottles[0]:
-                        add_attachments[int(event_id)] = (
-                            str(bottles[0].get(config.get(required_field='mesh_size').mapped_field, None)) + "um"
-                        )
-
-            if sample_id:
-                try:
-                    int(sample_id)
-                except ValueError:
-                    sample_id = None
-                    message = _("Bad Bottle ID for Event : ") + str(event_id) + " " + _("Bottle ID : ") + str(sample_id)
-                    err = core_models.FileError(mission=mission, file_name=file_name,
-                                                message=message, type=core_models.ErrorType.event)
-                    errors.append(err)
-                    logger.error(message)
-            wire_out_string = event.get(config.get(required_field='wire_out').mapped_field, None)
-            wire_angle_string = event.get(config.get(required_field='wire_angle').mapped_field, None)
-            flow_meter_start = event.get(config.get(required_field='flow_start').mapped_field, None)
-            flow_meter_end = event.get(config.get(required_field='flow_end').mapped_field, None)
-
-            wire_out = None
-            if wire_out_string:
-                if 'm' in wire_out_string:
-                    wire_out = float(wire_out_string.split(' ')[0])
-                else:
-                    wire_out = float(wire_out_string)
-
-            wire_angle = None
-            if wire_angle_string:
-                if 'degrees' in wire_angle_string:
-                    wire_angle = float(wire_angle_string.split(' ')[0])
-                else:
-                    wire_angle = float(wire_angle_string)
-
-            mission_event = None
-            if not mission_events.filter(event_id=event_id).exists():
-                if event_id not in create_events.keys():
-                    mission_event = core_models.Event(mission=mission, event_id=event_id)
-
-                    create_events[event_id] = mission_event
-            else:
-                mission_event = mission_events.get(event_id=event_id)
-                mission_event.attachments.all().delete()
-                update_events[event_id] = mission_event
-
-            if mission_event:
-                mission_event.instrument = instrument
-                mission_event.station = station
-                mission_event.wire_out = wire_out
-                mission_event.wire_angle = wire_angle
-                mission_event.flow_start = int(flow_meter_start) if flow_meter_start else None
-                mission_event.flow_end = int(flow_meter_end) if flow_meter_end else None
-                mission_event.sample_id = sample_id
-                mission_event.end_sample_id = end_sample_id
-
-    core_models.Event.objects.bulk_create(create_events.values())
-    core_models.Event.objects.bulk_update(update_events.values(), update_fields)
-
-    mission_events = {event.event_id: event for event in core_models.Event.objects.all()}
-    create_attachments = []
-    if add_attachments:
-        for key, value in add_attachments.items():
-            attachment = core_models.Attachment(event=mission_events[key], name=value)
-            create_attachments.append(attachment)
+def parse_events(mission: core_models.Mission, file_name: str, samples: list[dict]) -> list[core_models.FileError]:
+    config = get_mapped_fields()
+    buffers = new_buffers(mission)
+    for sample in samples:
+        read_events(mission, file_name, config, buffers, sample)
 
-    core_models.Attachment.objects.bulk_create(create_attachments)
+    save_events(mission, file_name, buffers)
 
-    return errors
+    return buffers['errors']
 
 
 def parse_actions(mission: core_models.Mission, file_name: str, samples: list[dict]) -> list[core_models.FileError]:
-    config: QuerySet[FileConfiguration] = get_or_create_file_config()
-    database = mission._state.db
-
-    errors = []
+    config = get_mapped_fields()
+    buffers = new_buffers(mission)
+    for sample in samples:
+        read_actions(config, buffers, sample)
 
-    mission_events = {event.event_id: event for event in mission.events.all()}
-    create_actions = []
-
-    station_count = len(samples)
-    for index, sample in enumerate(samples):
-        logger_notifications.info("Processing actions %d/%d", index+1, station_count)
-        events = sample['events']
-        action_operator = sample.get(config.get(required_field='action_operator').mapped_field, None)
-        action_comment = sample.get(config.get(required_field='action_comment').mapped_field, None)
-        action_sounding_string = sample.get(config.get(required_field='action_sounding').mapped_field, None)
-        action_sounding = None
-        if action_sounding_string:
-            if 'm' in action_sounding_string:
-                action_sounding = float(action_sounding_string.split(' ')[0])
-            else:
-                action_sounding = float(action_sounding_string)
-        for event in events:
-            event_id = event.get(config.get(required_field='event_id').mapped_field, None)
-            mission_event = mission_events[event_id]
-            mission_event.actions.all().delete()
-            for action in event['actions']:
-                action_type_string = action.get(config.get(required_field='action_type').mapped_field, None)
-                action_time_string = action.get(config.get(required_field='action_created_time').mapped_field, None)
-                action_lat_string = action.get(config.get(required_field='action_lat').mapped_field, None)
-                action_lon_string = action.get(config.get(required_field='action_lon').mapped_field, None)
-
-                try:
-                    action_date = datetime.strptime(action_time_string, '%Y-%m-%d %H:%M:%S.%f%z')
-                except ValueError:
-                    action_date = datetime.strptime(action_time_string, '%Y-%m-%d %H:%M:%S%z')
-
-                if action_type_string.lower() == 'recovery':
-                    action_type_string = 'recovered'
-                elif action_type_string.lower() == 'deploy':
-                    action_type_string = 'deployed'
-                elif action_type_string.lower() == 'abort':
-                    action_type_string = 'aborted'
-
-                action_lat = float(action_lat_string) if action_lat_string else None
-                action_lon = float(action_lon_string) if action_lon_string else None
-                action_type = core_models.ActionType.get(action_type_string)
-
-                action = core_models.Action(event=mission_event, date_time=action_date, type=action_type,
-                                            latitude=action_lat, longitude=action_lon, data_collector=action_operator,
-                                            comment=action_comment, sounding=action_sounding, file=file_name)
-                create_actions.append(action)
-
-    core_models.Action.objects.bulk_create(create_actions)
+    save_actions(mission, file_name, buffers)
 
-    return errors
+    return buffers['errors']
 
 
 def parse(mission: core_models.Mission, file_name: str, stream: io.StringIO):
     """
     Parse a JSON formatted mission report outputed from the ANDES application
 
+    The report is read once, a sample at a time, and only the parts of each sample needed to create
+    instruments, stations, events, attachments and actions are kept until they're written in bulk.
+
     Keyword arguments:
         mission -- The mission to add data to
         stream -- io.StringIO object reading from the file
     """
 
-    config: QuerySet[FileConfiguration] = get_or_create_file_config()
+    config = get_mapped_fields()
 
-    # Step 1 - read the file
-    data = json.load(stream)
-    database = mission._state.db
     core_models.FileError.objects.filter(file_name=file_name).delete()
 
-    errors = []
+    buffers = new_buffers(mission)
+    mission_values = {}
+
+    # Step 1 - read the file
+    sample_count = 0
+    for key, value in andes_reader.read_report(stream):
+        if key == 'instruments':
+            read_instrument(config, buffers, value)
+        elif key == 'samples':
+            sample_count += 1
+            logger_notifications.info("Reading sample %d", sample_count)
+            read_station(config, buffers, value)
+            read_events(mission, file_name, config, buffers, value)
+            read_actions(config, buffers, value)
+        else:
+            mission_values[key] = value
 
     if not mission.lead_scientist or (mission.lead_scientist and mission.lead_scientist == 'N/A'):
-        mission.lead_scientist = data['mission'].get(config.get(required_field='lead_scientists').mapped_field, "N/A")
+        mission.lead_scientist = mission_values.get(config['lead_scientists'], "N/A")
 
     if not mission.platform or (mission.platform and mission.platform == 'N/A'):
-        mission.platform = data['mission']['vessel'].get(config.get(required_field='platform').mapped_field, "N/A")
+        mission.platform = mission_values.get('vessel', {}).get(config['platform'], "N/A")
 
     mission.save()
 
-    errors += parse_instruments(mission, file_name, data['mission']['instruments'])
-    errors += parse_stations(mission, file_name, data['mission']['samples'])
-    errors += parse_events(mission, file_name, data['mission']['samples'])
-    errors += parse_actions(mission, file_name, data['mission']['samples'])
+    # Step 2 - write what was read to the database
+    logger_notifications.info("Processing Instruments")
+    save_instruments(buffers)
+    save_stations(buffers)
+    save_events(mission, file_name, buffers)
+    save_actions(mission, file_name, buffers)
 
-    core_models.FileError.objects.bulk_create(errors)
+    core_models.FileError.objects.bulk_create(buffers['errors'])
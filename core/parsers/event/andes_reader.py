@@ -0,0 +1,141 @@
+# Reads an Andes report a value at a time so the samples in a report can be processed as they're read rather than
+# loading the whole document, and every sample in it, into memory at once. Like the elog_reader, nothing here
+# touches the database.
+import codecs
+import json
+
+from typing import Iterator
+
+# number of characters, or bytes for binary streams, read from a report at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = ' \t\n\r'
+DELIMITERS = WHITESPACE + ',:]}'
+
+
+class JsonReader:
+    """ Walks a JSON document from a text or binary stream, only keeping the part of the document that hasn't been
+        read yet in memory """
+
+    def __init__(self, stream, chunk_size: int = READ_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        # uploaded files are binary, utf-8-sig also strips the byte order mark some exports start with
+        self.text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def read_more(self, size: int = None) -> bool:
+        # drop what has already been read from the buffer and add at least size more characters to it
+        size = max(size or 0, self.chunk_size)
+        read = []
+        read_size = 0
+        while not self.eof and read_size < size:
+            chunk = self.stream.read(self.chunk_size)
+            text = self.text_decoder.decode(chunk, final=not chunk) if isinstance(chunk, bytes) else chunk
+            if not chunk:
+                self.eof = True
+
+            read.append(text)
+            read_size += len(text)
+
+        self.buffer = self.buffer[self.position:] + ''.join(read)
+        self.position = 0
+        return read_size > 0
+
+    def peek(self) -> str:
+        """ returns the next character that isn't whitespace without reading it, or an empty string at the end """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in WHITESPACE:
+                self.position += 1
+
+            if self.position < len(self.buffer) or not self.read_more():
+                break
+
+        return self.buffer[self.position:self.position + 1]
+
+    def expect(self, characters: str) -> str:
+        character = self.peek()
+        if not character or character not in characters:
+            raise json.JSONDecodeError(f"Expecting one of '{characters}'", self.buffer, self.position)
+
+        self.position += 1
+        return character
+
+    def read_value(self):
+        """ decode the JSON value at the current position """
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.position)
+                # a number cut off by the end of the buffer, like '-57.', decodes as a shorter number, a value is
+                # only complete if it's followed by a delimiter
+                if self.eof or (end < len(self.buffer) and self.buffer[end] in DELIMITERS):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+
+            # the value doesn't fit in the buffer, double the buffer so large values aren't decoded over and over
+            self.read_more(len(self.buffer) - self.position)
+
+    def iter_object(self) -> Iterator[str]:
+        """ yields the keys of the object at the current position, the value of each key has to be read, with
+            read_value() or by walking it, before the next key is requested """
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return
+
+        while True:
+            if self.peek() != '"':
+                raise json.JSONDecodeError("Expecting property name enclosed in double quotes", self.buffer,
+                                           self.position)
+            key = self.read_value()
+            self.expect(':')
+            yield key
+
+            if self.expect(',}') == '}':
+                return
+
+    def iter_array(self) -> Iterator[int]:
+        """ yields the index of each element of the array at the current position, each element has to be read
+            before the next index is requested """
+        self.expect('[')
+        if self.peek() == ']':
+            self.position += 1
+            return
+
+        index = 0
+        while True:
+            yield index
+            index += 1
+
+            if self.expect(',]') == ']':
+                return
+
+
+def read_report(stream, stream_keys: tuple[str, ...] = ('instruments', 'samples'),
+                chunk_size: int = READ_CHUNK_SIZE) -> Iterator[tuple[str, object]]:
+    """ Yields the (key, value) pairs of the 'mission' object of an Andes report in the order they're read.
+
+        Arrays named in stream_keys are yielded an element at a time as (key, element) pairs so the array never has
+        to be held in memory. Anything in the report outside the mission object is skipped. """
+    reader = JsonReader(stream, chunk_size)
+    for key in reader.iter_object():
+        if key != 'mission':
+            reader.read_value()
+            continue
+
+        for mission_key in reader.iter_object():
+            if mission_key in stream_keys and reader.peek() == '[':
+                for _ in reader.iter_array():
+                    yield mission_key, reader.read_value()
+            else:
+                yield mission_key, reader.read_value()
+
+    if reader.peek():
+        raise json.JSONDecodeError("Extra data", reader.buffer, reader.position)
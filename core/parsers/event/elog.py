@@ -1,9 +1,12 @@
 import datetime
 import io
 import re
+import threading
 
-from enum import Enum
+from typing import Mapping
 
+from django.conf import settings
+from django.db import connections
 from django.db.models import QuerySet
 
 import config.utils
@@ -11,6 +14,9 @@ from core.models import NET_TYPES
 from settingsdb.models import FileConfiguration
 
 from core import models as core_models
+from core.parsers import parser_utils
+from core.parsers.event import elog_reader
+from core.parsers.event.elog_reader import ParserType
 
 from django.utils.translation import gettext_lazy as _
 
@@ -50,28 +56,25 @@ def get_or_create_file_config() -> QuerySet[FileConfiguration]:
               ("flow_end", "Flowmeter End", _("Label for the ending value of a flowmeter for a net event")),
               ]
 
-    existing_mappings = FileConfiguration.objects.filter(file_type=file_type)
-    create_mapping = []
-    for field in fields:
-        if not existing_mappings.filter(required_field=field[0]).exists():
-            mapping = FileConfiguration(file_type=file_type)
-            mapping.required_field = field[0]
-            mapping.mapped_field = field[1]
-            mapping.description = field[2]
-            create_mapping.append(mapping)
+    return parser_utils._get_or_create_file_config(file_type, fields)
 
-    if len(create_mapping) > 0:
-        FileConfiguration.objects.bulk_create(create_mapping)
 
-    return existing_mappings
+def get_mapped_fields() -> Mapping[str, str]:
+    # the required_field: mapped_field elog configuration from the in-process snapshot, so mapped fields can
+    # be looked up for every message object without querying the database
+    get_or_create_file_config()
+    return parser_utils.get_file_config('elog')
 
 
-class ParserType(Enum):
-    FILE = 'file'
-    MID = 'mid'
-    STATIONS = 'stations'
-    INSTRUMENTS = 'Instruments'
-    ERRORS = 'Errors'
+# when to keep elog variables, see settings.ELOG_VARIABLES
+VARIABLES_NONE = 'none'
+VARIABLES_LOAD = 'load'
+VARIABLES_DEFER = 'defer'
+
+VARIABLE_BATCH_SIZE = 500
+
+# number of processes log files are read in, None lets the process pool decide
+ELOG_WORKERS = None
 
 
 def validate_buffer_fields(required_fields: list, mapped_fields: dict, mid, buffer: dict) -> list:
@@ -92,14 +95,12 @@ def validate_buffer_fields(required_fields: list, mapped_fields: dict, mid, buff
 # the queryset should be settingsdb.models.FileConfiguration.objects.filter(file_type='elog')
 # loop over the queryset making sure the mapped_fields all exist in the buffer
 def validate_message_object(elog_configuration: QuerySet[FileConfiguration], buffer: dict) -> [Exception]:
-    errors = []
-    for field in elog_configuration:
-        if field.mapped_field not in buffer.keys():
-            err = KeyError({'message': _('Message object missing key'),
-                            'key': field.required_field, 'expected': field.mapped_field})
-            errors.append(err)
+    return elog_reader.validate_message_fields(get_configuration_fields(elog_configuration), buffer)
 
-    return errors
+
+def get_configuration_fields(elog_configuration: QuerySet[FileConfiguration]) -> list[tuple[str, str]]:
+    # the configuration as plain (required_field, mapped_field) tuples that can be passed to worker processes
+    return [(field.required_field, field.mapped_field) for field in elog_configuration]
 
 
 # updates the attribute (attr_key) of a given object (obj) with the new value (attr)
@@ -140,79 +141,39 @@ def update_attributes(obj, attributes: dict, update_dictionary: dict) -> None:
 
 # parse an elog stream pulling out the mid events, stations, and instruments and report missing required key errors
 def parse(file_name: str, stream: io.StringIO) -> dict:
-    elog_configuration = get_or_create_file_config()
-
-    message_object_buffer = {}
-    file_mid_buffer = {file_name: []}
-    errors = {}
-
-    stations = set()
-    instruments = set()
-
-    # All mid objects start with $@MID@$ and end with a series of equal signs and a blank line.
-    # Using regular expressions we'll split the whole stream in to mid objects, then process each object
-    # each mid object represents an action, events are made up of multiple actions
-    data = stream.read().strip().replace("\r\n", "\n")
-    paragraph = re.split('====*\n\n', data)
-    for mid in paragraph:
-
-        # Each variable in a mid object starts with the label followed by a colon followed by the value
-        tmp = re.findall('(.*?): *(.*?)\n', mid)
-
-        # easily convert the (label, value) tuples into a dictionary
-        buffer = dict(tmp)
-
-        if '$@MID@$' not in buffer:
-            raise LookupError({"message": _("Incorrectly formatted logfile missing $@MID@$ in paragraph"),
-                               "paragraph": mid})
-
-        # pop off the mid object number used to reference this process if there is an issue processing the mid object
-        mid_obj = buffer.pop('$@MID@$')
-
-        # validate the message object to ensure it has all the required fields
-        # if not, save the errors to be returned and move on to the next message object
-        mid_errors = validate_message_object(elog_configuration, buffer)
-        if mid_errors:
-            errors[mid_obj] = mid_errors
-            continue
-
-        message_object_buffer[mid_obj] = buffer
-        file_mid_buffer[file_name].append(mid_obj)
-
-        stations.add(buffer[elog_configuration.get(required_field='station').mapped_field])
-        instruments.add((buffer[elog_configuration.get(required_field='instrument').mapped_field],
-                         buffer[elog_configuration.get(required_field='attached').mapped_field]))
-
-    message_objects = {
-        # the file buffer says what objects belong to what file
-        ParserType.FILE: file_mid_buffer,
-        # the mid buffer contains the list of key, value pairs needed later for parsing data
-        ParserType.MID: message_object_buffer,
-        # the stations buffer has a set of stations
-        ParserType.STATIONS: set(stations),
-        # the instruments buffer has a set of instruments
-        ParserType.INSTRUMENTS: set(instruments),
-        # the error buffer is a dictionary with errors[mid]
-        ParserType.ERRORS: errors
-    }
-
-    return message_objects
+    return elog_reader.read_message_objects(file_name, stream, list(get_mapped_fields().items()))
 
 
 # parse multiple files for a given mission by parsing them individually and compressing their buffer
 # dictionaries into one then run the algorithm to parse each section of the buffer dictionaries
-def parse_files(mission, files):
+#
+# variables is one of VARIABLES_NONE, VARIABLES_LOAD or VARIABLES_DEFER, if not provided settings.ELOG_VARIABLES is used
+#
+# log files are read in up to max_workers processes, their buffers are merged, and written to the database, by
+# this process in the order the files were provided
+def parse_files(mission, files, variables: str = None, max_workers: int = None):
+    variables = variables if variables else getattr(settings, 'ELOG_VARIABLES', VARIABLES_NONE)
+    max_workers = max_workers if max_workers else ELOG_WORKERS
     file_count = len(files)
     message_objects = {
         ParserType.FILE: dict(),
         ParserType.MID: dict(),
         ParserType.STATIONS: set(),
         ParserType.INSTRUMENTS: set(),
-        ParserType.ERRORS: dict()
+        ParserType.ERRORS: dict(),
+        ParserType.HASHES: dict()
     }
     file_errors: [core_models.FileError] = []
-    for index, file in enumerate(files):
-        file_name = file.name
+
+    # uploaded files can't be passed to worker processes, but their contents can
+    file_data = [(file.name, file.read()) for file in files]
+    fields = list(get_mapped_fields().items())
+    read_files = elog_reader.read_elog_files(file_data, fields, max_workers)
+
+    # messages that had errors the last time the files were loaded have to be processed again to report them
+    error_mids = set(mission.file_errors.filter(file_name__in=[file_name for file_name, data in file_data]).values_list(
+        'file_name', 'line'))
+    for index, ((file_name, data), (file_message_objects, read_error)) in enumerate(zip(file_data, read_files)):
         # let the user know that we're about to start processing a file
         # send_user_notification_elog(group_name, mission, f'Processing file {process_message}')
         logger_notifications.info(_("Processing File") + " : %d/%d", (index + 1), file_count)
@@ -221,8 +182,8 @@ def parse_files(mission, files):
         mission.file_errors.filter(file_name=file_name).delete()
 
         try:
-            data = file.read()
-            file_message_objects = parse(file_name, io.StringIO(data.decode('utf-8')))
+            if read_error:
+                raise read_error
 
             # make note of missing required field errors in this file
             for mid, error_buffer in file_message_objects[ParserType.ERRORS].items():
@@ -244,13 +205,14 @@ def parse_files(mission, files):
             message_objects[ParserType.STATIONS].update(file_message_objects[ParserType.STATIONS])
             message_objects[ParserType.INSTRUMENTS].update(file_message_objects[ParserType.INSTRUMENTS])
             message_objects[ParserType.ERRORS].update(file_message_objects[ParserType.ERRORS])
+            message_objects[ParserType.HASHES].update(file_message_objects[ParserType.HASHES])
 
         except Exception as ex:
             if type(ex) is LookupError:
                 logger.error(ex)
                 err = core_models.FileError(mission=mission, type=core_models.ErrorType.event,
                                             file_name=file_name,
-                                            message=ex.args[0]['message'] + ", " + _("see error.log for details"))
+                                            message=_(ex.args[0]['message']) + ", " + _("see error.log for details"))
             else:
                 # Something is really wrong with this file
                 logger.exception(ex)
@@ -263,6 +225,9 @@ def parse_files(mission, files):
 
             continue
 
+    # only message objects that are new, or have changed since the elog was last loaded, have to be processed
+    skip_unchanged_mids(mission, message_objects, error_mids)
+
     errors: [tuple] = []
     # send_user_notification_elog(group_name, mission, f"Process Stations {process_message}")
     process_stations(mission, message_objects[ParserType.STATIONS])
@@ -293,6 +258,70 @@ def parse_files(mission, files):
 
     core_models.FileError.objects.bulk_create(file_errors)
 
+    if variables == VARIABLES_LOAD:
+        process_variables(mission, message_objects[ParserType.MID])
+    elif variables == VARIABLES_DEFER:
+        # events and actions have been committed, variables can be added without making the user wait on them
+        threading.Thread(target=process_deferred_variables, args=(mission, message_objects[ParserType.MID],),
+                         daemon=True).start()
+
+
+def _normalize_id(value):
+    # mids and event ids are strings in the elog buffers, but integers on the models
+    return int(value) if str(value).isnumeric() else value
+
+
+def skip_unchanged_mids(mission: core_models.Mission, message_objects: dict, error_mids: set = None) -> int:
+    # Remove message objects that were loaded before, and haven't changed since, from the MID buffer so a reloaded
+    # elog only processes new or edited messages. All the actions for an event from a file are replaced when any of
+    # its messages are processed, so messages are skipped an event at a time. An event is skipped when all of its
+    # messages have the same hash they were loaded with, no messages were added or removed and none of its
+    # messages are in the set of (file_name, mid) error_mids.
+    #
+    # returns the number of message objects skipped
+    mid_buffer = message_objects[ParserType.MID]
+    mid_hashes = message_objects.get(ParserType.HASHES, {})
+    if not mid_hashes:
+        return 0
+
+    event_field = get_mapped_fields()['event']
+
+    # the message objects in the buffer grouped by (file, event)
+    buffer_events = {}
+    for file_name, mids in message_objects[ParserType.FILE].items():
+        for mid in mids:
+            if mid in mid_buffer and event_field in mid_buffer[mid]:
+                key = (file_name, _normalize_id(mid_buffer[mid][event_field]))
+                buffer_events.setdefault(key, []).append(mid)
+
+    # the hashes of the message objects that actions were loaded from, grouped by (file, event)
+    loaded_events = {}
+    actions = core_models.Action.objects.filter(
+        event__mission=mission, file__in=message_objects[ParserType.FILE].keys(), mid__isnull=False
+    ).values_list('file', 'event__event_id', 'mid', 'mid_hash')
+    for file_name, event_id, mid, mid_hash in actions:
+        loaded_events.setdefault((file_name, event_id), {})[mid] = mid_hash
+
+    error_mids = error_mids if error_mids else set()
+    skipped = 0
+    for key, mids in buffer_events.items():
+        loaded_hashes = loaded_events.get(key)
+        if loaded_hashes is None or len(loaded_hashes) != len(mids):
+            continue
+
+        if any((key[0], _normalize_id(mid)) in error_mids for mid in mids):
+            continue
+
+        if all(loaded_hashes.get(_normalize_id(mid)) == mid_hashes.get(mid) for mid in mids):
+            for mid in mids:
+                mid_buffer.pop(mid)
+            skipped += len(mids)
+
+    if skipped:
+        logger.info(_("Skipped unchanged elog messages") + f" : {skipped}")
+
+    return skipped
+
 
 def process_stations(mission: core_models.Mission, station_queue: [str]) -> None:
     # create any stations on the stations queue that don't exist in the DB
@@ -398,8 +427,6 @@ def process_events(mission: core_models.Mission, mid_dictionary_buffer: {}) -> [
     database = mission._state.db
     errors = []
 
-    elog_configuration = get_or_create_file_config()
-
     existing_events = mission.events.all()
 
     # hopefully stations and instruments were created in bulk before hand
@@ -416,13 +443,10 @@ def process_events(mission: core_models.Mission, mid_dictionary_buffer: {}) -> [
 
     required_fields = ['event', 'station', 'instrument', 'start_sample_id', 'end_sample_id', 'wire_out', 'flow_start',
                        'flow_end', 'attached']
-    mapped_fields = {field.required_field: field.mapped_field for field in
-                     elog_configuration.filter(required_field__in=required_fields)}
+    mapped_fields = get_mapped_fields()
 
-    mid_list = list(mid_dictionary_buffer.keys())
-    mid_count = len(mid_list)
-    for mid, buffer in mid_dictionary_buffer.items():
-        index = mid_list.index(mid) + 1
+    mid_count = len(mid_dictionary_buffer)
+    for index, (mid, buffer) in enumerate(mid_dictionary_buffer.items(), start=1):
         logger_notifications.info(_("Processing Event for Elog Message") + f" : %d/%d", index, mid_count)
         update_fields.add("")
         try:
@@ -570,26 +594,18 @@ def process_attachments_actions(mission: core_models.Mission, dictionary_buffer:
 
     cur_event = None
 
-    elog_configuration = get_or_create_file_config()
-
     mid_dictionary_buffer = dictionary_buffer[ParserType.MID]
-    mid_list = list(mid_dictionary_buffer.keys())
-    mid_count = len(mid_list)
+    mid_count = len(mid_dictionary_buffer)
+    mid_hashes = dictionary_buffer.get(ParserType.HASHES, {})
+    mid_files = {mid: file for file, mids in dictionary_buffer[ParserType.FILE].items() for mid in mids}
 
     required_fields = ['event', 'attached', 'time_position', 'comment', 'action', 'data_collector', 'sounding']
-    mapped_fields = {field.required_field: field.mapped_field for field in
-                     elog_configuration.filter(required_field__in=required_fields)}
+    mapped_fields = get_mapped_fields()
 
-    for mid, buffer in mid_dictionary_buffer.items():
-        index = mid_list.index(mid) + 1
+    for index, (mid, buffer) in enumerate(mid_dictionary_buffer.items(), start=1):
         logger_notifications.info(_("Processing Attachments/Actions for Elog Message") + f" : %d/%d", index, mid_count)
 
-        file_buffer: dict[list] = dictionary_buffer[ParserType.FILE]
-        file_name = None
-        for file in file_buffer.keys():
-            if mid in file_buffer[file]:
-                file_name = file
-                break
+        file_name = mid_files.get(mid)
 
         try:
             field_errors = validate_buffer_fields(required_fields, mapped_fields, mid, buffer)
@@ -661,6 +677,7 @@ def process_attachments_actions(mission: core_models.Mission, dictionary_buffer:
                     'data_collector': data_collector,
                     'sounding': sounding,
                     'file': file_name,
+                    'mid_hash': mid_hashes.get(mid),
                 }
                 if action_type == core_models.ActionType.other:
                     attrs['action_type_other'] = action_type_text
@@ -669,7 +686,8 @@ def process_attachments_actions(mission: core_models.Mission, dictionary_buffer:
 
             else:
                 action = core_models.Action(file=file_name, event=event, date_time=date_time, mid=mid,
-                                            latitude=lat, longitude=lon, type=action_type)
+                                            latitude=lat, longitude=lon, type=action_type,
+                                            mid_hash=mid_hashes.get(mid))
 
                 # add on our optional fields if they exist
                 if data_collector and data_collector != "":
@@ -708,19 +726,75 @@ def process_attachments_actions(mission: core_models.Mission, dictionary_buffer:
     return errors
 
 
-def get_create_and_update_variables(mission: core_models.Mission, action: core_models.Action, buffer) -> [[], []]:
-    database = mission._state.db
-    variables_to_create = []
-    variables_to_update = []
-    for key, value in buffer.items():
-        variable = core_models.VariableName.objects.get_or_create(name=key)[0]
-        filtered_variables = action.variables.filter(name=variable)
-        if not filtered_variables.exists():
-            new_variable = core_models.VariableField(action=action, name=variable, value=value)
-            variables_to_create.append(new_variable)
-        else:
-            update_variable = filtered_variables[0]
-            update_variable.value = value
-            variables_to_update.append(update_variable)
+def get_variable_names(names: set[str]) -> dict[str, core_models.VariableName]:
+    # returns a dictionary of VariableName objects by name, creating the names that don't exist yet
+    variable_names = {variable.name: variable for variable in core_models.VariableName.objects.filter(name__in=names)}
+    missing_names = [name for name in names if name not in variable_names]
+    if missing_names:
+        core_models.VariableName.objects.bulk_create([core_models.VariableName(name=name) for name in missing_names])
+        variable_names.update({variable.name: variable for variable in
+                               core_models.VariableName.objects.filter(name__in=missing_names)})
+
+    return variable_names
+
+
+def process_variables(mission: core_models.Mission, mid_dictionary_buffer: {}) -> None:
+    # Keep the elog values that aren't mapped to a required field as VariableFields on the action created for
+    # their message object. Names are loaded into one dictionary, existing variables are loaded for all the actions
+    # at once and variables are created and updated in bulk.
+    logger_notifications.info(_("Processing Elog Variables"))
+
+    mapped_fields = get_mapped_fields()
+    excluded_fields = set(mapped_fields.values())
 
-    return [variables_to_create, variables_to_update]
+    mid_variables = {}
+    for mid, buffer in mid_dictionary_buffer.items():
+        if mapped_fields['event'] not in buffer or not buffer[mapped_fields['event']].isnumeric():
+            continue
+
+        key = (int(buffer[mapped_fields['event']]), int(mid))
+        mid_variables[key] = {name: value for name, value in buffer.items() if name not in excluded_fields}
+
+    actions = core_models.Action.objects.filter(
+        event__mission=mission, mid__in={mid for (event_id, mid) in mid_variables.keys()}
+    ).select_related('event')
+    actions = {(action.event.event_id, action.mid): action for action in actions}
+
+    variable_names = get_variable_names({name for variables in mid_variables.values() for name in variables})
+
+    existing_variables = {
+        (variable.action_id, variable.name_id): variable for variable in
+        core_models.VariableField.objects.filter(action__in=list(actions.values()))
+    }
+
+    create_variables = []
+    update_variables = []
+    for key, variables in mid_variables.items():
+        if (action := actions.get(key)) is None:
+            # if the action wasn't created there should already be an error for why
+            continue
+
+        for name, value in variables.items():
+            variable_name = variable_names[name]
+            if (variable := existing_variables.get((action.pk, variable_name.pk))) is None:
+                create_variables.append(core_models.VariableField(action=action, name=variable_name, value=value))
+            elif variable.value != value:
+                variable.value = value
+                update_variables.append(variable)
+
+    if create_variables:
+        core_models.VariableField.objects.bulk_create(create_variables, batch_size=VARIABLE_BATCH_SIZE)
+
+    if update_variables:
+        core_models.VariableField.objects.bulk_update(update_variables, ['value'], batch_size=VARIABLE_BATCH_SIZE)
+
+
+def process_deferred_variables(mission: core_models.Mission, mid_dictionary_buffer: {}) -> None:
+    # process_variables() run from a background thread, the thread's database connection has to be closed when
+    # it's done
+    try:
+        process_variables(mission, mid_dictionary_buffer)
+    except Exception as ex:
+        logger.exception(ex)
+    finally:
+        connections.close_all()
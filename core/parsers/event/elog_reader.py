@@ -0,0 +1,152 @@
+# Reads elog files into message object buffers without touching the database so log files can be read in worker
+# processes. Don't import Django models here, worker processes may be started without Django being set up.
+import hashlib
+import io
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from typing import Iterator
+
+# All mid objects start with $@MID@$ and end with a series of equal signs and a blank line.
+mid_separator_pattern = re.compile(r'====*\n\n')
+
+# Each variable in a mid object starts with the label followed by a colon followed by the value. This matches the
+# same as '(.*?): *(.*?)\n' without the lazy matching
+mid_field_pattern = re.compile(r'([^:\n]*): *([^\n]*)\n')
+
+MID_LABEL = '$@MID@$'
+
+# number of characters read from a log file at a time
+READ_CHUNK_SIZE = 1024 * 1024
+
+# messages are translated by the process reporting them, Django's translations aren't available to worker processes
+MISSING_KEY_MESSAGE = 'Message object missing key'
+MISSING_MID_MESSAGE = "Incorrectly formatted logfile missing $@MID@$ in paragraph"
+
+
+class ParserType(Enum):
+    FILE = 'file'
+    MID = 'mid'
+    STATIONS = 'stations'
+    INSTRUMENTS = 'Instruments'
+    ERRORS = 'Errors'
+    HASHES = 'Hashes'
+
+
+def read_mids(stream, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[str]:
+    """ Yields the mid object paragraphs of an elog stream one at a time, without the separator, reading the
+        stream chunk_size characters at a time. Paragraphs are the same as splitting the whole log, with leading
+        and trailing whitespace removed, on a line of equal signs followed by a blank line. """
+    remainder = ''
+    first = True
+    while chunk := stream.read(chunk_size):
+        text = remainder + chunk
+        if text.endswith('\r'):
+            # the \n of a \r\n may be in the next chunk
+            text, carry = text[:-1], '\r'
+        else:
+            carry = ''
+
+        paragraphs = mid_separator_pattern.split(text.replace('\r\n', '\n'))
+
+        # the last paragraph may continue in the next chunk
+        remainder = paragraphs.pop() + carry
+        for paragraph in paragraphs:
+            yield paragraph.lstrip() if first else paragraph
+            first = False
+
+    paragraph = remainder.strip() if first else remainder.rstrip()
+    if paragraph or first:
+        yield paragraph
+
+
+def validate_message_fields(fields: list[tuple[str, str]], buffer: dict) -> [Exception]:
+    """ given a list of (required_field, mapped_field) tuples return a KeyError for each mapped field missing from
+        the buffer """
+    errors = []
+    for required_field, mapped_field in fields:
+        if mapped_field not in buffer.keys():
+            err = KeyError({'message': MISSING_KEY_MESSAGE, 'key': required_field, 'expected': mapped_field})
+            errors.append(err)
+
+    return errors
+
+
+def read_message_objects(file_name: str, stream, fields: list[tuple[str, str]]) -> dict:
+    """ parse an elog stream pulling out the mid objects, stations, and instruments and report missing required
+        key errors. `fields` are the (required_field, mapped_field) tuples of the elog file configuration. """
+    mapped_fields = dict(fields)
+
+    message_object_buffer = {}
+    file_mid_buffer = {file_name: []}
+    mid_hashes = {}
+    errors = {}
+
+    stations = set()
+    instruments = set()
+
+    # each mid object represents an action, events are made up of multiple actions
+    for mid in read_mids(stream):
+        # easily convert the (label, value) tuples into a dictionary
+        buffer = dict(mid_field_pattern.findall(mid))
+
+        if MID_LABEL not in buffer:
+            raise LookupError({"message": MISSING_MID_MESSAGE, "paragraph": mid})
+
+        # pop off the mid object number used to reference this process if there is an issue processing the mid object
+        mid_obj = buffer.pop(MID_LABEL)
+
+        # validate the message object to ensure it has all the required fields
+        # if not, save the errors to be returned and move on to the next message object
+        mid_errors = validate_message_fields(fields, buffer)
+        if mid_errors:
+            errors[mid_obj] = mid_errors
+            continue
+
+        message_object_buffer[mid_obj] = buffer
+        file_mid_buffer[file_name].append(mid_obj)
+        mid_hashes[mid_obj] = hashlib.sha256(mid.encode('utf-8')).hexdigest()
+
+        stations.add(buffer[mapped_fields['station']])
+        instruments.add((buffer[mapped_fields['instrument']], buffer[mapped_fields['attached']]))
+
+    message_objects = {
+        # the file buffer says what objects belong to what file
+        ParserType.FILE: file_mid_buffer,
+        # the mid buffer contains the list of key, value pairs needed later for parsing data
+        ParserType.MID: message_object_buffer,
+        # the stations buffer has a set of stations
+        ParserType.STATIONS: stations,
+        # the instruments buffer has a set of instruments
+        ParserType.INSTRUMENTS: instruments,
+        # the error buffer is a dictionary with errors[mid]
+        ParserType.ERRORS: errors,
+        # the hash buffer has the content hash of each mid object, hashes[mid]
+        ParserType.HASHES: mid_hashes
+    }
+
+    return message_objects
+
+
+def read_elog_file(file_name: str, data: bytes, fields: list[tuple[str, str]]) -> tuple[dict | None, Exception | None]:
+    """ read_message_objects() for the contents of an uploaded file. If the file couldn't be read the exception is
+        returned so it can be reported the same way it would if the file was read by the calling process. """
+    try:
+        with io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', newline='\n') as stream:
+            return read_message_objects(file_name, stream, fields), None
+    except Exception as ex:
+        return None, ex
+
+
+def read_elog_files(files: list[tuple[str, bytes]], fields: list[tuple[str, str]],
+                    max_workers: int = None) -> Iterator[tuple[dict | None, Exception | None]]:
+    """ read_elog_file() for a list of (file_name, data) tuples, read in up to max_workers processes.
+        Results are returned in the order of the file list. """
+    if max_workers == 1 or len(files) <= 1:
+        for file_name, data in files:
+            yield read_elog_file(file_name, data, fields)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(read_elog_file, *zip(*files), [fields] * len(files))
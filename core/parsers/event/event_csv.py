@@ -11,39 +11,97 @@ logger = logging.getLogger('dart')
 logger_notifications = logging.getLogger('dart.user.csv')
 
 
+EVENT_FIELDS = ['station', 'instrument', 'sample_id', 'end_sample_id', 'wire_out', 'wire_angle', 'flow_start',
+                'flow_end']
+
+
+def get_station_map() -> dict[str, models.Station]:
+    # stations are matched by name ignoring case, if there happen to be more than one the first station is used
+    station_map = {}
+    for station in models.Station.objects.order_by('pk'):
+        station_map.setdefault(station.name.lower(), station)
+
+    return station_map
+
+
+def get_instrument_map() -> dict[tuple[str, int], models.Instrument]:
+    # instruments are matched by (name, type) ignoring the case of the name
+    instrument_map = {}
+    for instrument in models.Instrument.objects.order_by('pk'):
+        instrument_map.setdefault((instrument.name.lower(), instrument.type), instrument)
+
+    return instrument_map
+
+
+def get_event_map(mission: models.Mission) -> dict[tuple[int, int, str], models.Event]:
+    # existing mission events keyed by (event_id, instrument type, instrument name) ignoring the case of the name
+    event_map = {}
+    for event in mission.events.select_related('instrument').order_by('pk'):
+        event_map.setdefault((event.event_id, event.instrument.type, event.instrument.name.lower()), event)
+
+    return event_map
+
+
+def get_row_instruments(data_frame: pd.DataFrame, instrument_map: dict) -> pd.Series:
+    # match every row of the dataframe to its instrument, the type only has to be worked out once per unique string
+    instrument_types = {inst_type: get_instrument_type(inst_type) for inst_type in
+                        data_frame['INSTRUMENT_TYPE'].unique()}
+    row_types = data_frame['INSTRUMENT_TYPE'].map(instrument_types)
+    row_keys = zip(data_frame['INSTRUMENT_NAME'].astype(str).str.lower(), row_types)
+    return pd.Series([instrument_map.get(key) for key in row_keys], index=data_frame.index, dtype=object)
+
+
+def validate_rows(mission: models.Mission, file_name: str, data_frame: pd.DataFrame, column: str,
+                  message) -> pd.DataFrame:
+    # Report rows missing a value for the column and return the rows that have one
+    missing = data_frame[column].isna()
+    if missing.any():
+        errors = [models.FileError(mission=mission, file_name=file_name, message=message, line=event_id, code=201,
+                                   type=models.ErrorType.missing_value)
+                  for event_id in data_frame.loc[missing, 'EVENT_ID'].unique().tolist()]
+        models.FileError.objects.bulk_create(errors)
+
+    return data_frame[~missing]
+
+
 def create_events(mission: models.Mission, data_frame: pd.DataFrame) -> dict:
     events_map = {}  # Map of event_id to Event object for quick lookup
 
+    station_map = get_station_map()
+    instrument_map = get_instrument_map()
+    existing_events = get_event_map(mission)
+
+    data_frame = data_frame.copy()
+    data_frame['INSTRUMENT'] = get_row_instruments(data_frame, instrument_map)
+    data_frame['STATION_OBJ'] = data_frame['STATION'].astype(str).str.lower().map(station_map)
+
+    unknown = data_frame['INSTRUMENT'].isna() | data_frame['STATION_OBJ'].isna()
+    if unknown.any():
+        row = data_frame[unknown].iloc[0]
+        raise KeyError(_("Unknown station or instrument") + f" : {row['STATION']}, {row['INSTRUMENT_NAME']}")
+
+    # only the first row of an event is used to create or update the event
+    data_frame['INSTRUMENT_ID'] = data_frame['INSTRUMENT'].map(lambda instrument: instrument.pk)
+    data_frame = data_frame.drop_duplicates(subset=['EVENT_ID', 'INSTRUMENT_ID'])
+
     total_rows = data_frame.shape[0]
-    processed = 1
     create_events = []
     update_events = []
-    for index, row in data_frame.iterrows():
-        if processed % 10 == 0 or processed == total_rows:
+    for processed, row in enumerate(data_frame.to_dict('records'), start=1):
+        if processed % 100 == 0 or processed == total_rows:
             logger_notifications.info("Processing Events: %d/%d", processed, total_rows)
 
-        station = models.Station.objects.get(name__iexact=row['STATION'])
-        inst_type = get_instrument_type(row['INSTRUMENT_TYPE'])
-        instrument = models.Instrument.objects.get(name__iexact=row['INSTRUMENT_NAME'], type=inst_type)
-
-        # if the event already exists in the database we're going to update it on our first pass
-        # if it doesn't exist we'll create a new event.
-        # if the event was added to the event map for either updating or creation, we're done
-        if (row['EVENT_ID'], instrument.pk) in events_map:
-            processed += 1
-            continue
+        instrument = row['INSTRUMENT']
 
-        try:
-            event = models.Event.objects.get(mission=mission, event_id=row['EVENT_ID'],
-                                             instrument__type=instrument.type,
-                                             instrument__name__iexact=instrument.name)
-            event.actions.all().delete()
+        # if the event already exists in the database we're going to update it, if not we'll create a new event.
+        event_key = (row['EVENT_ID'], instrument.type, instrument.name.lower())
+        if (event := existing_events.get(event_key)) is not None:
             update_events.append(event)
-        except models.Event.DoesNotExist:
+        else:
             event = models.Event(mission=mission, event_id=row['EVENT_ID'])
             create_events.append(event)
 
-        event.station = station
+        event.station = row['STATION_OBJ']
         event.instrument = instrument
         event.sample_id = row['STARTING_ID'] if row['STARTING_ID'] else None
         if 'ENDING_ID' in data_frame.columns:
@@ -55,45 +113,55 @@ def create_events(mission: models.Mission, data_frame: pd.DataFrame) -> dict:
         event.flow_end = row['FLOW_RECOVER'] if row['FLOW_RECOVER'] else None
 
         events_map[(row['EVENT_ID'], instrument.pk)] = event
-        processed += 1
+
+    if update_events:
+        # actions of updated events are replaced by the actions in the file
+        models.Action.objects.filter(event__in=update_events).delete()
+        models.Event.objects.bulk_update(update_events, EVENT_FIELDS)
 
     if create_events:
         models.Event.objects.bulk_create(create_events)
 
-    if update_events:
-        models.Event.objects.bulk_update(update_events, ['station', 'instrument', 'sample_id', 'end_sample_id', 'wire_out', 'wire_angle', 'flow_start', 'flow_end'])
-
     return events_map
 
 
 def create_actions(file_name: str, data_frame: pd.DataFrame, events_map: dict):
+    instrument_map = get_instrument_map()
+
+    data_frame = data_frame.copy()
+    data_frame['INSTRUMENT'] = get_row_instruments(data_frame, instrument_map)
+
+    has_comment = 'COMMENT' in data_frame.columns
     total_rows = data_frame.shape[0]
-    processed = 1
-    for index, row in data_frame.iterrows():
-        if processed % 50 == 0 or processed == total_rows:
+    create_actions = {}
+    for processed, row in enumerate(data_frame.to_dict('records'), start=1):
+        if processed % 500 == 0 or processed == total_rows:
             logger_notifications.info("Processing Actions: %d/%d", processed, total_rows)
 
-        instrument_type = get_instrument_type(row['INSTRUMENT_TYPE'])
-        instrument = models.Instrument.objects.get(name__iexact=row['INSTRUMENT_NAME'], type=instrument_type)
-
-        event = events_map[(row['EVENT_ID'], instrument.pk)]
+        event = events_map[(row['EVENT_ID'], row['INSTRUMENT'].pk)]
         action_type = get_action_type(row['ACTION'])
+
+        # Actions of the events in the events_map were removed, or the events are new, so an event only
+        # gets the first action of each type in the file
+        if (event.pk, action_type) in create_actions:
+            continue
+
         action_type_other = row['ACTION'] if action_type == models.ActionType.other else None
-        event_action, created_action = models.Action.objects.get_or_create(
+        create_actions[(event.pk, action_type)] = models.Action(
             event=event,
             type=action_type,
-            defaults={
-                'date_time': row['DATE_TIME'] if row['DATE_TIME'] else None,
-                'latitude': row['LATITUDE'] if row['LATITUDE'] else None,
-                'longitude': row['LONGITUDE'] if row['LONGITUDE'] else None,
-                'sounding': row['SOUNDING'] if row['SOUNDING'] else None,
-                'comment': row['COMMENT'] if 'COMMENT' in data_frame.columns and row['COMMENT'] else None,
-                'data_collector': row['DATA_COLLECTOR'] if row['DATA_COLLECTOR'] else None,
-                'file': file_name,
-                'action_type_other': action_type_other,
-            }
+            date_time=row['DATE_TIME'] if row['DATE_TIME'] else None,
+            latitude=row['LATITUDE'] if row['LATITUDE'] else None,
+            longitude=row['LONGITUDE'] if row['LONGITUDE'] else None,
+            sounding=row['SOUNDING'] if row['SOUNDING'] else None,
+            comment=row['COMMENT'] if has_comment and row['COMMENT'] else None,
+            data_collector=row['DATA_COLLECTOR'] if row['DATA_COLLECTOR'] else None,
+            file=file_name,
+            action_type_other=action_type_other,
         )
-        processed += 1
+
+    if create_actions:
+        models.Action.objects.bulk_create(create_actions.values())
 
 
 def rename_dataframe_fields(data_frame: pd.DataFrame):
@@ -133,6 +201,7 @@ def normal_csv_parser(mission: models.Mission, file_name: str, data_frame: pd.Da
                       'LATITUDE', 'LONGITUDE', 'SOUNDING', 'DATA_COLLECTOR', 'COMMENT']
 
     actions_df = data_frame[action_columns]
+    actions_df = validate_rows(mission, file_name, actions_df, 'DATE_TIME', _("Missing or invalid action date"))
 
     create_actions(file_name, actions_df, events_map)
 
@@ -196,15 +265,17 @@ def fixed_station_csv_parser(mission: models.Mission, file_name: str, data_frame
 
     # Step 3: Process actions (all rows) linked to events
 
-    for index, row in actions_df.iterrows():
-        event = ctd_events[row['EVENT_ID']]
-        first_action = event.actions.first()
-        if first_action:
-            actions_df.at[index, 'LATITUDE'] = first_action.latitude
-            actions_df.at[index, 'LONGITUDE'] = first_action.longitude
-            actions_df.at[index, 'SOUNDING'] = first_action.sounding
-            actions_df.at[index, 'DATA_COLLECTOR'] = first_action.data_collector
+    # get the first action of each CTD event in one query, actions are ordered by date_time
+    first_actions = {}
+    for action in models.Action.objects.filter(event__in=ctd_events.values()).order_by('event_id', 'date_time', 'pk'):
+        first_actions.setdefault(action.event_id, action)
 
+    ctd_actions = actions_df['EVENT_ID'].map(lambda event_id: first_actions.get(ctd_events[event_id].pk))
+    for column, attribute in [('LATITUDE', 'latitude'), ('LONGITUDE', 'longitude'), ('SOUNDING', 'sounding'),
+                              ('DATA_COLLECTOR', 'data_collector')]:
+        actions_df[column] = ctd_actions.map(lambda action: getattr(action, attribute) if action else None)
+
+    actions_df = validate_rows(mission, file_name, actions_df, 'DATE_TIME', _("Missing or invalid action date"))
     create_actions(file_name, actions_df, events_map)
 
 
@@ -241,14 +312,23 @@ def parse(mission: models.Mission, file_name: str, data: io.StringIO):
 def process_stations(station_list: list[str]):
     logger_notifications.info("Checking Stations")
 
+    # Check if stations exist in GlobalStation (case-insensitive)
+    global_stations = {station.name.lower(): station for station in settings_models.GlobalStation.objects.all()}
+    create_global_stations = {}
+    station_list = [str(station) for station in station_list]
     for station in station_list:
-        # Check if station exists in GlobalStation (case-insensitive)
-        try:
-            global_station = settings_models.GlobalStation.objects.get(name__iexact=station)
-        except settings_models.GlobalStation.DoesNotExist:
-            global_station = settings_models.GlobalStation.objects.create(name=station)
+        if station.lower() not in global_stations:
+            create_global_stations.setdefault(station.lower(), settings_models.GlobalStation(name=station))
 
-        models.Station.objects.get_or_create(name=global_station.name)
+    if create_global_stations:
+        settings_models.GlobalStation.objects.bulk_create(create_global_stations.values())
+        global_stations.update(create_global_stations)
+
+    station_names = {global_stations[station.lower()].name for station in station_list}
+    existing_stations = set(models.Station.objects.filter(name__in=station_names).values_list('name', flat=True))
+    create_stations = [models.Station(name=name) for name in sorted(station_names - existing_stations)]
+    if create_stations:
+        models.Station.objects.bulk_create(create_stations)
 
 
 def process_instruments(instruments_list: list[tuple[str, str]]):
@@ -256,10 +336,15 @@ def process_instruments(instruments_list: list[tuple[str, str]]):
     # makes sure that combination exists in the local DB.
     logger_notifications.info("Checking Instruments")
 
+    instrument_map = get_instrument_map()
+    create_instruments = {}
     for name, type in instruments_list:
-        inst_type = get_instrument_type(type)
-        if not (inst:=models.Instrument.objects.filter(name__iexact=name, type=inst_type)).exists():
-            models.Instrument.objects.create(name=name, type=inst_type)
+        key = (str(name).lower(), get_instrument_type(type))
+        if key not in instrument_map:
+            create_instruments.setdefault(key, models.Instrument(name=str(name), type=key[1]))
+
+    if create_instruments:
+        models.Instrument.objects.bulk_create(create_instruments.values())
 
 
 def get_instrument_type(instrument: str) -> models.InstrumentType:
@@ -1,13 +1,58 @@
+import threading
+
+from types import MappingProxyType
+from typing import Mapping
+
 from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
 from settingsdb.models import FileConfiguration
 
+# Parsers look up mapped fields for every row, or message object, they read. Rather than querying the
+# FileConfiguration table each time, all configurations are loaded once into a read only snapshot keyed by
+# (file_type, required_field). The snapshot is dropped when a configuration is saved or deleted and reloaded the
+# next time it's needed.
+_file_config_snapshot: Mapping[tuple[str, str], str] | None = None
+_file_config_lock = threading.Lock()
+
+
+def get_file_config_snapshot() -> Mapping[tuple[str, str], str]:
+    global _file_config_snapshot
+
+    with _file_config_lock:
+        if _file_config_snapshot is None:
+            configurations = FileConfiguration.objects.order_by('pk').values_list(
+                'file_type', 'required_field', 'mapped_field')
+            _file_config_snapshot = MappingProxyType({
+                (file_type, required_field): mapped_field for file_type, required_field, mapped_field in configurations
+            })
+
+        return _file_config_snapshot
+
+
+@receiver([post_save, post_delete], sender=FileConfiguration)
+def invalidate_file_config(**kwargs) -> None:
+    global _file_config_snapshot
+
+    with _file_config_lock:
+        _file_config_snapshot = None
+
+
+def get_file_config(file_type: str) -> Mapping[str, str]:
+    """ returns a read only dictionary of required_field: mapped_field for a file type from the snapshot """
+    snapshot = get_file_config_snapshot()
+    return MappingProxyType({required_field: mapped_field for (config_type, required_field), mapped_field
+                             in snapshot.items() if config_type == file_type})
+
+
 def _get_or_create_file_config(file_type, fields) -> QuerySet[FileConfiguration]:
     existing_mappings = FileConfiguration.objects.filter(file_type=file_type)
+    existing_fields = get_file_config(file_type)
 
     create_mapping = []
     for field in fields:
-        if not existing_mappings.filter(required_field=field[0]).exists():
+        if field[0] not in existing_fields:
             mapping = FileConfiguration(file_type=file_type)
             mapping.required_field = field[0]
             mapping.mapped_field = field[1]
@@ -16,5 +61,7 @@ def _get_or_create_file_config(file_type, fields) -> QuerySet[FileConfiguration]
 
     if len(create_mapping) > 0:
         FileConfiguration.objects.bulk_create(create_mapping)
+        # bulk_create doesn't send post_save signals
+        invalidate_file_config()
 
     return existing_mappings
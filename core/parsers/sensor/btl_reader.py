@@ -0,0 +1,161 @@
+# Reads BTL and ROS files into plain dataframes and header dictionaries without touching the database so
+# files can be read in worker processes. Don't import Django models here, worker processes may be started
+# without Django being set up.
+import hashlib
+import io
+import os
+import re
+import threading
+
+import ctd
+import pandas as pd
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+header_line_pattern = re.compile(r'\*\*.*', re.MULTILINE)
+
+# BTL files that have been read, keyed by the path, modified time and size of the BTL and ROS files, so a file is
+# only read again if it has changed
+BTL_CACHE_SIZE = 512
+_btl_cache = OrderedDict()
+_btl_cache_lock = threading.Lock()
+
+
+def get_file_properties(header: str) -> dict:
+    """ given the header of a BTL file return the '** name: value' lines as a dictionary of upper case names """
+    header_lines: list[str] = header_line_pattern.findall(header)
+    cleaned_lines: list[list[str]] = [line.replace('**', '').split(":") for line in header_lines]
+    return {cl[0].strip().upper(): cl[1].strip() for cl in cleaned_lines if len(cl) >= 2}
+
+
+def get_ros_file(btl_file: str) -> str | None:
+    # Construct the expected .ros file path
+    ros_file = os.path.splitext(btl_file)[0] + ".ros"
+    return ros_file if os.path.exists(ros_file) else None
+
+
+def read_file(file: str) -> tuple[str, dict]:
+    """ returns the text of a BTL or ROS file and its manifest, the 'file_hash', 'file_modified' time and
+        'file_size', as it was when the file was read """
+    with open(file, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        raw = f.read()
+
+    manifest = {'file_hash': hashlib.sha256(raw).hexdigest(), 'file_modified': stat.st_mtime,
+                'file_size': stat.st_size}
+    return raw.decode('cp1252'), manifest
+
+
+def get_file_hash(file: str) -> str:
+    with open(file, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def read_btl_file(btl_file: str) -> dict:
+    """ Reads a BTL file and the sensor configuration of its ROS file, if there is one.
+
+        Returns a dictionary with the 'data' as a plain dataframe, the ctd 'metadata' the dataframe was read with,
+        the header 'properties', the 'ros_file' and its 'ros_config' and the 'btl_manifest' and 'ros_manifest' of
+        the files as they were read, see read_file(). If the BTL file couldn't be read the
+        exception is returned as the 'error' so it can be reported the same way it would if the file was read
+        by the calling process. """
+    result = {'btl_file': btl_file, 'data': None, 'metadata': None, 'properties': None,
+              'ros_file': get_ros_file(btl_file), 'ros_config': None, 'btl_manifest': None, 'ros_manifest': None,
+              'error': None}
+
+    try:
+        text, result['btl_manifest'] = read_file(btl_file)
+        data: pd.DataFrame = ctd.read.from_btl(io.StringIO(text, newline=None))
+
+        # the ctd package keeps the header on the dataframe as _metadata, which doesn't survive being passed
+        # between processes, so the dataframe and metadata are returned separately
+        result['metadata'] = dict(getattr(data, '_metadata'))
+        result['data'] = pd.DataFrame(data)
+        result['properties'] = get_file_properties(result['metadata']['header'])
+    except Exception as ex:
+        result['error'] = ex
+        return result
+
+    if result['ros_file']:
+        try:
+            text, result['ros_manifest'] = read_file(result['ros_file'])
+            summary = ctd.rosette_summary(io.StringIO(text, newline=None))
+            result['ros_config'] = getattr(summary, '_metadata')['config']
+        except Exception:
+            # the FixStationParser will read the ROS file itself and report the problem
+            pass
+
+    return result
+
+
+def get_btl_dataframe(result: dict) -> pd.DataFrame:
+    """ returns a copy of the dataframe from read_btl_file() with the ctd metadata reattached """
+    data = result['data'].copy()
+    data._metadata = dict(result['metadata'])
+    return data
+
+
+def get_cache_key(btl_file: str) -> tuple | None:
+    files = [btl_file] + ([ros_file] if (ros_file := get_ros_file(btl_file)) else [])
+    try:
+        stats = [os.stat(file) for file in files]
+    except OSError:
+        return None
+
+    return (os.path.abspath(btl_file),) + tuple((stat.st_mtime_ns, stat.st_size) for stat in stats)
+
+
+def get_cached_btl_file(btl_file: str) -> dict | None:
+    key = get_cache_key(btl_file)
+    with _btl_cache_lock:
+        if key is None or key not in _btl_cache:
+            return None
+
+        _btl_cache.move_to_end(key)
+        return _btl_cache[key]
+
+
+def cache_btl_file(result: dict):
+    # files that couldn't be read aren't cached so the error is reported each time the file is loaded
+    key = get_cache_key(result['btl_file'])
+    if key is None or result['error']:
+        return
+
+    with _btl_cache_lock:
+        _btl_cache[key] = result
+        while len(_btl_cache) > BTL_CACHE_SIZE:
+            _btl_cache.popitem(last=False)
+
+
+def get_btl_file(btl_file: str) -> dict:
+    """ read_btl_file(), but a file is only read if it isn't cached or has changed since it was cached """
+    if (result := get_cached_btl_file(btl_file)) is None:
+        result = read_btl_file(btl_file)
+        cache_btl_file(result)
+
+    return result
+
+
+def read_btl_files(btl_files: list[str], max_workers: int = None) -> Iterator[dict]:
+    """ get_btl_file() for a list of files, files that have to be read are read in up to max_workers processes.
+        Results are returned in the order of the file list. """
+    cached = [get_cached_btl_file(btl_file) for btl_file in btl_files]
+    missing = [btl_file for btl_file, result in zip(btl_files, cached) if result is None]
+
+    def read_missing():
+        if max_workers == 1 or len(missing) <= 1:
+            yield from map(read_btl_file, missing)
+            return
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(read_btl_file, missing)
+
+    read = read_missing()
+    for result in cached:
+        if result is None:
+            result = next(read)
+            cache_btl_file(result)
+
+        yield result
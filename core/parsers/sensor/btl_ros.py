@@ -9,7 +9,7 @@ import json
 import pandas as pd
 
 from geopy.distance import geodesic
-from typing import List, Any
+from typing import Iterator, List, Any
 
 from django.utils.translation import gettext as _
 
@@ -17,6 +17,7 @@ from config import utils
 from core import models as core_models
 from bio_tables import models as bio_models
 from core.utils import is_number
+from core.parsers.sensor import btl_reader
 from settingsdb.models import  GlobalSampleType, GlobalStation
 
 import logging
@@ -24,6 +25,9 @@ import logging
 logger = logging.getLogger('dart')
 logger_notifications = logging.getLogger('dart.user.fixstationparser')
 
+# number of processes used to read BTL/ROS files, None uses one process per CPU
+BTL_WORKERS = None
+
 
 def get_btl_mapping() -> dict:
     config_dir = 'file_configs'
@@ -39,7 +43,7 @@ def get_btl_mapping() -> dict:
 def validate_fixed_station_file(btl_stream, file_properties: dict = None) -> None:
     btl_mapping = get_btl_mapping()
 
-    if not file_properties:
+    if file_properties is None:
         data: pd.DataFrame = ctd.read.from_btl(btl_stream)
 
         metadata: dict = data.__getattr__('_metadata')
@@ -130,7 +134,7 @@ def validate_btl_file(btl_stream, file_properties: dict = None) -> None:
     # file matches an existing event. Ideally we'll be able to also match the station
     btl_mapping = get_btl_mapping()
 
-    if not file_properties:
+    if file_properties is None:
         data: pd.DataFrame = ctd.read.from_btl(btl_stream)
 
         metadata: dict = data.__getattr__('_metadata')
@@ -215,26 +219,27 @@ class FixStationParser:
         existing_bottles = {bottle.bottle_id: bottle for bottle in self.event.bottles.all()}
 
         logger_notifications.info(_("Processing Bottles"))
+        if 'bottle_id' in dataframe_dict:
+            bottle_ids = list(data_frame_avg[dataframe_dict['bottle_id']])
+        elif self.event.sample_id:
+            bottle_ids = [self.event.sample_id + (row-1) for row in data_frame_avg.index]
+        else:
+            raise ValueError(_("Require either S/N column in BTL file or Start IDs specified for the Event"))
+
+        # bottles that overlap with another event, excluding bottles from this event and bottles created for
+        # net events, are found with one query for all the bottles in the file
+        conflicting_bottles = set(core_models.Bottle.objects.exclude(event=self.event).exclude(
+            event__instrument__type=core_models.InstrumentType.net).filter(
+            bottle_id__in=bottle_ids).values_list('bottle_id', flat=True))
+
         create_bottles = []
         update_bottles = []
         update_fields = set()
-        for row, bottle in data_frame_avg.iterrows():
+        for (row, bottle), bottle_id in zip(data_frame_avg.iterrows(), bottle_ids):
             update_bottle_fields = set('')
-            if 'bottle_id' in dataframe_dict:
-                bottle_id: int = bottle[dataframe_dict['bottle_id']]
-            elif self.event.sample_id:
-                bottle_id: int = self.event.sample_id + (row-1)
-            else:
-                raise ValueError(_("Require either S/N column in BTL file or Start IDs specified for the Event"))
-
-            # when looking for existing bottles that overlap with another event exclude bottles from this event
-            # and bottles created for net events
-            btl = core_models.Bottle.objects.exclude(event=self.event).exclude(
-                event__instrument__type=core_models.InstrumentType.net).filter(bottle_id=bottle_id)
-            if btl.exists():
-                # if the bottle exists for an event other than the current event
-                if not (btl.first().event == self.event):
-                    raise KeyError(_("Bottle with provided ID already exists") + f" {int(bottle_id)}")
+            # if the bottle exists for an event other than the current event
+            if bottle_id in conflicting_bottles:
+                raise KeyError(_("Bottle with provided ID already exists") + f" {int(bottle_id)}")
 
             closed = pytz.utc.localize(bottle['date'])
             pressure = bottle.get(dataframe_dict['pressure'], None)
@@ -310,8 +315,11 @@ class FixStationParser:
     def process_ros_sensors(self, sensors: list[str]):
         """given a ROS file create sensors objects from the config portion of the file"""
 
-        summary = ctd.rosette_summary(self.ros_stream)
-        sensor_headings = re.findall(r"# name \d+ = (.*?)\n", getattr(summary, '_metadata')['config'])
+        ros_config = self.ros_config
+        if ros_config is None:
+            summary = ctd.rosette_summary(self.ros_stream)
+            ros_config = getattr(summary, '_metadata')['config']
+        sensor_headings = re.findall(r"# name \d+ = (.*?)\n", ros_config)
 
         existing_sensors = GlobalSampleType.objects.filter(is_sensor=True).values_list('short_name',
                                                                                        flat=True).distinct()
@@ -372,7 +380,7 @@ class FixStationParser:
             GlobalSampleType.objects.bulk_create(create_sensors)
 
     def process_sensors(self, column_headers: list[str]):
-        if self.ros_stream:
+        if self.ros_stream or self.ros_config:
             # Given a list of column, 'SampleType' objects will be created if they do not already exist
             # or aren't part of a set of excluded sensors
             self.process_ros_sensors(sensors=column_headers)
@@ -399,7 +407,9 @@ class FixStationParser:
         new_discrete_samples: List[core_models.DiscreteSampleValue] = []
         update_discrete_samples: List[core_models.DiscreteSampleValue] = []
 
-        bottles = self.event.bottles.all()
+        # bottles, samples and sensor values for this event are loaded once and looked up by bottle id,
+        # (bottle, sample type) and sample
+        bottles = {bottle.bottle_id: bottle for bottle in self.event.bottles.all()}
 
         # make global sample types local to this mission to be attached to samples when they're created
         missing_sample_types = [name for name in column_headers if name.lower() not in self.mission_sample_types.keys()]
@@ -421,6 +431,19 @@ class FixStationParser:
                 }
 
         sample_types = self.mission_sample_types
+        column_types = [sample_types[column.lower()] for column in column_headers]
+        event_samples = core_models.Sample.objects.filter(bottle__event=self.event, type__in=column_types)
+        samples = {}
+        for sample in event_samples.order_by('pk'):
+            samples.setdefault((sample.bottle_id, sample.type_id), sample)
+
+        # sensor data doesn't have replicates, so we're always just dealing with the first discrete value
+        discrete_values = {}
+        event_values = core_models.DiscreteSampleValue.objects.filter(sample__bottle__event=self.event,
+                                                                      sample__type__in=column_types)
+        for discrete_value in event_values.order_by('pk'):
+            discrete_values.setdefault(discrete_value.sample_id, discrete_value)
+
         bottles_added = 0
         for row, data in data_frame_avg.iterrows():
             # if the Bottle S/N column is present then use that values as the bottle ID
@@ -432,24 +455,21 @@ class FixStationParser:
                 raise ValueError(
                     _("Require either S/N column in BTL file or Start and End Bottle IDs specified for the Event"))
 
-            if not bottles.filter(bottle_id=bottle_id).exists():
+            if (bottle := bottles.get(bottle_id)) is None:
                 message = _("Bottle does not exist for event")
                 message += _("Event") + f" #{self.event.event_id} " + _("Bottle ID") + f" #{bottle_id}"
 
                 logger.warning(message)
                 continue
 
-            bottle = bottles.get(bottle_id=bottle_id)
             for column in column_headers:
                 sample_type = sample_types[column.lower()]
 
-                if (sample := core_models.Sample.objects.filter(bottle=bottle, type=sample_type)).exists():
-                    sample = sample.first()
+                if (sample := samples.get((bottle.pk, sample_type.pk))) is not None:
                     if utils.updated_value(sample, 'file', file_name):
                         update_samples.append(sample)
 
-                    # sensor data doesn't have replicates, so we're always just dealing with the first discrete value
-                    discrete_value = sample.discrete_values.first()
+                    discrete_value = discrete_values.get(sample.pk)
                     if discrete_value:
                         # there's a case here where a mission may have been created with uncalibrated data,
                         # then bad values were removed so the mission could be uploaded to Biochem. This
@@ -615,24 +635,25 @@ class FixStationParser:
 
         self.event.save()
 
+    @staticmethod
+    def get_column_headers(data: pd.DataFrame) -> list[str]:
+        # These are columns we either have no use for or we will specifically call and use later
+        # The Bottle column is the rosette number of the bottle
+        # The Bottle_ column, if present, is the bottle.bottle_id for a bottle.
+        exclude = ['bottle', 'bottle_', 'date', 'scan', 'times', 'statistic',
+                   'longitude', 'latitude', 'nbf', 'flag']
+        return [instrument.lower() for instrument in data.columns if instrument.lower() not in exclude]
+
     def parse(self):
         self.mission.file_errors.filter(file_name=self.btl_filename).delete()
         self.event.validation_errors.all().delete()
 
-        data: pd.DataFrame = ctd.read.from_btl(self.btl_stream)
+        data: pd.DataFrame = self.data if self.data is not None else ctd.read.from_btl(self.btl_stream)
 
         header = data._metadata['header']
+        self.file_properties = btl_reader.get_file_properties(header)
 
-        header_lines: str = re.findall(r'\*\*.*', header, re.MULTILINE)
-        cleaned_lines: list[str] = [re.sub(r'\*\*', '', line).split(":") for line in header_lines]
-        self.file_properties = {cl[0].strip().upper(): cl[1].strip() for cl in cleaned_lines if len(cl) >= 2}
-
-        # These are columns we either have no use for or we will specifically call and use later
-        # The Bottle column is the rosette number of the bottle
-        # The Bottle_ column, if present, is the bottle.bottle_id for a bottle.
-        exclude = ['bottle', 'bottle_', 'date', 'scan', 'times', 'statistic',
-                   'longitude', 'latitude', 'nbf', 'flag']
-        col_headers = [instrument.lower() for instrument in data.columns if instrument.lower() not in exclude]
+        col_headers = self.get_column_headers(data)
 
         self.process_bottles(data)
         self.process_sensors(column_headers=col_headers)
@@ -666,7 +687,10 @@ class FixStationParser:
 
         core_models.Bottle.objects.bulk_update(bottles, ['gear_type'])
 
-    def __init__(self, event: core_models.Event, btl_filename: str, btl_stream: io.StringIO, ros_stream: io.StringIO | None):
+    def __init__(self, event: core_models.Event, btl_filename: str, btl_stream: io.StringIO | None,
+                 ros_stream: io.StringIO | None, data: pd.DataFrame = None, ros_config: str = None):
+        # data and ros_config can be provided if the BTL file and ROS sensor configuration have already been read,
+        # like by btl_reader.read_btl_file(), in which case the streams don't have to be provided
         self.event = event
         self.mission = self.event.mission
         self.mission_sample_types = {
@@ -678,6 +702,9 @@ class FixStationParser:
         self.btl_stream: io.StringIO = btl_stream
         self.ros_stream: io.StringIO|None = ros_stream
 
+        self.data: pd.DataFrame | None = data
+        self.ros_config: str | None = ros_config
+
         self.file_properties: dict = None
 
 
@@ -712,17 +739,19 @@ class FixStationBulkParser:
         # if CTD events were loaded from a CSV, ANDES or Elog file, this is not a fixed station
         is_fixed_station = self.mission.fixed_station
 
-        for index, file in enumerate(self.file_list):
+        for index, btl_file in enumerate(self.read_files()):
             logger_notifications.info(_("Updating events") + " : %d/%d", (index + 1), bottle_count)
+            file = btl_file['btl_file']
             file_name = os.path.basename(file)
 
-            btl_sample_file = open(file, mode='rb')
-            btl_data = io.StringIO(btl_sample_file.read().decode("cp1252"))
             try:
+                if btl_file['error']:
+                    raise btl_file['error']
+
                 if is_fixed_station:
-                    validate_fixed_station_file(btl_data)
+                    validate_fixed_station_file(None, btl_file['properties'])
                 else:
-                    validate_btl_file(btl_data)
+                    validate_btl_file(None, btl_file['properties'])
             except KeyError as e:
                 logger.exception(e)
                 self.errors_to_create.append(core_models.FileError(mission=self.mission, file_name=file_name, message=str(e), code=104))
@@ -737,22 +766,13 @@ class FixStationBulkParser:
                 continue
 
             try:
-                # Construct the expected .ros file path
-                ros_file = os.path.splitext(file)[0] + ".ros"
-                if not os.path.exists(ros_file):
+                if not btl_file['ros_file']:
                     logger.warning(f"No matching .ros file found for: {file}")
-                    ros_file = None
-                    # raise FileNotFoundError(f"No matching .ros file found for: {file}")
-
-                data = ctd.read.from_btl(file)
 
-                header: str = data._metadata['header']
-                header_lines: str = re.findall(r'\*\*.*', header, re.MULTILINE)
-                cleaned_lines: list[str] = [re.sub(r'\*\*', '', line).split(":") for line in header_lines]
-                event_properties: dict = {cl[0].strip().upper(): cl[1].strip() for cl in cleaned_lines if len(cl) >= 2}
+                event_properties: dict = btl_file['properties']
 
                 event_id = event_properties.get(label_event)
-                parsed_events[event_id] = [file, ros_file]
+                parsed_events[event_id] = btl_file
 
                 if int(event_id) not in existing_events:
                     if station is None:
@@ -807,47 +827,55 @@ class FixStationBulkParser:
         ros_file_type = core_models.FileType.objects.get_or_create(name='ROS', extension='ROS',
                                                                    description='Rosette files')[0]
         for event_id in parsed_events:
-            btl_file = os.path.basename(parsed_events[event_id][0])
+            btl_file = os.path.basename(parsed_events[event_id]['btl_file'])
             event = core_models.Event.objects.get(event_id=event_id, instrument__type=core_models.InstrumentType.ctd)
             event.files.filter(file_type__in=[btl_file_type, ros_file_type]).delete()
 
-            new_files.append(core_models.EventFile(event=event, file_name=btl_file, file_type=btl_file_type))
+            # the manifest of the files as they were read is kept so unchanged files can be skipped by
+            # sync_bottle_directory()
+            new_files.append(core_models.EventFile(event=event, file_name=btl_file, file_type=btl_file_type,
+                                                   **(parsed_events[event_id]['btl_manifest'] or {})))
 
-            if len(parsed_events) > 1:
-                ros_file = os.path.basename(parsed_events[event_id][1])
-                new_files.append(core_models.EventFile(event=event, file_name=ros_file, file_type=ros_file_type))
+            if parsed_events[event_id]['ros_file']:
+                ros_file = os.path.basename(parsed_events[event_id]['ros_file'])
+                new_files.append(core_models.EventFile(event=event, file_name=ros_file, file_type=ros_file_type,
+                                                       **(parsed_events[event_id]['ros_manifest'] or {})))
 
         if new_files:
             core_models.EventFile.objects.bulk_create(new_files)
 
         return parsed_events
 
+    def read_files(self) -> Iterator[dict]:
+        # BTL files, and the sensor configuration from their ROS files, are read in worker processes, unless
+        # they've been read before and haven't changed. Results come back in the order of the file list so
+        # progress and errors are reported as if the files were read one at a time. Each file is only parsed once
+        # for the validate, create and parse stages. Only this process writes to the database.
+        yield from btl_reader.read_btl_files(self.file_list, self.max_workers)
+
     def process_bottles(self, parsed_events):
         # `parsed_events` is expected to be a dictionary where:
         # - The key is an event ID.
-        # - The value is a list of files, where:
-        #   - file[0] is the `btl_file`.
-        #   - file[1] is the associated `ros_file`.
+        # - The value is the BTL file as read by btl_reader.read_btl_file()
         bottle_count = len(parsed_events.keys())
         for index, event_file in enumerate(parsed_events.items()):
             logger_notifications.info(_("Parsing Bottle Data") + " : %d/%d", (index + 1), bottle_count)
             event_id = event_file[0]
-            btl_file = event_file[1][0]
-            ros_file = event_file[1][1]
+            btl_file = event_file[1]['btl_file']
+            ros_file = event_file[1]['ros_file']
             file_name = os.path.basename(btl_file)
             try:
                 event = core_models.Event.objects.get(event_id=event_id, instrument__type=core_models.InstrumentType.ctd)
 
-                with open(btl_file, 'r', encoding='cp1252') as btl:
-                    btl_input = io.StringIO(btl.read())
-
+                # the ROS file only has to be read again if its sensor configuration couldn't be read
                 ros_input = None
-                if ros_file:
+                if ros_file and event_file[1]['ros_config'] is None:
                     with open(ros_file, 'r', encoding='cp1252') as ros:
                         ros_input = io.StringIO(ros.read())
 
-                parser = FixStationParser(event=event, btl_filename=os.path.basename(btl_file),
-                                          btl_stream=btl_input, ros_stream=ros_input)
+                parser = FixStationParser(event=event, btl_filename=file_name, btl_stream=None,
+                                          ros_stream=ros_input, data=btl_reader.get_btl_dataframe(event_file[1]),
+                                          ros_config=event_file[1]['ros_config'])
                 parser.parse()
             except Exception as e:
                 message = _("Error parsing body ") + f": {btl_file}: {e}"
@@ -874,6 +902,121 @@ class FixStationBulkParser:
             core_models.FileError.objects.bulk_create(self.errors_to_create)
 
 
-    def __init__(self, mission: core_models.Mission, files: list):
+    def __init__(self, mission: core_models.Mission, files: list, max_workers: int = None):
         self.file_list = files
-        self.mission = mission
\ No newline at end of file
+        self.mission = mission
+        self.max_workers = max_workers if max_workers else BTL_WORKERS
+
+
+def is_file_unchanged(file: str, event_file: core_models.EventFile | None, touched: list) -> bool:
+    # A file is unchanged if its size and modified time match the manifest. If only the modified time is different
+    # the file is hashed, a file that was touched, or copied, but has the same content is still unchanged and
+    # the new modified time is added to the `touched` list so it doesn't have to be hashed next time.
+    if event_file is None or event_file.file_hash is None:
+        return False
+
+    stat = os.stat(file)
+    if stat.st_size != event_file.file_size:
+        return False
+
+    if stat.st_mtime == event_file.file_modified:
+        return True
+
+    if btl_reader.get_file_hash(file) != event_file.file_hash:
+        return False
+
+    event_file.file_modified = stat.st_mtime
+    touched.append(event_file)
+    return True
+
+
+def sync_bottle_directory(mission: core_models.Mission, directory: str = None, max_workers: int = None) -> dict:
+    """ Loads the BTL files in a directory, only parsing files that are new or that have changed, along with their
+        ROS files, since they were last loaded. Sensor samples for BTL files that have been removed from the
+        directory are deleted, along with their bottles unless other samples were loaded for them. If no directory
+        is given the missions bottle_directory is used.
+
+        Returns the number of 'new', 'changed', 'unchanged' and 'removed' files. """
+    directory = directory if directory else mission.bottle_directory
+    if not directory or not os.path.isdir(directory):
+        raise FileNotFoundError(_("Bottle directory not found") + f" : {directory}")
+
+    btl_files = sorted([os.path.join(directory, file) for file in os.listdir(directory)
+                        if file.upper().endswith('.BTL')])
+
+    # the manifest of the files as they were when they were last loaded
+    event_files = core_models.EventFile.objects.filter(
+        event__mission=mission, event__instrument__type=core_models.InstrumentType.ctd,
+        file_type__extension__in=['BTL', 'ROS']
+    ).select_related('file_type', 'event')
+    manifest = {(event_file.file_type.extension, event_file.file_name): event_file for event_file in event_files}
+    ros_event_files = {event_file.event_id: event_file for (extension, file_name), event_file in manifest.items()
+                       if extension == 'ROS'}
+
+    # files that had problems the last time they were loaded are loaded again
+    error_files = set(core_models.FileError.objects.filter(
+        mission=mission, code__gte=100, code__lte=299).values_list('file_name', flat=True))
+
+    counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+    touched = []
+    load_files = []
+    for btl_file in btl_files:
+        file_name = os.path.basename(btl_file)
+        btl_event_file = manifest.get(('BTL', file_name))
+        if btl_event_file is None:
+            counts['new'] += 1
+            load_files.append(btl_file)
+            continue
+
+        ros_file = btl_reader.get_ros_file(btl_file)
+        unchanged = file_name not in error_files and is_file_unchanged(btl_file, btl_event_file, touched)
+        if unchanged and ros_file:
+            ros_event_file = manifest.get(('ROS', os.path.basename(ros_file)))
+            unchanged = is_file_unchanged(ros_file, ros_event_file, touched)
+        elif unchanged and btl_event_file.event_id in ros_event_files:
+            # the ROS file was loaded last time, but has since been removed
+            unchanged = False
+
+        if unchanged:
+            counts['unchanged'] += 1
+        else:
+            counts['changed'] += 1
+            load_files.append(btl_file)
+
+    if touched:
+        core_models.EventFile.objects.bulk_update(touched, ['file_modified'])
+
+    # BTL files that were loaded, but are no longer in the directory
+    directory_files = {os.path.basename(btl_file) for btl_file in btl_files}
+    removed = [event_file for (extension, file_name), event_file in manifest.items()
+               if extension == 'BTL' and file_name not in directory_files]
+    for event_file in removed:
+        logger.info(_("Removing bottles for file") + f" : {event_file.file_name}")
+        event = event_file.event
+
+        # only the sensor samples read from the BTL file are removed. Bottles with samples loaded from other files,
+        # like oxygen or salts, or with plankton data are kept so the data loaded for them isn't lost
+        bottles = core_models.Bottle.objects.filter(event=event)
+        core_models.Sample.objects.filter(bottle__event=event, type__is_sensor=True).delete()
+        bottles.filter(samples__isnull=True, plankton_data__isnull=True).delete()
+
+        event.files.filter(file_type__extension__in=['BTL', 'ROS']).delete()
+        core_models.FileError.objects.filter(mission=mission, file_name=event_file.file_name).delete()
+
+        if kept := bottles.count():
+            message = (_("BTL file was removed from the bottle directory, bottles with samples loaded from other "
+                         "files were kept for event") + f" {event.event_id} : {kept}")
+            logger.warning(message)
+            core_models.FileError.objects.create(mission=mission, file_name=event_file.file_name, message=message,
+                                                 type=core_models.ErrorType.bottle, code=106)
+        counts['removed'] += 1
+
+    if load_files:
+        FixStationBulkParser(mission, load_files, max_workers=max_workers).parse()
+
+    if mission.bottle_directory != directory:
+        mission.bottle_directory = directory
+        mission.save()
+
+    logger.info(_("Synchronized bottle directory") + f" : {directory} : {counts}")
+    return counts
@@ -1,18 +1,48 @@
 import pandas as pd
 import logging
+import warnings
 
 from io import StringIO
 from dateutil.parser import parse
+from dateutil.tz import tzlocal
 from pytz import UTC
 
-from django.core.exceptions import ObjectDoesNotExist
 from django.utils.translation import gettext as _
 
-from core.models import Mission, InstrumentType, FileError, ErrorType, Bottle
+from core.models import Mission, InstrumentType, FileError, ErrorType, Bottle, Event
 
 logger = logging.getLogger('dart')
 logger_notifications = logging.getLogger('dart.user.qat')
 
+
+def to_utc(date_time: str):
+    try:
+        return parse(date_time).astimezone(UTC)
+    except (ValueError, OverflowError):
+        return pd.NaT
+
+
+def get_closed_dates(date_times: pd.Series) -> pd.Series:
+    """ Converts a series of date/time strings to UTC, dates without a time zone are local times. Dates that can't be
+        read are returned as NaT """
+    try:
+        # pandas reads all the dates using the format of the first date, if it can't work out the format it reads
+        # them one at a time, which is what we'd do anyway
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            closed_dates = pd.to_datetime(date_times, errors='coerce')
+        if not closed_dates.isna().any():
+            if closed_dates.dt.tz is None:
+                closed_dates = closed_dates.dt.tz_localize(tzlocal())
+            return closed_dates.dt.tz_convert(UTC)
+    except ValueError:
+        # dates with mixed time zones
+        pass
+
+    # dates in mixed formats are read one at a time
+    return date_times.map(to_utc)
+
+
 class QATParser:
 
     # Expected columns required to create a bottle object
@@ -27,71 +57,90 @@ class QATParser:
     # Optional columns
     column_rosette_position = 'rosette'
 
-    def _create_bottles(self):
+    def _get_column(self, column: str) -> pd.Series:
+        # QAT values are padded with spaces and dates and times are quoted
+        return self.data_frame[column].astype(str).str.replace("\"", "").str.strip()
 
-        create_bottles = []
-        update_bottles = []
-
-        for idx, data in self.data_frame.iterrows():
-            event_id = data[self.column_event]
-
-            try:
-                event = self.mission.events.get(event_id=event_id, instrument__type=InstrumentType.ctd)
-            except ObjectDoesNotExist as ex:
-                message = _("Could not find matching CTD event for event number") + f" : {event_id}"
-                err = FileError(mission=self.mission, message=message, line=0, type=ErrorType.bottle, file_name=self.file_name)
-                err.save()
-                raise ex
-
-
-            date = data[self.column_date].replace("\"", "")
-            time = data[self.column_time].replace("\"", "")
-
-            if not (latitude := data[self.column_latitude]):
-                latitude = None
-                # raise ValueError(f"Missing Latitude expected in field \"{self.column_latitude}\"")
-
-            if not (longitude := data[self.column_longitude]):
-                longitude = None
-                # raise ValueError(f"Missing Latitude expected in field \"{self.column_longitude}\"")
-
-            if not (bottle_id := data[self.column_sample_id]):
-                raise ValueError(f"Missing Sample ID expected in field \"{self.column_sample_id}\"")
-
-            if not (pressure := data[self.column_pressure]):
-                raise ValueError(f"Missing Pressure expected in field \"{self.column_pressure}\"")
-
-            # Combine date and time into a datetime object
-            try:
-                closed = parse(f"{date} {time}").astimezone(UTC)
-            except ValueError as e:
-                message = _("Invalid date or time format for event number") + f" : {event_id}"
-                err = FileError(mission=self.mission, message=message, line=0, type=ErrorType.bottle,
-                                file_name=self.file_name)
-                err.save()
-                raise e
-
-            bottle = event.bottles.filter(event=event, bottle_id=bottle_id)
-            if bottle.exists():
-                bottle = bottle.first()
-                update_bottles.append(bottle)
-            else:
+    def _create_bottles(self):
+        event_column = self._get_column(self.column_event)
+        event_ids = pd.to_numeric(event_column, errors='coerce')
+
+        # Prefetch the mission's CTD events, the bottles that already exist for them are fetched once the file has
+        # been validated
+        events = {}
+        for event in self.mission.events.filter(event_id__in=event_ids.dropna().unique().tolist(),
+                                                instrument__type=InstrumentType.ctd):
+            events.setdefault(event.event_id, event)
+
+        errors = []
+        missing_events = event_column[~event_ids.isin(list(events.keys()))].unique().tolist()
+        for event_id in missing_events:
+            message = _("Could not find matching CTD event for event number") + f" : {event_id}"
+            errors.append(FileError(mission=self.mission, message=message, line=0, type=ErrorType.bottle,
+                                    file_name=self.file_name))
+
+        if errors:
+            FileError.objects.bulk_create(errors)
+            raise Event.DoesNotExist(errors[0].message)
+
+        latitudes = self._get_column(self.column_latitude)
+        longitudes = self._get_column(self.column_longitude)
+        bottle_ids = self._get_column(self.column_sample_id)
+        pressures = self._get_column(self.column_pressure)
+
+        if (bottle_ids == '').any():
+            raise ValueError(f"Missing Sample ID expected in field \"{self.column_sample_id}\"")
+
+        if (pressures == '').any():
+            raise ValueError(f"Missing Pressure expected in field \"{self.column_pressure}\"")
+
+        # Combine date and time into a datetime object
+        closed_dates = get_closed_dates(self._get_column(self.column_date) + " " + self._get_column(self.column_time))
+        for event_id in event_ids[closed_dates.isna()].unique():
+            message = _("Invalid date or time format for event number") + f" : {int(event_id)}"
+            errors.append(FileError(mission=self.mission, message=message, line=0, type=ErrorType.bottle,
+                                    file_name=self.file_name))
+
+        if errors:
+            FileError.objects.bulk_create(errors)
+            raise ValueError(_("Invalid date or time format for event number"))
+
+        bottle_ids = bottle_ids.astype(int)
+        existing_bottles = {}
+        for bottle in Bottle.objects.filter(event__in=events.values(), bottle_id__in=bottle_ids.unique().tolist()):
+            existing_bottles.setdefault((bottle.event_id, bottle.bottle_id), bottle)
+
+        rosette_positions = None
+        if self.column_rosette_position in self.data_frame.columns:
+            rosette_positions = self._get_column(self.column_rosette_position).tolist()
+
+        create_bottles = {}
+        update_bottles = {}
+        rows = zip(event_ids.astype(int).tolist(), bottle_ids.tolist(), closed_dates.tolist(), pressures.tolist(),
+                   latitudes.tolist(), longitudes.tolist())
+        for row, (event_id, bottle_id, closed, pressure, latitude, longitude) in enumerate(rows):
+            event = events[event_id]
+            key = (event.pk, bottle_id)
+            if (bottle := existing_bottles.get(key, None)) is not None:
+                update_bottles[key] = bottle
+            elif (bottle := create_bottles.get(key, None)) is None:
                 bottle = Bottle(event=event, bottle_id=bottle_id)
-                create_bottles.append(bottle)
+                create_bottles[key] = bottle
 
             bottle.closed = closed
             bottle.pressure = pressure
-            bottle.latitude = latitude
-            bottle.longitude = longitude
+            bottle.latitude = latitude if latitude else None
+            bottle.longitude = longitude if longitude else None
 
-            if self.column_rosette_position in data:
-                bottle.bottle_number = data[self.column_rosette_position]
+            if rosette_positions is not None:
+                bottle.bottle_number = rosette_positions[row] if rosette_positions[row] else None
 
         if len(create_bottles) > 0:
-            Bottle.objects.bulk_create(create_bottles)
+            Bottle.objects.bulk_create(create_bottles.values())
 
         if len(update_bottles) > 0:
-            Bottle.objects.bulk_update(update_bottles, ['closed', 'pressure', 'latitude', 'longitude', 'bottle_number'])
+            Bottle.objects.bulk_update(update_bottles.values(), ['closed', 'pressure', 'latitude', 'longitude',
+                                                                 'bottle_number'])
 
     def parse(self):
         self.data_frame = pd.read_csv(self.file, na_filter=False)
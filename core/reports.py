@@ -5,7 +5,7 @@ import numpy as np
 from datetime import datetime, timedelta
 
 from django.core.files.base import ContentFile
-from django.db.models import Min, Avg
+from django.db.models import Avg
 from django.http import HttpResponse
 from django.urls import path
 
@@ -132,18 +132,15 @@ def elog(request, mission_id):
     header = ['Mission', 'Event', 'Station', 'Instrument', 'AVG_SOUNDING', 'Min_Lat', 'Min_Lon', 'Max_Lat', 'Max_Lon',
               'SDATE', 'STIME', 'EDATE', 'ETIME', 'DURATION', 'ELAPSED_TIME', 'COMMENTS']
 
-    events = mission.events.annotate(start=Min("actions__date_time")).order_by('start')
+    events = mission.events.with_summary().select_related('station', 'instrument').order_by('summary_start_date_time')
 
     data = ",".join(header) + "\n"
     last_event = None
     for event in events:
         row = [mission.name, event.event_id, event.station.name, event.instrument.name]
 
-        sounding = event.actions.all().exclude(sounding=None).values_list('sounding', flat=True)
-        avg_sounding = ''
-        if None not in sounding:
-            avg_sounding = np.average(sounding)
-        avg_sounding = '' if np.isnan(avg_sounding) or avg_sounding == '' else avg_sounding
+        sounding = [action.sounding for action in event.actions.all() if action.sounding is not None]
+        avg_sounding = np.average(sounding) if sounding else ''
         row.append(avg_sounding)
 
         slocation = event.start_location
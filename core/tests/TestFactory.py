@@ -1,4 +1,10 @@
+import datetime
+from decimal import Decimal
+
+import numpy as np
+
 from django.test import tag
+from django.utils import timezone
 
 from core import models
 
@@ -30,3 +36,138 @@ class TestCTDEvent(DartTestCase):
         self.assertIsNotNone(event.end_sample_id)
 
         self.assertGreater(event.end_sample_id, event.sample_id)
+
+
+@tag("model", "model_event_summary")
+class TestEventSummary(DartTestCase):
+
+    summary_properties = ['start_location', 'end_location', 'start_date', 'end_date', 'drift_distance', 'drift_time',
+                          'comments', 'files']
+
+    def setUp(self):
+        self.mission = core_factory.MissionFactory()
+        for event_id in range(1, 6):
+            event = core_factory.CTDEventFactory(mission=self.mission, event_id=event_id)
+            event.actions.update(comment=f"event {event_id}", file="test.log")
+
+        # a bottom action without a sounding falls back to the recovered action
+        event = core_factory.CTDEventFactory(mission=self.mission, event_id=6)
+        event.actions.filter(type=models.ActionType.bottom).update(sounding=None)
+
+        core_factory.ActionFactory(event=core_factory.CTDEventFactoryBlank(mission=self.mission, event_id=7))
+        core_factory.CTDEventFactoryBlank(mission=self.mission, event_id=8)
+
+    def test_with_summary(self):
+        for event in self.mission.events.with_summary():
+            expected = models.Event.objects.get(pk=event.pk)
+            for summary_property in self.summary_properties:
+                self.assertEqual(getattr(event, summary_property), getattr(expected, summary_property),
+                                 f"{summary_property} for event {event.event_id}")
+
+            if event.event_id < 7:
+                self.assertEqual(event.sounding_action, expected.sounding_action)
+
+    def test_with_summary_queries(self):
+        # the events, their actions and nothing else for each event
+        with self.assertNumQueries(2):
+            for event in self.mission.events.with_summary():
+                for summary_property in self.summary_properties:
+                    getattr(event, summary_property)
+
+                if event.event_id < 7:
+                    self.assertNotEqual(event.sounding_action.type, models.ActionType.deployed)
+
+    def test_no_actions(self):
+        event = self.mission.events.with_summary().get(event_id=8)
+
+        self.assertIsNone(event.start_location)
+        self.assertIsNone(event.end_date)
+        self.assertEqual(event.drift_distance, "")
+        self.assertEqual(event.drift_time, "")
+        with self.assertRaises(ValueError):
+            event.sounding_action
+
+
+@tag("model", "model_bottle_volume")
+class TestBottleVolume(DartTestCase):
+
+    def setUp(self):
+        self.mission = core_factory.MissionFactory()
+
+    def create_net_bottle(self, gear_type=90000102, volume=None, flow_start=None, flow_end=None, wire_out=None):
+        event = core_factory.NetEventFactory(mission=self.mission, flow_start=flow_start, flow_end=flow_end,
+                                             wire_out=wire_out)
+        return core_factory.BottleFactory(event=event, gear_type_id=gear_type, volume=volume)
+
+    def test_computed_volume(self):
+        area = np.pi * np.power(0.75 / 2, 2)
+        small_area = np.pi * np.power(0.5 / 2, 2)
+
+        bottles = [
+            (self.create_net_bottle(volume=12.5, flow_start=100, flow_end=200), [90000001, 12.5]),
+            (self.create_net_bottle(flow_start=1000, flow_end=2000),
+             [90000002, np.round(1000 * 0.3 * area, 1)]),
+            # the flowmeter rolled over from 99,000 to 500
+            (self.create_net_bottle(gear_type=90000105, flow_start=99000, flow_end=500),
+             [90000002, np.round(1500 * 0.3 * small_area, 1)]),
+            (self.create_net_bottle(flow_start=1000, wire_out=150), [90000004, np.round(150 * area, 1)]),
+            (self.create_net_bottle(gear_type=90000002, wire_out=150), [90000010, None]),
+            (self.create_net_bottle(), [90000010, None]),
+        ]
+
+        for bottle, expected in bottles:
+            self.assertEqual(bottle.computed_volume, expected)
+
+        with self.assertNumQueries(1):
+            volumes = models.get_computed_volumes(models.Bottle.objects.filter(event__mission=self.mission))
+
+        self.assertEqual(volumes, {bottle.pk: expected for bottle, expected in bottles})
+
+
+@tag("model", "model_action_drift")
+class TestActionDrift(DartTestCase):
+
+    def setUp(self):
+        self.event = core_factory.CTDEventFactoryBlank()
+        date_time = timezone.now()
+        for minutes in range(0, 300, 15):
+            core_factory.ActionFactory(event=self.event, date_time=date_time + datetime.timedelta(minutes=minutes))
+
+        # another event's actions are in the same table but not part of this event's drift
+        core_factory.CTDEventFactory()
+
+    def test_with_drift(self):
+        expected = {action.pk: (action.drift_time, action.drift_distance) for action in models.Action.objects.all()}
+
+        with self.assertNumQueries(1):
+            drift = {action.pk: (action.drift_time, action.drift_distance)
+                     for action in models.Action.objects.with_drift()}
+
+        self.assertEqual(drift, expected)
+
+        first_action = self.event.actions.with_drift().first()
+        self.assertEqual(first_action.drift_time, 0)
+        self.assertEqual(first_action.drift_distance, "")
+
+    def test_with_drift_same_time(self):
+        # an action at the same time as the action before it drifts from that action, with or without with_drift()
+        last_action = self.event.actions.order_by('date_time', 'pk').last()
+        action = core_factory.ActionFactory(event=self.event, date_time=last_action.date_time,
+                                            latitude=last_action.latitude + Decimal('0.1'), longitude=last_action.longitude)
+
+        # the previous action has to be in the queryset, so the event's actions are annotated, not just this one
+        drift = next(drift for drift in self.event.actions.with_drift() if drift.pk == action.pk)
+        self.assertEqual(action.drift_time, datetime.timedelta(0))
+        self.assertEqual(drift.drift_time, action.drift_time)
+        self.assertGreater(action.drift_distance, 0)
+        self.assertEqual(drift.drift_distance, action.drift_distance)
+
+    def test_event_summary_actions(self):
+        # an event's action table, event totals and action drift, from two queries
+        with self.assertNumQueries(2):
+            event = models.Event.objects.with_summary().get(pk=self.event.pk)
+            for action in event.actions.all():
+                action.drift_time
+                action.drift_distance
+
+            self.assertEqual(event.drift_time, datetime.timedelta(minutes=285))
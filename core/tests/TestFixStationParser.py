@@ -1,13 +1,16 @@
 import datetime
 import io
 import os
+import shutil
+import tempfile
 
+import ctd
 import pytz
 from django.test import tag
 from django.conf import settings
 from django.utils.translation import gettext as _
 
-from core.parsers.sensor import btl_ros
+from core.parsers.sensor import btl_ros, btl_reader
 from core.parsers.sensor.btl_ros import FixStationParser
 
 from core.tests import CoreFactoryFloor as core_factory
@@ -40,6 +43,45 @@ class TestFixStationParser(DartTestCase):
         parser = FixStationParser(self.event, self.btn_filename, self.btl_data, self.ros_data)
         parser.parse()
 
+    def test_process_queries(self):
+        # bottles, samples and values are looked up from maps loaded once per event so the number of queries
+        # doesn't depend on the number of bottles or sensors in the file
+        FixStationParser(self.event, self.btn_filename, self.btl_data, self.ros_data).parse()
+
+        self.btl_data.seek(0)
+        data = ctd.read.from_btl(self.btl_data)
+        column_headers = FixStationParser.get_column_headers(data)
+        parser = FixStationParser(self.event, self.btn_filename, None, None, data=data)
+
+        # existing bottles and the conflicting bottles from other events
+        with self.assertNumQueries(2):
+            parser.process_bottles(data)
+
+        # bottles, samples and values, nothing has changed so there's nothing to update
+        with self.assertNumQueries(3):
+            parser.process_data(self.btn_filename, data, column_headers)
+
+        # a changed value is updated in one query
+        value = core_models.DiscreteSampleValue.objects.filter(sample__bottle__event=self.event).first()
+        value.value = -1
+        value.save()
+        with self.assertNumQueries(4):
+            parser.process_data(self.btn_filename, data, column_headers)
+
+        value.refresh_from_db()
+        self.assertNotEqual(-1, value.value)
+
+    def test_bottle_conflict(self):
+        # a bottle in the file with the same ID as a bottle from another CTD event should raise a KeyError
+        other_event = core_factory.CTDEventFactoryBlank(mission=self.mission, event_id=2, station=self.station)
+        core_factory.BottleFactory(event=other_event, bottle_id=500853)
+
+        parser = FixStationParser(self.event, self.btn_filename, self.btl_data, self.ros_data)
+        with self.assertRaises(KeyError):
+            parser.parse()
+
+        self.assertEqual(0, self.event.bottles.count())
+
     def test_errors(self):
         # if errors exist for a file they should be removed the next time a file of the same name is parsed
         core_models.FileError(mission=self.event.mission, file_name=self.btn_filename, line=0, message=_("test"),
@@ -170,3 +212,148 @@ class TestFixStationParser(DartTestCase):
             btl_ros.validate_fixed_station_file(btl_data)
 
         self.assertEqual(str(context.exception), "Longitude is missing from the header. Cannot create event")
+
+
+@tag('parsers', 'parsers_fixstation', 'parsers_fixstation_bulk')
+class TestFixStationBulkParser(DartTestCase):
+
+    def setUp(self):
+        self.sample_dir = os.path.join(settings.BASE_DIR, 'core', 'tests', 'sample_data', 'fixed_stations')
+        self.mission = core_factory.MissionFactory(fixed_station=True)
+
+    def get_files(self, *file_names):
+        return [os.path.join(self.sample_dir, file_name) for file_name in file_names]
+
+    def test_read_btl_file(self):
+        # BTL files should be read into a plain dataframe and header dictionary with the ROS sensor configuration
+        btl_file = btl_reader.read_btl_file(self.get_files('25667001.btl')[0])
+
+        self.assertIsNone(btl_file['error'])
+        self.assertEqual(btl_file['properties']['EVENT_NUMBER'], '001')
+        self.assertTrue(btl_file['ros_file'].endswith('25667001.ros'))
+        self.assertIsNotNone(btl_file['ros_config'])
+        self.assertIn('header', btl_reader.get_btl_dataframe(btl_file)._metadata)
+
+    def test_btl_file_cache(self):
+        # a BTL file should only be read again if it's changed since it was last read
+        btl_file = self.get_files('25667001.btl')[0]
+        first = btl_reader.get_btl_file(btl_file)
+        self.assertIs(first, btl_reader.get_btl_file(btl_file))
+        self.assertIs(first, next(btl_reader.read_btl_files([btl_file])))
+
+        stat = os.stat(btl_file)
+        os.utime(btl_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        try:
+            self.assertIsNot(first, btl_reader.get_btl_file(btl_file))
+        finally:
+            os.utime(btl_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    def test_parse_files_in_parallel(self):
+        # files read in worker processes should create the same events, bottles and errors as reading them one
+        # at a time
+        files = self.get_files('25667001.btl', '25667001_missing_station_name.btl')
+        parser = btl_ros.FixStationBulkParser(self.mission, files, max_workers=2)
+        parser.parse()
+
+        event = self.mission.events.get(event_id=1, instrument__type=core_models.InstrumentType.ctd)
+        self.assertEqual(4, event.bottles.count())
+        self.assertTrue(event.files.filter(file_type__name='BTL', file_name='25667001.btl').exists())
+
+        errors = core_models.FileError.objects.filter(mission=self.mission)
+        self.assertEqual(1, errors.count())
+        self.assertEqual('25667001_missing_station_name.btl', errors.first().file_name)
+        self.assertEqual(104, errors.first().code)
+
+        # loading the files again in one process shouldn't duplicate anything
+        btl_ros.FixStationBulkParser(self.mission, files, max_workers=1).parse()
+        self.assertEqual(4, event.bottles.count())
+        self.assertEqual(1, core_models.FileError.objects.filter(mission=self.mission).count())
+
+    def test_sync_bottle_directory(self):
+        # only new and changed files should be parsed when a bottle directory is synchronized, bottles for files
+        # that were removed from the directory should be deleted
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for file in self.get_files('25667001.btl', '25667001.ros'):
+            shutil.copy2(file, directory)
+
+        counts = btl_ros.sync_bottle_directory(self.mission, directory, max_workers=1)
+        self.assertEqual({'new': 1, 'changed': 0, 'unchanged': 0, 'removed': 0}, counts)
+        self.assertEqual(directory, self.mission.bottle_directory)
+
+        event = self.mission.events.get(event_id=1, instrument__type=core_models.InstrumentType.ctd)
+        self.assertEqual(4, event.bottles.count())
+        btl_event_file = event.files.get(file_type__name='BTL')
+        self.assertEqual(os.path.getsize(os.path.join(directory, '25667001.btl')), btl_event_file.file_size)
+        self.assertIsNotNone(btl_event_file.file_hash)
+        self.assertTrue(event.files.filter(file_type__name='ROS', file_name='25667001.ros').exists())
+
+        # nothing has changed, nothing should be parsed
+        counts = btl_ros.sync_bottle_directory(self.mission, max_workers=1)
+        self.assertEqual({'new': 0, 'changed': 0, 'unchanged': 1, 'removed': 0}, counts)
+
+        # a file that was touched, but has the same content, is unchanged and its new modified time is kept
+        btl_file = os.path.join(directory, '25667001.btl')
+        os.utime(btl_file, (os.stat(btl_file).st_atime, os.stat(btl_file).st_mtime + 10))
+        counts = btl_ros.sync_bottle_directory(self.mission, max_workers=1)
+        self.assertEqual(1, counts['unchanged'])
+        btl_event_file.refresh_from_db()
+        self.assertEqual(os.stat(btl_file).st_mtime, btl_event_file.file_modified)
+
+        # a changed ROS file means the BTL file has to be parsed again
+        with open(os.path.join(directory, '25667001.ros'), 'a') as ros:
+            ros.write('\n')
+        counts = btl_ros.sync_bottle_directory(self.mission, max_workers=1)
+        self.assertEqual({'new': 0, 'changed': 1, 'unchanged': 0, 'removed': 0}, counts)
+        self.assertEqual(4, event.bottles.count())
+
+        os.remove(btl_file)
+        counts = btl_ros.sync_bottle_directory(self.mission, max_workers=1)
+        self.assertEqual({'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 1}, counts)
+        self.assertEqual(0, event.bottles.count())
+        self.assertFalse(event.files.filter(file_type__name__in=['BTL', 'ROS']).exists())
+
+    def test_sync_bottle_directory_removed_ros(self):
+        # a ROS file that was loaded, but has since been removed, means the BTL file has to be parsed again
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for file in self.get_files('25667001.btl', '25667001.ros'):
+            shutil.copy2(file, directory)
+
+        btl_ros.sync_bottle_directory(self.mission, directory, max_workers=1)
+
+        os.remove(os.path.join(directory, '25667001.ros'))
+        counts = btl_ros.sync_bottle_directory(self.mission, max_workers=1)
+        self.assertEqual({'new': 0, 'changed': 1, 'unchanged': 0, 'removed': 0}, counts)
+
+        event = self.mission.events.get(event_id=1, instrument__type=core_models.InstrumentType.ctd)
+        self.assertFalse(event.files.filter(file_type__name='ROS').exists())
+
+        counts = btl_ros.sync_bottle_directory(self.mission, max_workers=1)
+        self.assertEqual({'new': 0, 'changed': 0, 'unchanged': 1, 'removed': 0}, counts)
+
+    def test_sync_bottle_directory_removed_keeps_samples(self):
+        # removing a BTL file from the directory removes the sensor data read from it, but bottles with samples
+        # loaded from other files are kept
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for file in self.get_files('25667001.btl', '25667001.ros'):
+            shutil.copy2(file, directory)
+
+        btl_ros.sync_bottle_directory(self.mission, directory, max_workers=1)
+
+        event = self.mission.events.get(event_id=1, instrument__type=core_models.InstrumentType.ctd)
+        bottle = event.bottles.order_by('bottle_id').first()
+        oxygen = core_factory.MissionSampleTypeFactory(mission=self.mission, name='oxy', is_sensor=False)
+        core_factory.DiscreteValueFactory(sample=core_factory.SampleFactory(bottle=bottle, type=oxygen), value=4.5)
+
+        os.remove(os.path.join(directory, '25667001.btl'))
+        counts = btl_ros.sync_bottle_directory(self.mission, max_workers=1)
+        self.assertEqual(1, counts['removed'])
+
+        self.assertEqual([bottle.pk], list(event.bottles.values_list('pk', flat=True)))
+        self.assertEqual([oxygen.pk], list(bottle.samples.values_list('type', flat=True)))
+        self.assertEqual(4.5, bottle.samples.get().discrete_values.get().value)
+
+        errors = core_models.FileError.objects.filter(mission=self.mission, file_name='25667001.btl')
+        self.assertEqual([106], list(errors.values_list('code', flat=True)))
@@ -1,4 +1,5 @@
 import os
+from unittest.mock import patch
 
 import bs4
 from bs4 import BeautifulSoup
@@ -430,6 +431,23 @@ class TestSampleFileConfiguration(DartTestCase):
         alert = message.find('div')
         self.assertEqual(alert.text, "Loading")
 
+    @patch('core.views_mission_sample.time.sleep')
+    @patch('core.views_mission_sample.SampleParser.parse_sample_file', side_effect=ValueError("bad file"))
+    def test_load_samples_post_failed(self, mock_parse_sample_file, mock_sleep):
+        # if the file fails to load the sample types shouldn't be copied to the mission
+        oxy_sample_type_config = settings_factory.SampleTypeConfigFactory(
+            sample_type=settings_factory.GlobalSampleTypeFactory(short_name="oxy", long_name="Oxygen"),
+            tab=0, skip=9, sample_field='sample', value_field='o2_concentration(ml/l)', file_type='xlsx',
+        )
+
+        url = reverse("core:mission_samples_load_samples")
+        with open(self.sample_oxy_xlsx_file, 'rb') as fp:
+            self.client.post(url, {'sample_file': fp, 'mission_id': self.mission.pk,
+                                   'sample_config': [oxy_sample_type_config.pk]})
+
+        mock_parse_sample_file.assert_called_once()
+        self.assertFalse(self.mission.mission_sample_types.filter(name="oxy").exists())
+
     # in the event the user select the 'New Sample Type' option from the sample_type drop down
     # the drop down should be replaced with a SampleTypeForm allowing the user to create a new
     # sample type. Upon saving that form the dropdown should replace the form, with the new
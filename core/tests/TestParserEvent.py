@@ -1,4 +1,5 @@
 import io
+import json
 import os
 import numpy as np
 
@@ -9,7 +10,7 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from core import models as core_models
-from core.parsers.event import elog, andes, event_csv
+from core.parsers.event import elog, elog_reader, andes, andes_reader, event_csv
 from core.tests import CoreFactoryFloor as core_factory
 from core.tests.TestParsers import logger
 
@@ -92,6 +93,86 @@ class TestElogParser(DartTestCase):
         self.assertIsNotNone(event)
         self.assertEqual(len(event.actions.all()), 3)
 
+    @tag('parsers_elog_test_parse_variables')
+    def test_parse_variables(self):
+        # elog values that aren't mapped to required fields should be kept as variables on their actions,
+        # reloading the file should update the variables rather than duplicate them
+        sample_file = SimpleUploadedFile("good.log", open(r'core/tests/sample_data/good.log', mode='rb').read())
+        elog.parse_files(self.mission, [sample_file], variables=elog.VARIABLES_LOAD)
+
+        variables = core_models.VariableField.objects.filter(action__event__mission=self.mission)
+        self.assertTrue(variables.exists())
+        mapped_fields = elog.get_or_create_file_config().values_list('mapped_field', flat=True)
+        self.assertFalse(variables.filter(name__name__in=mapped_fields).exists())
+
+        variable_count = variables.count()
+        sample_file.seek(0)
+        elog.parse_files(self.mission, [sample_file], variables=elog.VARIABLES_LOAD)
+        self.assertEqual(variable_count, variables.count())
+
+    @tag('parsers_elog_test_parse_no_variables')
+    def test_parse_no_variables(self):
+        # variables shouldn't be kept if they're turned off
+        sample_file = SimpleUploadedFile("good.log", open(r'core/tests/sample_data/good.log', mode='rb').read())
+        elog.parse_files(self.mission, [sample_file], variables=elog.VARIABLES_NONE)
+
+        self.assertTrue(core_models.Action.objects.filter(event__mission=self.mission).exists())
+        self.assertFalse(core_models.VariableField.objects.filter(action__event__mission=self.mission).exists())
+
+    @tag('parsers_elog_test_parse_files_in_parallel')
+    def test_parse_files_in_parallel(self):
+        # log files read in worker processes should create the same events and actions as reading them one
+        # at a time
+        sample_file_1 = SimpleUploadedFile("251001a.log", open(r'core/tests/sample_data/251001a.log', mode='rb').read())
+        sample_file_2 = SimpleUploadedFile("251002a.log", open(r'core/tests/sample_data/251002a.log', mode='rb').read())
+
+        elog.parse_files(self.mission, [sample_file_1, sample_file_2], max_workers=2)
+
+        event = self.mission.events.get(event_id=35)
+        self.assertEqual(len(event.actions.all()), 3)
+        self.assertEqual(2, len(set(core_models.Action.objects.filter(
+            event__mission=self.mission).values_list('file', flat=True))))
+
+    @tag('parsers_elog_test_read_mids')
+    def test_read_mids(self):
+        # windows line endings shouldn't change the message objects read from a log file
+        data = open(r'core/tests/sample_data/good.log', mode='r').read()
+        fields = elog.get_configuration_fields(elog.get_or_create_file_config())
+
+        unix = elog_reader.read_message_objects('good.log', io.StringIO(data), fields)
+        windows = elog_reader.read_message_objects('good.log', io.StringIO(data.replace('\n', '\r\n'), newline='\n'),
+                                                   fields)
+        self.assertEqual(9, len(unix[elog.ParserType.MID]))
+        self.assertEqual(unix[elog.ParserType.MID], windows[elog.ParserType.MID])
+
+    @tag('parsers_elog_test_reload_unchanged_mids')
+    def test_reload_unchanged_mids(self):
+        # message objects that haven't changed since the elog was loaded shouldn't be processed again when the elog
+        # is reloaded, events with an edited message object should be
+        data = open(r'core/tests/sample_data/good.log', mode='rb').read()
+        elog.parse_files(self.mission, [SimpleUploadedFile("good.log", data)])
+
+        actions = core_models.Action.objects.filter(event__mission=self.mission)
+        action_count = actions.count()
+        self.assertFalse(actions.filter(mid_hash__isnull=True).exists())
+
+        message_objects = elog.parse("good.log", io.StringIO(data.decode('utf-8')))
+        mid_count = len(message_objects[elog.ParserType.MID])
+        self.assertEqual(mid_count, elog.skip_unchanged_mids(self.mission, message_objects))
+        self.assertEqual(0, len(message_objects[elog.ParserType.MID]))
+
+        # edit the comment of the first message object, only messages for its event should be processed
+        edited = data.decode('utf-8').replace('Comment: \n', 'Comment: edited\n', 1)
+        message_objects = elog.parse("good.log", io.StringIO(edited))
+        skipped = elog.skip_unchanged_mids(self.mission, message_objects)
+        self.assertLess(skipped, mid_count)
+        self.assertEqual(mid_count, skipped + len(message_objects[elog.ParserType.MID]))
+        self.assertIn('1', message_objects[elog.ParserType.MID])
+
+        elog.parse_files(self.mission, [SimpleUploadedFile("good.log", edited.encode('utf-8'))])
+        self.assertEqual(action_count, actions.count())
+        self.assertEqual('edited', actions.get(mid=1).comment)
+
     @tag('parsers_elog_test_parse_elog')
     def test_parse_elog(self):
         logger.info("Running test_parse_elog")
@@ -164,6 +245,23 @@ class TestElogParser(DartTestCase):
 
         sample_file_pointer.close()
 
+    @tag('parsers_elog_test_file_config_snapshot')
+    def test_file_config_snapshot(self):
+        # mapped fields should come from the configuration snapshot without querying the database, until
+        # a configuration is changed
+        elog.get_mapped_fields()
+        with self.assertNumQueries(0):
+            mapped_fields = elog.get_mapped_fields()
+        self.assertEqual('Station', mapped_fields['station'])
+
+        mapping = settings_models.FileConfiguration.objects.get(file_type='elog', required_field='station')
+        mapping.mapped_field = 'Stn'
+        mapping.save()
+        self.assertEqual('Stn', elog.get_mapped_fields()['station'])
+
+        mapping.delete()
+        self.assertEqual('Station', elog.get_mapped_fields()['station'])
+
     @tag('parsers_elog_validate_message_object')
     def test_validate_message_object(self):
         elog_config = elog.get_or_create_file_config()
@@ -457,6 +555,42 @@ class TestAndesParser(DartTestCase):
         instruments = core_models.Instrument.objects.all()
         self.assertEqual(5, instruments.count())  # the test file has 5 instruments in it
 
+    @tag('andes_parser_test_read_report')
+    def test_read_report(self):
+        # reading the report a few characters at a time should give the same mission as loading the whole document
+        with open(self.test_file, 'rb') as f:
+            expected = json.load(f)['mission']
+            f.seek(0)
+
+            mission = {}
+            for key, value in andes_reader.read_report(f, chunk_size=7):
+                if key in ('instruments', 'samples'):
+                    mission.setdefault(key, []).append(value)
+                else:
+                    mission[key] = value
+
+        self.assertEqual(expected, mission)
+
+    @tag('andes_parser_test_reload_report')
+    def test_reload_report(self):
+        # loading a report from an uploaded (binary) file twice should update events rather than duplicate them
+        with open(self.test_file, 'rb') as f:
+            andes.parse(self.mission, self.test_file_name, f)
+
+        event_count = self.mission.events.count()
+        action_count = core_models.Action.objects.filter(event__mission=self.mission).count()
+        attachment_count = core_models.Attachment.objects.filter(event__mission=self.mission).count()
+        self.assertGreater(event_count, 0)
+        self.assertGreater(action_count, event_count)
+
+        with open(self.test_file, 'rb') as f:
+            andes.parse(self.mission, self.test_file_name, f)
+
+        self.assertEqual(event_count, self.mission.events.count())
+        self.assertEqual(action_count, core_models.Action.objects.filter(event__mission=self.mission).count())
+        self.assertEqual(attachment_count,
+                         core_models.Attachment.objects.filter(event__mission=self.mission).count())
+
     @tag('andes_parser_test_andeis_parser_instruments')
     def test_andeis_parser_instruments(self):
         instruments = [
@@ -779,4 +913,39 @@ class TestCSVParser(DartTestCase):
         event_csv.process_instruments([('Blue molly', 'ctd'), ('Ring net', 'NET')])
 
         # Check that no new instruments were created (get_or_create should find existing ones)
-        self.assertEqual(core_models.Instrument.objects.count(), 4)
\ No newline at end of file
+        self.assertEqual(core_models.Instrument.objects.count(), 4)
+
+    @tag('csv_parser_test_reload_file')
+    def test_reload_file(self):
+        # loading the same file twice should update existing events and replace their actions, not duplicate them
+        with open(self.test_file, 'r') as f:
+            event_csv.parse(self.mission, self.test_file_name, f)
+
+        event_count = core_models.Event.objects.filter(mission=self.mission).count()
+        action_count = core_models.Action.objects.filter(event__mission=self.mission).count()
+        self.assertGreater(event_count, 0)
+        self.assertGreater(action_count, event_count)
+
+        with open(self.test_file, 'r') as f:
+            with self.assertNumQueries(18):
+                event_csv.parse(self.mission, self.test_file_name, f)
+
+        self.assertEqual(event_count, core_models.Event.objects.filter(mission=self.mission).count())
+        self.assertEqual(action_count, core_models.Action.objects.filter(event__mission=self.mission).count())
+
+    @tag('csv_parser_test_missing_date')
+    def test_missing_date(self):
+        # actions with a date that can't be read should be reported and skipped
+        csv_content = """event_id,station,instrument_name,instrument_type,starting_id,ending_id,flow_deploy,flow_recover,wire_out,wire_angle,ACTION,DATE_TIME,LATITUDE,LONGITUDE,SOUNDING,COMMENT,DATA_COLLECTOR
+1,TEST1,SBE911,CTD,1,24,,,100,2,DEPLOYED,2024-05-01 10:15:30,44.25678,-63.45678,150.5,,John Smith
+1,TEST1,SBE911,CTD,1,24,,,100,2,RECOVERED,not a date,44.25683,-63.45685,151.0,,John Smith
+"""
+        event_csv.parse(self.mission, self.test_file_name, io.StringIO(csv_content))
+
+        event = core_models.Event.objects.get(mission=self.mission, event_id=1)
+        self.assertEqual(1, event.actions.count())
+        self.assertEqual(core_models.ActionType.deployed, event.actions.first().type)
+
+        errors = core_models.FileError.objects.filter(mission=self.mission, file_name=self.test_file_name)
+        self.assertEqual(1, errors.count())
+        self.assertEqual(201, errors.first().code)
@@ -1,16 +1,26 @@
 import os
+import shutil
+import tempfile
+import time
+
+from io import BytesIO
 
 import numpy as np
 import pandas as pd
 import ctd
 
 from datetime import datetime
+from unittest.mock import patch
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
 
 from django.test import tag
 
 import bio_tables.models
-from config.tests.DartTestCase import DartTestCase
+from bio_tables.taxon_index import get_taxon_index
+from config.tests.DartTestCase import DartTestCase, benchmark
 from config import settings
 
 from core import models as core_models
@@ -25,6 +35,49 @@ import logging
 logger = logging.getLogger('dart.test')
 
 
+def _reference_split_sample(dataframe: pd.DataFrame, file_settings: settings_models.SampleTypeConfig):
+    # the original row by row implementation of SampleParser.split_sample, kept to test the vectorized version against
+    def _split_function(x):
+        if isinstance(x, str):
+            try:
+                s_id, r_id = str(x).split("_") if '_' in str(x) else [x, np.nan]
+            except ValueError as ex:
+                raise ValueError("Badly formatted sample id" + f": {x}")
+        else:
+            s_id, r_id = [x, np.nan] if not pd.isna(x) else [np.nan, np.nan]
+
+        if not pd.isna(s_id):
+            try:
+                int(s_id)
+            except ValueError:
+                s_id = 'N/A'
+
+        return s_id, r_id
+
+    sid, rid = 'sid', 'rid'
+    if not file_settings.allow_blank:
+        dataframe = dataframe[dataframe[file_settings.sample_field].notna()]
+
+    dataframe[[sid, rid]] = dataframe[file_settings.sample_field].apply(
+        lambda x: pd.Series(_split_function(x))
+    )
+
+    if dataframe[sid].isnull().values.any():
+        dataframe[sid] = dataframe[sid].ffill()
+
+    dataframe = dataframe[dataframe["sid"] != "N/A"]
+    dataframe = dataframe.dropna(subset=[file_settings.value_field])
+
+    if dataframe[rid].isnull().values.any():
+        tmp = dataframe[[sid, rid]].groupby(sid, group_keys=True).apply(
+            lambda x: pd.Series((np.arange(len(x)) + 1), x.index)
+        )
+        dataframe[rid] = tmp.sort_index(level=1).values
+
+    dataframe[[sid, rid]] = dataframe[[sid, rid]].apply(pd.to_numeric)
+    return dataframe
+
+
 @tag('parsers', 'parsers_plankton', 'parsers_plankton_phyto')
 class TestPhytoplanktonParser(DartTestCase):
 
@@ -160,6 +213,25 @@ class TestZooplanktonParser(DartTestCase):
         samples = core_models.PlanktonSample.objects.filter(bottle__bottle_id=488275)
         self.assertEqual(len(samples), 28)
 
+    @tag('parsers_plankton_zoo_test_parser_queries')
+    def test_parser_queries(self):
+        # reference tables, bottles and plankton samples are loaded once per file so the number of queries used
+        # to load a file shouldn't depend on the number of rows in it. The first load creates the file configuration.
+        query_counts = []
+        for dataframe in [self.dataframe.head(1), self.dataframe.head(5), self.dataframe]:
+            core_models.Bottle.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                PlanktonParser.parse_zooplankton(self.mission, self.file_name, dataframe.copy())
+            query_counts.append(len(queries.captured_queries))
+
+        self.assertEqual(query_counts[1], query_counts[2])
+
+        # reloading the file updates the existing samples
+        with CaptureQueriesContext(connection) as queries:
+            PlanktonParser.parse_zooplankton(self.mission, self.file_name, self.dataframe.copy())
+        self.assertLessEqual(len(queries.captured_queries), query_counts[2] + 2)
+        self.assertEqual(28, core_models.PlanktonSample.objects.filter(bottle__bottle_id=488275).count())
+
     def test_get_min_sieve(self):
         self.assertEqual(PlanktonParser.get_min_sieve(proc_code=21, mesh_size=202), 10)
 
@@ -197,6 +269,92 @@ class TestZooplanktonParser(DartTestCase):
         self.assertEqual(gear_type.pk, 90000105)
 
 
+@tag('parsers', 'parsers_plankton', 'parsers_plankton_taxon_index')
+class TestTaxonIndex(DartTestCase):
+
+    def test_lookups(self):
+        taxon_index = get_taxon_index()
+
+        taxa = taxon_index.get(90000000000058)
+        self.assertEqual(taxa.taxonomic_name, 'Calanus finmarchicus')
+        self.assertEqual(taxon_index.get_by_tsn(85272), [taxa])
+        self.assertEqual(taxon_index.get_by_aphiaid(104464), [taxa])
+        self.assertEqual(taxon_index.get_by_name(' calanus  FINMARCHICUS'), [taxa])
+
+        # taxa sharing an aphia id are narrowed down by name
+        self.assertEqual(len(taxon_index.get_by_aphiaid(104152)), 5)
+        self.assertEqual(taxon_index.get_by_aphiaid(104152, 'calanus finmarchicus/c. glacialis'),
+                         [taxon_index.get(90000000000810)])
+
+        # the index is built once and reused
+        with self.assertNumQueries(0):
+            self.assertIs(get_taxon_index(), taxon_index)
+
+    def test_find_similar(self):
+        taxon_index = get_taxon_index()
+
+        self.assertEqual(taxon_index.find_similar('Calanus finmarchicas'), ['calanus finmarchicus'])
+        self.assertEqual(taxon_index.find_similar('Calanus'), ['calanus'])
+        self.assertEqual(taxon_index.find_similar('not a taxonomic name'), [])
+
+        self.assertIsNone(taxon_index.resolve(name='Calanus finmarchicas'))
+        self.assertEqual(taxon_index.resolve(name='Calanus finmarchicas', fuzzy=True).pk, 90000000000058)
+
+    def test_get_taxonomic_code_suggestion(self):
+        with self.assertRaisesMessage(ValueError, 'did you mean calanus finmarchicus'):
+            PlanktonParser.get_taxonomic_code(0, 'Calanus finmarchicas')
+
+    def test_invalidated_on_save(self):
+        taxon_index = get_taxon_index()
+        self.assertEqual(taxon_index.get_by_name('Calanus newtaxa'), [])
+
+        taxa = bio_tables.models.BCNatnlTaxonCode.objects.get(pk=90000000000058)
+        taxa.pk = 90000000009999
+        taxa.taxonomic_name = 'Calanus newtaxa'
+        taxa.save()
+
+        self.assertIsNot(get_taxon_index(), taxon_index)
+        self.assertEqual(get_taxon_index().get_by_name('Calanus newtaxa'), [taxa])
+
+
+    def test_mission_database(self):
+        # taxa are read from the connected mission database, not the local database
+        taxon_index = get_taxon_index()
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        def disconnect():
+            if 'mission_db' in settings.DATABASES:
+                connections['mission_db'].close()
+                del connections['mission_db']
+                settings.DATABASES.pop('mission_db')
+
+        settings.DATABASES['mission_db'] = settings.DATABASES['default'].copy()
+        settings.DATABASES['mission_db']['NAME'] = os.path.join(directory, 'mission_db.sqlite3')
+        self.addCleanup(disconnect)
+        # connect directly, the test case doesn't allow connections to databases added after the test started
+        connections['mission_db'].connect()
+        call_command('migrate', database='mission_db', app_label='bio_tables', verbosity=0)
+
+        taxa = bio_tables.models.BCNatnlTaxonCode.objects.using('default').select_related('data_center_code').get(
+            pk=90000000000058)
+        taxa.data_center_code.save(using='mission_db')
+        taxa.pk = 90000000009999
+        taxa.taxonomic_name = 'Calanus missiontaxa'
+        taxa.save(using='mission_db')
+
+        mission_index = get_taxon_index()
+        self.assertIsNot(mission_index, taxon_index)
+        self.assertEqual(mission_index.get_by_name('Calanus missiontaxa'), [taxa])
+        self.assertIsNone(mission_index.get(90000000000058))
+        self.assertEqual(PlanktonParser.get_taxonomic_code(90000000009999, 'Calanus missiontaxa'), taxa)
+
+        # the index for the local database is used again once the mission database is disconnected
+        disconnect()
+        self.assertEqual(get_taxon_index().get_by_name('Calanus missiontaxa'), [])
+
+
 @tag('parsers', 'parsers_xls')
 class TestSampleXLSParser(DartTestCase):
     def test_open_file_oxygen(self):
@@ -228,6 +386,80 @@ class TestSampleXLSParser(DartTestCase):
         self.assertEqual(df.shape[0], 414)  # there are 424 rows in this file -expected_header_row gives 414
         self.assertEqual([str(c) for c in df.columns], expected_oxy_columns)
 
+    def test_open_file_oxygen_columns(self):
+        # when columns are provided only those columns, ignoring case, should be loaded
+        upload_file = open('core/tests/sample_data/sample_oxy.xlsx', 'rb')
+        data = upload_file.read()
+        upload_file.close()
+
+        df = SampleParser.get_excel_dataframe(data, 0, 9, columns=['sample', 'o2_concentration(ml/l)'])
+        self.assertEqual([c for c in df.columns], ["Sample", "O2_Concentration(ml/l)"])
+        self.assertEqual(df.shape[0], 415)
+
+    def test_get_sheet_names(self):
+        upload_file = open('core/tests/sample_data/FilterLog.xlsx', 'rb')
+        data = upload_file.read()
+        upload_file.close()
+
+        expected_tabs = pd.ExcelFile(BytesIO(data)).sheet_names
+        self.assertEqual(SampleParser.get_sheet_names(data), expected_tabs)
+        # the second time the file is seen the sheet names should come from the cache
+        with patch.object(pd, 'ExcelFile') as excel_file:
+            self.assertEqual(SampleParser.get_sheet_names(data), expected_tabs)
+            excel_file.assert_not_called()
+
+    @tag('parsers_xls_benchmark')
+    @benchmark
+    def test_excel_dataframe_benchmark(self):
+        # a 50k row workbook with a few lines of preamble. Finding the header for a preview used to read and search
+        # the whole sheet, now only the first rows are read. Loading the whole sheet is logged for each engine.
+        import openpyxl
+
+        rows = 50000
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(["Cruise JC24301"])
+        sheet.append(["Analyst: someone"])
+        sheet.append(["Sample", "Value", "Uncertainty", "Analysis_date", "Data_file", "Comments"])
+        for row in range(rows):
+            sheet.append([f"{495000 + row // 2}_{row % 2 + 1}", 3.5 + row / rows, 0.01, "2021-09-17 09:31:43",
+                          f"{row}.tod", None])
+        stream = BytesIO()
+        workbook.save(stream)
+        data = stream.getvalue()
+
+        start = time.perf_counter()
+        df = pd.read_excel(BytesIO(data), sheet_name=0)
+        for header_row in range(25):
+            header = df.iloc[header_row]
+            if header.notna().sum() > 1 and all(isinstance(c, str) for c in header.dropna()):
+                break
+        whole_sheet = time.perf_counter() - start
+
+        start = time.perf_counter()
+        preview = SampleParser.get_excel_dataframe(data, 0, nrows=10)
+        sniffed = time.perf_counter() - start
+
+        self.assertEqual(preview.index.start, 2)
+        self.assertEqual(preview.shape, (10, 6))
+        self.assertLess(sniffed, whole_sheet)
+        logger.info(f"excel {rows} rows: find header reading whole sheet {whole_sheet:.2f}s, "
+                    f"sniffing header {sniffed:.2f}s")
+
+        for engine in [None, 'calamine']:
+            with self.settings(EXCEL_ENGINE=engine):
+                if engine and SampleParser.get_excel_engine() is None:
+                    logger.info(f"excel engine {engine} is not installed")
+                    continue
+
+                start = time.perf_counter()
+                df = SampleParser.get_excel_dataframe(data, 0, 2, columns=['sample', 'value'])
+                loaded = time.perf_counter() - start
+
+            self.assertEqual([c for c in df.columns], ["Sample", "Value"])
+            self.assertEqual(df.shape[0], rows)
+            logger.info(f"excel {rows} rows: load sample columns with engine {engine} {loaded:.2f}s")
+
 
 @tag('parsers', 'parsers_sample')
 class TestSampleCSVParser(DartTestCase):
@@ -321,6 +553,56 @@ class TestSampleCSVParser(DartTestCase):
         self.assertEqual(discrete[1].value, 3.835)
         self.assertEqual(discrete[1].comment, 'hello?')
 
+    @tag('parsers_sample_upsert')
+    def test_upsert_discrete_values(self):
+        # reloading a file in upsert mode should only write values that were added, changed or removed. Unchanged
+        # values keep their BioChem link, changed values are flagged for re-upload
+        bottle = core_factory.BottleFactory(event=self.ctd_event, bottle_id=495271)
+        sample_type = self.oxy_sample_type.get_mission_sample_type(self.mission)
+        upload = core_models.BioChemUpload.objects.create(type=sample_type,
+                                                          status=core_models.BioChemUploadStatus.uploaded)
+
+        sample = core_factory.SampleFactory(bottle=bottle, type=sample_type, file=self.file_name)
+        uploaded = datetime(2024, 6, 10)
+        unchanged = core_factory.DiscreteValueFactory(sample=sample, replicate=1, value=3.932, comment=None,
+                                                      dis_data_num=10, bio_upload_date=uploaded)
+        changed = core_factory.DiscreteValueFactory(sample=sample, replicate=2, value=3.835, comment='hello?',
+                                                    dis_data_num=11, bio_upload_date=uploaded)
+        removed = core_factory.DiscreteValueFactory(sample=sample, replicate=3, value=3.9, comment=None)
+
+        data = {
+            self.oxy_file_settings.sample_field: ['495271_1', '495271_2'],
+            self.oxy_file_settings.value_field: [3.932, 3.836],
+            self.oxy_file_settings.comment_field: [np.nan, 'hello?']
+        }
+        counts = SampleParser.parse_data_frame(self.mission, self.oxy_file_settings, self.file_name,
+                                               pd.DataFrame(data), upsert=True)
+        self.assertEqual(counts, {'created': 0, 'updated': 1, 'unchanged': 1, 'deleted': 1})
+
+        unchanged.refresh_from_db()
+        self.assertEqual(unchanged.dis_data_num, 10)
+        self.assertIsNotNone(unchanged.bio_upload_date)
+
+        changed.refresh_from_db()
+        self.assertEqual(changed.value, 3.836)
+        self.assertEqual(changed.dis_data_num, 11)
+        self.assertIsNone(changed.bio_upload_date)
+
+        self.assertFalse(core_models.DiscreteSampleValue.objects.filter(pk=removed.pk).exists())
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, core_models.BioChemUploadStatus.upload)
+
+        # loading the same file again shouldn't change anything or require another upload
+        upload.status = core_models.BioChemUploadStatus.uploaded
+        upload.save()
+        counts = SampleParser.parse_data_frame(self.mission, self.oxy_file_settings, self.file_name,
+                                               pd.DataFrame(data), upsert=True)
+        self.assertEqual(counts, {'created': 0, 'updated': 0, 'unchanged': 2, 'deleted': 0})
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, core_models.BioChemUploadStatus.uploaded)
+
     def test_missing_bottle_validation(self):
         # no bottles were created for this test we should get a bunch of validation errors
 
@@ -444,6 +726,187 @@ class TestSampleCSVParser(DartTestCase):
             self.assertEqual(row['sid'], expected_sample_ids[i])
             self.assertEqual(row['rid'], expected_replicates[i])
 
+    def _assert_split_equivalent(self, file_settings, samples, values):
+        data = {file_settings.sample_field: samples, file_settings.value_field: values}
+
+        expected = _reference_split_sample(pd.DataFrame(data), file_settings)
+        df = SampleParser.split_sample(pd.DataFrame(data), file_settings)
+
+        columns = [file_settings.value_field, 'sid', 'rid']
+        pd.testing.assert_frame_equal(df[columns], expected[columns], check_dtype=False)
+
+    @tag('parsers_sample_split')
+    def test_data_frame_split_equivalent(self):
+        # the vectorized split_sample should produce the same sample ids, replicates and rows as the
+        # original row by row implementation
+        self._assert_split_equivalent(self.oxy_file_settings,
+                                      ["495600_1", "495600_2", "495601_1", " 495602_1", "+495603_1", "495604"],
+                                      [1.01, 1.02, 2.01, np.nan, 3.01, 4.01])
+
+        self._assert_split_equivalent(self.salt_file_settings,
+                                      ["p_012", np.nan, "495600", np.nan, "495601", "495601", "bad", np.nan,
+                                       "495602.5", "495603_"],
+                                      [np.nan, 1.01, 1.02, 2.01, 2.02, 2.03, 9.0, 9.1, 9.2, 3.01])
+
+        self.oxy_file_settings.allow_blank = True
+        self._assert_split_equivalent(self.oxy_file_settings,
+                                      [495600.0, np.nan, 495601.0, np.nan, np.nan, 495602.0],
+                                      [1.01, 1.02, 2.01, 2.02, 2.03, np.nan])
+
+        rng = np.random.default_rng(42)
+        bottle_ids = rng.integers(495000, 495050, 500)
+        samples = [f"{b}_{r}" for b, r in zip(bottle_ids, rng.integers(1, 4, 500))]
+        self._assert_split_equivalent(self.oxy_file_settings, samples, rng.random(500))
+
+    @tag('parsers_sample_split')
+    def test_data_frame_split_mixed_replicates(self):
+        # an explicit replicate is kept, a blank replicate follows the highest replicate of its sample id so far
+        self.oxy_file_settings.allow_blank = True
+        data = {
+            self.oxy_file_settings.sample_field: ["495600_1", "495601", np.nan, "495600_3", "495600", "495602_2",
+                                                  "495602", "495601_1", "495601"],
+            self.oxy_file_settings.value_field: [1.01, 2.01, 2.02, 1.03, 1.04, 3.02, 3.03, 2.03, 2.04]
+        }
+
+        df = SampleParser.split_sample(pd.DataFrame(data), self.oxy_file_settings)
+        self.assertEqual(df['sid'].tolist(), [495600, 495601, 495601, 495600, 495600, 495602, 495602, 495601, 495601])
+        self.assertEqual(df['rid'].tolist(), [1, 1, 2, 3, 4, 2, 3, 1, 3])
+
+    @tag('parsers_sample_chunks')
+    def test_data_frame_split_chunks_mixed_replicates(self):
+        # a file where only some sample ids have a replicate is split the same way however it's chunked
+        self.oxy_file_settings.allow_blank = True
+        csv = ("header line\n"
+               "sample,o2_concentration(ml/l)\n"
+               "495600_1,1.01\n"
+               "495601,2.01\n"
+               ",2.02\n"
+               "495600_3,1.03\n"
+               "495600,1.04\n"
+               "p_012,9.01\n"
+               ",9.02\n"
+               "495602_2,3.02\n"
+               "495602,3.03\n"
+               "495601_1,2.03\n"
+               "495601,2.04\n")
+        self.oxy_file_settings.skip = 1
+
+        def split(chunk_size):
+            state = SampleParser.SplitState()
+            with patch.object(SampleParser, 'CSV_CHUNK_SIZE', chunk_size):
+                chunks = list(SampleParser.read_csv_chunks(BytesIO(csv.encode('utf-8')), self.oxy_file_settings))
+
+            return len(chunks), pd.concat([SampleParser.split_sample(chunk, self.oxy_file_settings, state)
+                                           for chunk in chunks])
+
+        chunk_count, chunked = split(1)
+        self.assertEqual(chunk_count, 11)
+
+        chunk_count, single_pass = split(100)
+        self.assertEqual(chunk_count, 1)
+
+        columns = [self.oxy_file_settings.value_field, 'sid', 'rid']
+        pd.testing.assert_frame_equal(chunked[columns], single_pass[columns])
+        self.assertEqual(single_pass['rid'].tolist(), [1, 1, 2, 3, 4, 2, 3, 1, 3])
+
+    @tag('parsers_sample_split')
+    def test_data_frame_split_badly_formatted(self):
+        # a sample id with more than one underscore can't be split into a sample and replicate id
+        data = {
+            self.oxy_file_settings.sample_field: ["495600_1", "495600_1_2"],
+            self.oxy_file_settings.value_field: [1.01, 1.02]
+        }
+
+        with self.assertRaisesMessage(ValueError, "Badly formatted sample id: 495600_1_2"):
+            SampleParser.split_sample(pd.DataFrame(data), self.oxy_file_settings)
+
+    @tag('parsers_sample_chunks')
+    def test_read_csv_chunks(self):
+        # when streaming a csv file only the columns the sample config uses should be read
+        file_settings = self.salt_file_settings
+        csv = ("header line\n"
+               "Bottle Label,Calculated Salinity,Comments,Unused\n"
+               "495600,1.01,,a\n"
+               ",1.02,dup,b\n"
+               "495601,2.01,,c\n")
+
+        chunks = list(SampleParser.read_csv_chunks(BytesIO(csv.encode('utf-8')), file_settings, chunk_size=2))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual([c.lower() for c in chunks[0].columns], ['bottle label', 'calculated salinity', 'comments'])
+
+    @tag('parsers_sample_chunks')
+    def test_parse_data_frames_chunk_boundaries(self):
+        # replicates of a sample that are split across two chunks should be numbered as if the
+        # file was read in one piece
+        self.salt_file_settings.allow_blank = True
+        for bottle_id in [495600, 495601, 495602]:
+            core_factory.BottleFactory(event=self.ctd_event, bottle_id=bottle_id)
+
+        csv = ("header line\n"
+               "Bottle Label,Calculated Salinity,Comments\n"
+               "495600,1.01,\n"
+               ",1.02,\n"
+               ",1.03,third\n"
+               "495601,2.01,\n"
+               "p_012,9.01,\n"
+               ",9.02,\n"
+               "495602,3.01,\n"
+               "495602,3.02,\n")
+
+        chunks = SampleParser.read_csv_chunks(BytesIO(csv.encode('utf-8')), self.salt_file_settings, chunk_size=2)
+        SampleParser.parse_data_frames(self.mission, self.salt_file_settings, 'salts.csv', chunks)
+
+        self.assertFalse(core_models.FileError.objects.filter(file_name='salts.csv').exists())
+        discrete_values = core_models.DiscreteSampleValue.objects.order_by('sample__bottle__bottle_id', 'replicate')
+        expected = [(495600, 1, 1.01), (495600, 2, 1.02), (495600, 3, 1.03), (495601, 1, 2.01),
+                    (495602, 1, 3.01), (495602, 2, 3.02)]
+        self.assertEqual([(dv.sample.bottle.bottle_id, dv.replicate, dv.value) for dv in discrete_values], expected)
+        self.assertEqual(discrete_values[2].comment, 'third')
+
+    @tag('parsers_sample_file')
+    def test_parse_sample_file_multiple_configs(self):
+        # several sample configs loaded from the same file should share one pass over the file and a problem with
+        # one config shouldn't stop the others from loading or remove their errors
+        self.salt_file_settings.file_type = 'csv'
+        self.salt_file_settings.save()
+        chl_file_settings = settings_factory.SampleTypeConfigFactory(
+            sample_type=settings_factory.GlobalSampleTypeFactory(short_name='chl', long_name="Chlorophyll"),
+            file_type='csv', skip=1, tab=0, sample_field="bottle label", value_field="chl",
+            allow_blank=False, allow_replicate=False
+        )
+        bad_file_settings = settings_factory.SampleTypeConfigFactory(
+            sample_type=settings_factory.GlobalSampleTypeFactory(short_name='bad', long_name="Bad"),
+            file_type='csv', skip=1, tab=0, sample_field="bottle label", value_field="missing column",
+            allow_blank=False, allow_replicate=True
+        )
+        for bottle_id in [495600, 495601]:
+            core_factory.BottleFactory(event=self.ctd_event, bottle_id=bottle_id)
+
+        csv = ("header line\n"
+               "Bottle Label,Calculated Salinity,Comments,Chl\n"
+               "495600_1,1.01,,0.5\n"
+               "495600_2,1.02,,0.6\n"
+               "495601_1,2.01,,0.7\n"
+               "495602_1,3.01,,0.8\n")
+        file = SimpleUploadedFile('samples.csv', csv.encode('utf-8'))
+
+        configs = [self.salt_file_settings, chl_file_settings, bad_file_settings]
+        with patch.object(SampleParser, 'read_csv_chunks', wraps=SampleParser.read_csv_chunks) as read_chunks:
+            SampleParser.parse_sample_file(self.mission, configs, 'samples.csv', 'csv', file)
+        self.assertEqual(read_chunks.call_count, 1)
+
+        salts = core_models.DiscreteSampleValue.objects.filter(sample__type__name='salts')
+        self.assertEqual(salts.count(), 3)
+
+        chl = core_models.DiscreteSampleValue.objects.filter(sample__type__name='chl')
+        self.assertEqual(sorted(chl.values_list('value', flat=True)), [0.5, 0.7])
+
+        errors = core_models.FileError.objects.filter(file_name='samples.csv')
+        # salts and chl both report the missing bottle, chl reports the replicate and the bad config fails
+        self.assertEqual(errors.filter(message__startswith="Could not find bottle").count(), 2)
+        self.assertTrue(errors.filter(message__startswith="File configuration doesn't allow").exists())
+        self.assertEqual(errors.filter(line=-1).count(), 1)
+
     def test_data_frame_column_convert(self):
         # it's expected that the file_settings fields will be lower case fields so the columns of the dataframe
         # should also be all lowercase
@@ -542,4 +1005,43 @@ class TestSampleCSVParser(DartTestCase):
         self.assertIsInstance(errors[0], core_models.FileError)
         self.assertEqual('Duplicate replicate id found for sample 491', errors[0].message)
 
+    def _get_parse_query_count(self, start_id, bottle_count):
+        # creates bottle_count bottles, with two replicates each plus one sample with no bottle, and returns the
+        # number of queries parse_data_frame needed to load them
+        bottle_ids = [start_id + i for i in range(bottle_count)]
+        bottles = [core_factory.BottleFactory.build(event=self.ctd_event, bottle_id=bottle_id)
+                   for bottle_id in bottle_ids]
+        core_models.Bottle.objects.bulk_create(bottles)
+
+        sample_ids = [f'{bottle_id}_{replicate}' for bottle_id in bottle_ids for replicate in [1, 2]]
+        data = {
+            self.oxy_file_settings.sample_field: sample_ids + [f'{start_id + bottle_count}_1'],
+            self.oxy_file_settings.value_field: [3.9] * (len(sample_ids) + 1),
+            self.oxy_file_settings.comment_field: [np.nan] * (len(sample_ids) + 1)
+        }
+        df = pd.DataFrame(data)
+
+        file_name = f'oxy_{bottle_count}.csv'
+        start = datetime.now()
+        with CaptureQueriesContext(connection) as context:
+            SampleParser.parse_data_frame(self.mission, self.oxy_file_settings, file_name, df)
+        logger.debug(f"Parsed {len(sample_ids)} rows with {len(context.captured_queries)} queries "
+                     f"in {datetime.now() - start}")
+
+        self.assertEqual(core_models.FileError.objects.filter(file_name=file_name).count(), 1)
+        self.assertEqual(core_models.DiscreteSampleValue.objects.filter(
+            sample__bottle__bottle_id__in=bottle_ids).count(), len(sample_ids))
+
+        return len(context.captured_queries)
+
+    @tag('parsers_sample_benchmark')
+    @benchmark
+    def test_parse_data_frame_constant_queries(self):
+        # the number of queries required to load a sample file should not grow with the number of rows in the file
+        self.oxy_file_settings.sample_type.get_mission_sample_type(self.mission)
+
+        small_file_queries = self._get_parse_query_count(100000, 10)
+        large_file_queries = self._get_parse_query_count(200000, 1000)
+
+        self.assertEqual(small_file_queries, large_file_queries)
 
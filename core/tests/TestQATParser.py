@@ -1,11 +1,12 @@
 import os
+from decimal import Decimal
 from io import StringIO
 
 from django.test import TestCase, tag
 
 from core.tests import CoreFactoryFloor as core_factory
 from core.parsers.sensor.qat import QATParser
-from core.models import Event
+from core.models import Event, Bottle, FileError
 
 
 sample_file_path = ['core', 'tests', 'sample_data']
@@ -75,3 +76,39 @@ class TestQATParser(TestCase):
         expected_longitude = -63.6211
         self.assertEqual(len(bottles.filter(longitude=expected_longitude)), 5)
 
+    def test_parse_queries(self):
+        # the number of queries used to load a QAT file shouldn't depend on the number of bottles in it
+        core_factory.CTDEventFactory.create(mission=self.mission, event_id=97)
+        core_factory.CTDEventFactory.create(mission=self.mission, event_id=98)
+
+        header = self.file_data.readline()
+        rows = [f"CAR2025002, {event_id:03d}, 43.3262, -63.6211, 1, {510000 + bottle}, \"Mar 17 2025\", "
+                f"\"12:{bottle % 60:02d}:00\", , , , , , , {bottle}.5, , {bottle}" + ", " * 20 + "43.3262, -63.6211\n"
+                for event_id in [97, 98] for bottle in range(event_id * 100, event_id * 100 + 100)]
+
+        with self.assertNumQueries(3):
+            QATParser(self.mission, sample_file_name, StringIO(header + ''.join(rows))).parse()
+
+        self.assertEqual(200, Bottle.objects.filter(event__mission=self.mission).count())
+
+        # reloading the file updates the existing bottles
+        with self.assertNumQueries(3):
+            QATParser(self.mission, sample_file_name, StringIO(header + ''.join(rows))).parse()
+
+        self.assertEqual(200, Bottle.objects.filter(event__mission=self.mission).count())
+        bottle = Bottle.objects.get(event__event_id=98, bottle_id=519850)
+        self.assertEqual(9850, bottle.bottle_number)
+        self.assertEqual(Decimal('9850.5'), bottle.pressure)
+
+    def test_parse_invalid_dates(self):
+        # every event with a date that can't be read should be reported before the parser fails
+        core_factory.CTDEventFactory.create(mission=self.mission, event_id=97)
+        data = self.file_data.getvalue().replace('"Mar 17 2025"', '"Not a date"')
+
+        qatparser = QATParser(self.mission, sample_file_name, StringIO(data))
+        with self.assertRaises(ValueError):
+            qatparser.parse()
+
+        errors = FileError.objects.filter(mission=self.mission, file_name=sample_file_name)
+        self.assertEqual(1, errors.count())
+        self.assertFalse(Bottle.objects.filter(event__mission=self.mission).exists())
@@ -0,0 +1,58 @@
+import re
+import unittest
+
+from django.db import connection
+from django.test import tag
+
+from config.tests.DartTestCase import DartTestCase
+
+from core import models as core_models
+from core.tests import CoreFactoryFloor as core_factory
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "query plans are SQLite specific")
+@tag('model', 'model_query_plans')
+class TestQueryPlans(DartTestCase):
+    # the hot parser, upload and report lookups should search an index rather than scan their table
+
+    def setUp(self):
+        self.mission = core_factory.MissionFactory()
+        self.event = core_factory.CTDEventFactory(mission=self.mission)
+
+    def assertUsesIndex(self, queryset, table: str, index: str):
+        plan = queryset.explain()
+        self.assertRegex(plan, rf'SEARCH {table} USING (COVERING )?INDEX {index} ', plan)
+        self.assertIsNone(re.search(rf'SCAN {table}\b', plan), plan)
+
+    def test_bottle_lookups(self):
+        bottles = core_models.Bottle.objects.filter(event__in=self.mission.events.all(), bottle_id__in=[1, 2, 3])
+        self.assertUsesIndex(bottles, 'core_bottle', 'core_bottle_bottle_event_idx')
+
+        bottles = core_models.Bottle.objects.filter(bottle_id=5, event__instrument__type=core_models.InstrumentType.ctd)
+        self.assertUsesIndex(bottles, 'core_bottle', 'core_bottle_bottle_event_idx')
+
+    def test_sample_lookups(self):
+        sample_type = core_factory.MissionSampleTypeFactory(mission=self.mission)
+
+        samples = core_models.Sample.objects.filter(bottle_id=1, type=sample_type)
+        self.assertUsesIndex(samples, 'core_sample', 'core_sample_bottle_type_idx')
+
+        values = core_models.DiscreteSampleValue.objects.filter(sample__bottle__bottle_id__in=[1, 2],
+                                                                sample__type=sample_type)
+        self.assertUsesIndex(values, 'core_discretesamplevalue', 'core_discrete_sample_rep_idx')
+
+    def test_file_error_lookups(self):
+        errors = core_models.FileError.objects.filter(file_name='test.log')
+        self.assertUsesIndex(errors, 'core_fileerror', 'core_fileerror_file_code_idx')
+
+        errors = self.mission.file_errors.filter(file_name__in=['test.btl'], code__gte=100, code__lte=299)
+        self.assertUsesIndex(errors, 'core_fileerror', 'core_fileerror_file_code_idx')
+
+    def test_event_lookups(self):
+        events = self.mission.events.filter(event_id__in=[1, 2])
+        self.assertUsesIndex(events, 'core_event', 'core_event_mission_event_idx')
+
+    def test_action_lookups(self):
+        # the first/last action subqueries of an event summary and the previous action of an action
+        self.assertUsesIndex(self.mission.events.with_summary(), 'U0', 'core_action_event_date_idx')
+        self.assertUsesIndex(self.event.actions.with_drift(), 'core_action', 'core_action_event_date_idx')
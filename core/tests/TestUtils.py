@@ -0,0 +1,84 @@
+import time
+
+import numpy as np
+
+from django.test import tag, SimpleTestCase
+
+from config.tests.DartTestCase import benchmark
+
+from core import utils
+
+import logging
+
+logger = logging.getLogger('dart.test')
+
+
+@tag('utils', 'utils_distance')
+class TestDistance(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.lat1, self.lat2 = rng.uniform(-90, 90, (2, 1000))
+        self.lon1, self.lon2 = rng.uniform(-180, 180, (2, 1000))
+
+    def test_distance_many(self):
+        expected = [utils.distance([lat1, lon1], [lat2, lon2])
+                    for lat1, lon1, lat2, lon2 in zip(self.lat1, self.lon1, self.lat2, self.lon2)]
+
+        distances = utils.distance_many(self.lat1, self.lon1, self.lat2, self.lon2)
+        np.testing.assert_allclose(distances, expected, rtol=1e-9, atol=1e-6)
+
+        # the same point and missing points
+        self.assertEqual(utils.distance_many(44.5, -63.5, 44.5, -63.5), 0)
+        self.assertTrue(np.isnan(utils.distance_many([None], [None], [44.5], [-63.5])[0]))
+
+    def test_nearest(self):
+        stations_lat = [44.0, 45.0, np.nan]
+        stations_lon = [-63.0, -64.0, np.nan]
+
+        indices, distances = utils.nearest([44.01, 44.9, None], [-63.01, -63.9, None], stations_lat, stations_lon)
+
+        self.assertEqual(indices.tolist(), [0, 1, -1])
+        np.testing.assert_allclose(distances[:2], [utils.distance([44.01, -63.01], [44.0, -63.0]),
+                                                   utils.distance([44.9, -63.9], [45.0, -64.0])])
+        self.assertTrue(np.isnan(distances[2]))
+
+        indices, distances = utils.nearest([44.0], [-63.0], [], [])
+        self.assertEqual(indices.tolist(), [-1])
+
+    def test_nearest_chunks(self):
+        # the result doesn't depend on how many points are compared at once
+        expected = utils.nearest(self.lat1, self.lon1, self.lat2[:50], self.lon2[:50])
+
+        chunk_size = utils.NEAREST_CHUNK_SIZE
+        try:
+            utils.NEAREST_CHUNK_SIZE = 120
+            chunked = utils.nearest(self.lat1, self.lon1, self.lat2[:50], self.lon2[:50])
+        finally:
+            utils.NEAREST_CHUNK_SIZE = chunk_size
+
+        np.testing.assert_array_equal(chunked[0], expected[0])
+        np.testing.assert_array_equal(chunked[1], expected[1])
+
+    @tag('utils_distance_benchmark')
+    @benchmark
+    def test_distance_many_benchmark(self):
+        # 1e6 point pairs, the point by point distance is timed over a tenth of them
+        pairs = 1000000
+        rng = np.random.default_rng(42)
+        lat1, lat2 = rng.uniform(-90, 90, (2, pairs))
+        lon1, lon2 = rng.uniform(-180, 180, (2, pairs))
+
+        start = time.perf_counter()
+        distances = utils.distance_many(lat1, lon1, lat2, lon2)
+        vectorized = time.perf_counter() - start
+
+        sample = pairs // 10
+        start = time.perf_counter()
+        expected = [utils.distance([lat1[i], lon1[i]], [lat2[i], lon2[i]]) for i in range(sample)]
+        point_by_point = (time.perf_counter() - start) * (pairs / sample)
+
+        np.testing.assert_allclose(distances[:sample], expected, rtol=1e-9, atol=1e-6)
+        self.assertLess(vectorized, point_by_point)
+        logger.info(f"distance {pairs} pairs: point by point {point_by_point:.2f}s (estimated), "
+                    f"distance_many {vectorized:.3f}s")
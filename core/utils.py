@@ -4,6 +4,9 @@ import numpy as np
 import pandas as pd
 import math
 
+# the radius of the earth in meters used by distance() and distance_many()
+EARTH_RADIUS = 6371e3
+
 
 # compute the distance between two points on earth
 def distance(point1: [float, float], point2: [float, float]) -> float:
@@ -14,7 +17,7 @@ def distance(point1: [float, float], point2: [float, float]) -> float:
     lat1 = float(point1[0]) * math.pi / 180
     lat2 = float(point2[0]) * math.pi / 180
     lon = float(point2[1] - point1[1]) * math.pi / 180
-    R = 6371e3
+    R = EARTH_RADIUS
 
     inner = math.sin(lat1) * math.sin(lat2) + math.cos(lat1) * math.cos(lat2) * math.cos(lon)
 
@@ -24,6 +27,54 @@ def distance(point1: [float, float], point2: [float, float]) -> float:
     return d
 
 
+# the largest number of point pairs nearest() compares at once
+NEAREST_CHUNK_SIZE = 1000000
+
+
+# compute the distances between arrays of points on earth, the vectorized version of distance(). Arguments can be
+# numbers or array-likes that broadcast together, missing coordinates (None or NaN) give a NaN distance.
+def distance_many(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1 = np.asarray(lat1, dtype=float) * np.pi / 180
+    lat2 = np.asarray(lat2, dtype=float) * np.pi / 180
+    lon = (np.asarray(lon2, dtype=float) - np.asarray(lon1, dtype=float)) * np.pi / 180
+
+    inner = np.sin(lat1) * np.sin(lat2) + np.cos(lat1) * np.cos(lat2) * np.cos(lon)
+
+    # rounding errors can put the inner value slightly outside of the domain of arccos
+    return np.arccos(np.clip(inner, -1, 1)) * EARTH_RADIUS
+
+
+# for each point find the closest of a set of candidate points, like the nominal stations nearest to a list of event
+# locations. Returns (indices, distances), the index of the nearest candidate for each point and the distance to it
+# in meters. Points without a location, or without any candidate with a location, get an index of -1 and a NaN
+# distance.
+def nearest(lats, lons, candidate_lats, candidate_lons) -> tuple[np.ndarray, np.ndarray]:
+    lats = np.asarray(lats, dtype=float).ravel()
+    lons = np.asarray(lons, dtype=float).ravel()
+    candidate_lats = np.asarray(candidate_lats, dtype=float).ravel()
+    candidate_lons = np.asarray(candidate_lons, dtype=float).ravel()
+
+    indices = np.full(lats.shape, -1)
+    distances = np.full(lats.shape, np.nan)
+    if not len(candidate_lats):
+        return indices, distances
+
+    # compare the points to the candidates a chunk of points at a time so the distance matrix stays a manageable size
+    chunk_size = max(1, NEAREST_CHUNK_SIZE // len(candidate_lats))
+    for start in range(0, len(lats), chunk_size):
+        end = start + chunk_size
+        matrix = distance_many(lats[start:end, np.newaxis], lons[start:end, np.newaxis],
+                               candidate_lats[np.newaxis, :], candidate_lons[np.newaxis, :])
+
+        found = ~np.isnan(matrix).all(axis=1)
+        closest = np.argmin(np.where(np.isnan(matrix), np.inf, matrix), axis=1)
+
+        indices[start:end] = np.where(found, closest, -1)
+        distances[start:end] = np.where(found, matrix[np.arange(len(matrix)), closest], np.nan)
+
+    return indices, distances
+
+
 def is_locked(file):
     try:
         # if a file exists and can't be renamed to itself this will throw an exception indicating the file
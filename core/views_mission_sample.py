@@ -1,4 +1,3 @@
-import io
 import time
 
 import numpy as np
@@ -21,7 +20,6 @@ from core import forms, form_biochem_batch_discrete
 
 from core import models
 from core import views
-from core.form_sample_type_config import process_file
 from core.parsers import SampleParser
 
 from settingsdb import models as settings_models
@@ -233,35 +231,28 @@ def load_samples(request):
 
         config_ids = request.POST.getlist('sample_config')
         file = request.FILES['sample_file']
-        file_name, file_type, data = process_file(file)
-
-        config_count = len(config_ids)
-        for index, config_id in enumerate(config_ids):
-            SampleParser.logger_notifications.info(_("Loading file") + f" : {file_name} : %d/%d",
-                                                   index, config_count)
-
-            sample_config = settings_models.SampleTypeConfig.objects.get(pk=config_id)
-            mission = models.Mission.objects.get(pk=request.POST['mission_id'])
-
-            if file_type == 'csv' or file_type == 'dat':
-                io_stream = io.BytesIO(data)
-                dataframe = pd.read_csv(filepath_or_buffer=io_stream, header=sample_config.skip)
-            else:
-                dataframe = SampleParser.get_excel_dataframe(stream=data, sheet_number=sample_config.tab,
-                                                             header_row=sample_config.skip)
-
-            try:
-                # Remove any row that is *all* nan values
-                dataframe = dataframe.dropna(axis=0, how='all')
-
-                SampleParser.parse_data_frame(mission, sample_config, file_name=file_name, dataframe=dataframe)
-
-                # if the datatypes are valid, then before we upload we should copy any
-                # 'standard' level biochem data types to the mission level
-                user_logger.info(_("Copying Mission Datatypes"))
-
-                # once loaded apply the default sample type as a mission sample type so that if the default type is ever
-                # changed it won't affect the data type for this mission
+        file_name = file.name
+        file_type = file_name.split('.')[-1].lower()
+
+        mission = models.Mission.objects.get(pk=request.POST['mission_id'])
+        sample_configs = [settings_models.SampleTypeConfig.objects.get(pk=config_id) for config_id in config_ids]
+
+        SampleParser.logger_notifications.info(_("Loading file") + f" : {file_name}")
+        try:
+            # the file is read once for all the selected sample configs. Values that haven't changed since the
+            # file was last loaded are left alone so they don't have to be uploaded to BioChem again
+            SampleParser.parse_sample_file(mission, sample_configs, file_name=file_name, file_type=file_type,
+                                           file=file, upsert=True)
+        except Exception as ex:
+            logger.error(f"Failed to load file {file_name}")
+            logger.exception(ex)
+        else:
+            # if the datatypes are valid, then before we upload we should copy any
+            # 'standard' level biochem data types to the mission level
+            user_logger.info(_("Copying Mission Datatypes"))
+            for sample_config in sample_configs:
+                # once loaded apply the default sample type as a mission sample type so that if the default type is
+                # ever changed it won't affect the data type for this mission
                 sample_type = sample_config.sample_type
                 if sample_type.datatype and not mission.mission_sample_types.filter(
                         name=sample_type.short_name).exists():
@@ -273,10 +264,6 @@ def load_samples(request):
                                                    datatype=sample_type.datatype)
                     mst.save()
 
-            except Exception as ex:
-                logger.error(f"Failed to load file {file_name}")
-                logger.exception(ex)
-
         soup = BeautifulSoup("", "html.parser")
         response = HttpResponse(soup)
 
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class SettingsdbConfig(AppConfig):
+    name = 'settingsdb'
+
+    def ready(self):
+        # registers the connection_created receiver that applies the connection profile to mission databases
+        from . import utils  # noqa: F401
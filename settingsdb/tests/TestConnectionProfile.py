@@ -0,0 +1,188 @@
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import tag
+
+from config.tests.DartTestCase import DartTestCase, benchmark
+
+from core import models as core_models
+from core.parsers.sensor import btl_reader, btl_ros
+from core.tests import CoreFactoryFloor as core_factory
+
+from settingsdb import utils
+
+import logging
+
+logger = logging.getLogger('dart.test')
+
+sample_data = os.path.join(settings.BASE_DIR, 'core', 'tests', 'sample_data', 'fixed_stations')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "connection profiles are SQLite specific")
+@tag('settingsdb', 'settingsdb_connection_profile')
+class TestConnectionProfile(DartTestCase):
+    # mission databases are added to settings.DATABASES while Dart is running, the test databases are added the same
+    # way, using temporary files, and removed when each test is done
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def add_database(self, database: str, profile: dict):
+        settings.DATABASES[database] = settings.DATABASES['default'].copy()
+        settings.DATABASES[database]['NAME'] = os.path.join(tempfile.mkdtemp(dir=self.directory),
+                                                            f'{database}.sqlite3')
+        settings.DATABASES[database]['PROFILE'] = profile
+        self.addCleanup(self.remove_database, database)
+        self.connect(database)
+
+    @staticmethod
+    def connect(database: str):
+        # the test case only allows connections to databases that existed when the test started, connecting
+        # directly, rather than on the first query, gets around that for the databases added by the tests
+        connections[database].connect()
+
+    def remove_database(self, database: str):
+        if database in settings.DATABASES:
+            connections[database].close()
+            del connections[database]
+            settings.DATABASES.pop(database)
+
+    def get_pragma(self, database: str, pragma: str):
+        with connections[database].cursor() as cursor:
+            cursor.execute(f'PRAGMA {pragma}')
+            return cursor.fetchone()[0]
+
+    def test_profile_applied(self):
+        self.add_database('tuned_db', settings.MISSION_DATABASE_PROFILE)
+
+        self.assertEqual('wal', self.get_pragma('tuned_db', 'journal_mode'))
+        self.assertEqual(1, self.get_pragma('tuned_db', 'synchronous'))  # NORMAL
+        self.assertEqual(2, self.get_pragma('tuned_db', 'temp_store'))  # MEMORY
+        self.assertEqual(settings.MISSION_DATABASE_PROFILE['cache_size'], self.get_pragma('tuned_db', 'cache_size'))
+        self.assertEqual(settings.MISSION_DATABASE_PROFILE['busy_timeout'],
+                         self.get_pragma('tuned_db', 'busy_timeout'))
+
+    def test_profile_not_applied(self):
+        # without a profile the database is opened with the SQLite defaults
+        self.add_database('stock_db', {})
+
+        self.assertEqual('delete', self.get_pragma('stock_db', 'journal_mode'))
+        self.assertEqual(2, self.get_pragma('stock_db', 'synchronous'))  # FULL
+
+    def test_checkpoint_database(self):
+        # changes kept in the -wal file are written back to the database so the .sqlite3 file can be copied
+        self.add_database('tuned_db', settings.MISSION_DATABASE_PROFILE)
+        with connections['tuned_db'].cursor() as cursor:
+            cursor.execute('CREATE TABLE test_table (value INTEGER)')
+            cursor.execute('INSERT INTO test_table VALUES (1)')
+
+        wal_file = settings.DATABASES['tuned_db']['NAME'] + '-wal'
+        self.assertGreater(os.path.getsize(wal_file), 0)
+
+        utils.checkpoint_database('tuned_db')
+
+        self.assertEqual('delete', self.get_pragma('tuned_db', 'journal_mode'))
+        self.assertFalse(os.path.exists(wal_file))
+
+        # a copy of just the .sqlite3 file has the changes
+        copy = os.path.join(self.directory, 'copy.sqlite3')
+        shutil.copy2(settings.DATABASES['tuned_db']['NAME'], copy)
+        with closing(sqlite3.connect(copy)) as copy_connection:
+            self.assertEqual([(1,)], copy_connection.execute('SELECT value FROM test_table').fetchall())
+
+    def load_bottles(self, directory: str, profile: dict) -> dict:
+        # Loads a directory of BTL files into a new mission database while the sample table is read from another
+        # thread, the way the UI reads a mission while a parser is writing to it.
+        self.add_database('mission_db', profile)
+        call_command('migrate', database='mission_db', app_label='core', verbosity=0)
+        call_command('migrate', database='mission_db', app_label='bio_tables', verbosity=0)
+        call_command('loaddata', 'default_biochem_fixtures', database='mission_db', verbosity=0)
+        # loaddata closes the connection when it's done
+        self.connect('mission_db')
+
+        mission = core_factory.MissionFactory(fixed_station=True)
+
+        # files read by a previous run would be taken from the cache rather than parsed again
+        with btl_reader._btl_cache_lock:
+            btl_reader._btl_cache.clear()
+
+        loaded = threading.Event()
+        reads = []
+
+        def read_samples():
+            self.connect('mission_db')
+            try:
+                while not loaded.is_set():
+                    start = time.perf_counter()
+                    list(core_models.Sample.objects.filter(bottle__event__mission_id=mission.pk).values_list(
+                        'bottle__bottle_id', 'type__name', 'discrete_values__value'))
+                    reads.append(time.perf_counter() - start)
+            finally:
+                connections.close_all()
+
+        reader = threading.Thread(target=read_samples)
+        reader.start()
+        try:
+            start = time.perf_counter()
+            btl_ros.sync_bottle_directory(mission, directory, max_workers=1)
+            load = time.perf_counter() - start
+        finally:
+            loaded.set()
+            reader.join()
+
+        bottles = core_models.Bottle.objects.count()
+        self.remove_database('mission_db')
+
+        return {'load': load, 'bottles': bottles, 'reads': reads}
+
+    @tag('settingsdb_connection_profile_benchmark')
+    @benchmark
+    def test_connection_profile_benchmark(self):
+        # copies of a BTL file, each with its own event number and bottle IDs
+        files = 30
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        with open(os.path.join(sample_data, '25667001.btl'), mode='rb') as btl_file:
+            btl_data = btl_file.read()
+        for event_id in range(1, files + 1):
+            file_name = f'25667{event_id:03d}'
+            with open(os.path.join(directory, f'{file_name}.btl'), mode='wb') as btl_file:
+                data = btl_data.replace(b'Event_Number: 001', f'Event_Number: {event_id:03d}'.encode())
+                data = re.sub(rb' 50085(\d) ', lambda match: f' {500000 + event_id * 10 + int(match[1])} '.encode(),
+                              data)
+                btl_file.write(data)
+            shutil.copy2(os.path.join(sample_data, '25667001.ros'), os.path.join(directory, f'{file_name}.ros'))
+
+        # the profiles are run in stock, tuned, tuned, stock order so neither one benefits from going first
+        profiles = {'stock': {}, 'tuned': settings.MISSION_DATABASE_PROFILE}
+        results = {name: [] for name in profiles}
+        for name in ['stock', 'tuned', 'tuned', 'stock']:
+            results[name].append(self.load_bottles(directory, profiles[name]))
+
+        read_times = {}
+        for name, runs in results.items():
+            # 4 bottles in each file
+            self.assertEqual([files * 4] * len(runs), [run['bottles'] for run in runs])
+
+            load = sum(run['load'] for run in runs) / len(runs)
+            reads = sorted(read for run in runs for read in run['reads'])
+            read_times[name] = {'median': reads[len(reads) // 2], 'p99': reads[int(len(reads) * 0.99)]}
+            logger.info(f"{files} BTL files, {name} profile: average load {load:.2f}s, {len(reads)} concurrent "
+                        f"sample reads, median {read_times[name]['median'] * 1000:.1f}ms, "
+                        f"p99 {read_times[name]['p99'] * 1000:.1f}ms, slowest {reads[-1] * 1000:.1f}ms")
+
+        # a single slow read can happen with either profile, but the profile shouldn't make reads generally slower
+        self.assertLess(read_times['tuned']['p99'], read_times['stock']['p99'] * 2)
@@ -4,7 +4,9 @@ import pytz
 
 from django.apps import apps
 from django.conf import settings
-from django.db import connections
+from django.db import connections, OperationalError
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
 from django.core.management import call_command
 from django.db.migrations.executor import MigrationExecutor
 
@@ -74,6 +76,7 @@ def add_database(database):
     mission_database = 'mission_db'
     databases[mission_database] = databases['default'].copy()
     databases[mission_database]['NAME'] = get_db_location(database)
+    databases[mission_database]['PROFILE'] = get_connection_profile()
 
     call_command('migrate', database=mission_database, app_label="core")
     call_command('migrate', database=mission_database, app_label="bio_tables")
@@ -118,6 +121,27 @@ def connect_database(database):
     databases[mission_database] = databases['default'].copy()
     databases[mission_database]['NAME'] = db_path
     databases[mission_database]["LOADED"] = database
+    databases[mission_database]['PROFILE'] = get_connection_profile()
+
+
+def get_connection_profile() -> dict:
+    # the SQLite pragmas mission databases are connected with, none if the tuned profile isn't turned on
+    return settings.MISSION_DATABASE_PROFILE if settings.MISSION_DATABASE_TUNED else {}
+
+
+def apply_connection_profile(connection, profile: dict):
+    # profile is a dictionary of SQLite pragmas and their values, like settings.MISSION_DATABASE_PROFILE
+    with connection.cursor() as cursor:
+        for pragma, value in profile.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+@receiver(connection_created)
+def set_connection_profile(sender, connection, **kwargs):
+    # mission databases are added to settings.DATABASES with the profile to apply each time they're connected to
+    profile = connection.settings_dict.get('PROFILE', None)
+    if profile and connection.vendor == 'sqlite':
+        apply_connection_profile(connection, profile)
 
 
 def is_database_synchronized(database):
@@ -142,10 +166,29 @@ def get_dart_git_version():
     return  repo.head.commit.hexsha
 
 
+def checkpoint_database(database):
+    # a database in WAL mode keeps recent changes in a -wal file beside it. The changes are written back to the
+    # database and it's returned to the default rollback journal so the .sqlite3 file can be copied on its own
+    connection = connections[database]
+    if connection.vendor != 'sqlite':
+        return
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            if cursor.fetchone()[0] == 'wal':
+                cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                cursor.execute('PRAGMA journal_mode = DELETE')
+    except OperationalError as ex:
+        # another connection is still using the database, it'll be checkpointed when the last connection closes
+        logger.warning(f"Could not checkpoint {database} : {ex}")
+
+
 def close_connection(mission_database='mission_db'):
     databases = settings.DATABASES
     if mission_database in connections:
         logger.info(f"closing {mission_database} connection")
+        checkpoint_database(mission_database)
         # del connections[mission_database]
         connections.close_all()
 